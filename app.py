@@ -5,8 +5,9 @@ Flask application for SiliconFlow I2V Generator.
 import os
 import uuid
 import json
+import base64
+import random
 import sqlite3
-import threading
 import logging
 import time
 from datetime import datetime
@@ -27,20 +28,37 @@ except ImportError:
     print("\033[93m未安装python-dotenv库，无法加载.env文件\033[0m")
     print("\033[93m可以使用 'pip install python-dotenv' 安装\033[0m")
 
-from flask import Flask, render_template, request, jsonify, send_from_directory, url_for, redirect, send_file
+from flask import Flask, render_template, request, jsonify, send_from_directory, url_for, redirect, send_file, Response
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 from config import OUTPUT_DIR, DEFAULT_VIDEO_SIZE, DEFAULT_NEGATIVE_PROMPT, I2V_MODEL, VLM_MODEL, LLM_MODEL, DEFAULT_USER_PROMPT, get_full_prompt_template, FREE_API_KEY_URL
-from utils import ensure_directory_exists
+from config import SCHEDULER_QUEUE_SIZE, STAGE_WORKERS, VLM_CACHE_MAX_ENTRIES, VLM_CACHE_TTL_DAYS
+from config import PROMPT_CACHE_ENABLED, PROMPT_CACHE_MAX_ENTRIES, PROMPT_CACHE_TTL_DAYS, PROMPT_TEMPERATURE
+from config import NEAR_DUPLICATE_MAX_DISTANCE, NEAR_DUPLICATE_MAX_COLOR_DIFF, GENERATION_CACHE_ENABLED, GENERATION_CACHE_MAX_ENTRIES, GENERATION_CACHE_TTL_DAYS
+from config import SINGLE_FLIGHT_ENABLED
+from config import VIDEO_POLL_INTERVAL, VIDEO_POLL_MIN_INTERVAL, VIDEO_POLL_MAX_INTERVAL, VIDEO_POLL_TIMEOUT, VIDEO_POLL_CONCURRENCY
+from config import JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS, JOB_RETRY_DELAY, JOB_SECRET_KEY, BULK_MAX_TASKS
+from config import TASK_PAGE_SIZE, TASK_PAGE_MAX_SIZE, TASK_TOMBSTONE_RETENTION_DAYS
+from config import TASK_EVENTS_KEEPALIVE_SECONDS, TASK_EVENTS_RETRY_MS
+from utils import ensure_directory_exists, encoded_image_cache, file_sha256
 from image_processor import process_image_with_vlm
 from prompt_generator import refine_prompt
-from video_generator import generate_video, get_video_status, download_video
+from http_client import is_transient_error
+from video_generator import generate_video, get_video_status, query_video_status, download_video, endpoint_selector
 from video_extender import extend_video
 from video_merger import merge_videos
-from database import init_db, get_db, close_db
+from database import init_db, get_db, close_db, update_task, get_sync_value, prune_tombstones, task_changes, connect
+from database import (TASK_BY_ID_SQL, WAITING_TASKS_SQL, VIDEO_USERS_SQL, INFLIGHT_REQUEST_SQL, GENERATION_HISTORY_SQL,
+                      TASK_PAGE_CURSOR_CONDITION, task_page_sql, task_changes_sql)
+from scheduler import TaskScheduler, SchedulerFullError, KeyedLock
+from job_queue import JobStore, SECRETS_LOST_ERROR
+from result_cache import PersistentCache, make_cache_key
+from image_index import PerceptualIndex
+from upload_store import UploadStore
+from video_poller import VideoStatusPoller, CompletionTimeEstimator
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -54,6 +72,8 @@ ensure_directory_exists(app.config['OUTPUT_FOLDER'])
 
 # Initialize database
 init_db(app)
+with app.app_context():
+    prune_tombstones(get_db(), TASK_TOMBSTONE_RETENTION_DAYS * 24 * 3600)
 
 # 检查ffmpeg是否可用
 try:
@@ -92,36 +112,85 @@ except Exception as e:
     app.config['FFMPEG_AVAILABLE'] = False
     logger.warning("ffmpeg不可用，视频合并功能将被禁用。请安装ffmpeg以启用此功能。")
 
-# Global task dictionary to track running tasks
-# 缓存已处理的图片信息，避免重复处理
-# 格式: {image_path: {'description': '...', 'prompt': '...'}}
-processed_images = {}
-
-# 正在运行的任务列表
-tasks = {}
+# 图片描述缓存：按图片内容的SHA-256和VLM模型保存在数据库中，重复上传的图片和重启后都能命中
+description_cache = PersistentCache(
+    app.config['DATABASE'],
+    'vlm_description',
+    max_entries=VLM_CACHE_MAX_ENTRIES,
+    ttl_seconds=VLM_CACHE_TTL_DAYS * 24 * 3600
+)
+
+# 提示词缓存：相同的图片描述、LLM模型、提示词模板和温度直接复用之前精化的提示词
+prompt_cache = PersistentCache(
+    app.config['DATABASE'],
+    'refined_prompt',
+    max_entries=PROMPT_CACHE_MAX_ENTRIES,
+    ttl_seconds=PROMPT_CACHE_TTL_DAYS * 24 * 3600
+)
+
+# 生成结果缓存（可选）：相同图片、提示词、种子、模型和尺寸的任务直接复用已生成的视频
+generation_cache = PersistentCache(
+    app.config['DATABASE'],
+    'video_generation',
+    max_entries=GENERATION_CACHE_MAX_ENTRIES,
+    ttl_seconds=GENERATION_CACHE_TTL_DAYS * 24 * 3600
+)
+
+# 相同的生成请求在提交阶段串行处理，后到的任务可以合并到正在生成的请求
+submission_locks = KeyedLock()
+
+# 上传的图片按内容哈希存储，重复上传不占用额外空间
+upload_store = UploadStore(app.config['UPLOAD_FOLDER'])
+
+# 图片感知哈希索引：上传时计算，用于找到近似重复的图片并复用其描述
+image_index = PerceptualIndex(app.config['DATABASE'])
+
+# 后台任务调度器，所有后台处理都按阶段提交到这里，每个阶段有独立的队列和工作线程
+# 任务持久化在数据库的jobs表中，重启后会从中断的地方继续
+scheduler = TaskScheduler(
+    max_queue_size=SCHEDULER_QUEUE_SIZE,
+    context_factory=app.app_context,
+    job_store=JobStore(
+        app.config['DATABASE'],
+        lease_seconds=JOB_LEASE_SECONDS,
+        secret_key=JOB_SECRET_KEY,
+        on_secrets_lost=lambda stage, args: fail_tasks_without_api_key(stage, args)
+    ),
+    max_attempts=JOB_MAX_ATTEMPTS,
+    retry_delay=JOB_RETRY_DELAY,
+    on_job_failed=lambda stage, args, error: fail_job_tasks(stage, args, error)
+)
+# 早期版本会把 API Key 写入任务参数，启动时清除
+scheduler.job_store.scrub_secrets()
 
 def process_batch_tasks(task_ids, image_path, params_list):
-    """处理批量任务，对同一张图片只进行一次VLM和LLM处理。"""
+    """拆分批量任务：按图片分组后交给后续阶段处理，对同一张图片只进行一次VLM和LLM处理。"""
     try:
-        # 更新所有任务状态
-        for task_id in task_ids:
-            update_task_status(task_id, 'processing_image', '正在处理图片...')
-
         # 获取每个任务的图片路径
+        # 同时记录已经完成的步骤，服务重启后恢复的任务不会重复调用付费接口
         db = get_db()
         task_image_paths = {}
+        saved_prompts = {}
+        submitted_task_ids = set()
         for task_id in task_ids:
-            task = db.execute('SELECT image_path FROM tasks WHERE id = ?', (task_id,)).fetchone()
+            task = db.execute('SELECT image_path, prompt, request_id FROM tasks WHERE id = ?', (task_id,)).fetchone()
             if task and task['image_path']:
                 # 构建完整的图片路径
                 task_image_paths[task_id] = os.path.join(app.config['UPLOAD_FOLDER'], task['image_path'])
             else:
                 # 如果没有找到任务或图片路径，使用默认的图片路径
                 task_image_paths[task_id] = image_path
+            if task and task['prompt']:
+                saved_prompts[task_id] = task['prompt']
+            if task and task['request_id']:
+                submitted_task_ids.add(task_id)
 
-        # 按图片路径分组任务
+        # 按图片路径分组任务，已经提交过的任务由轮询阶段负责，不再重复处理
         tasks_by_image = {}
-        for i, task_id in enumerate(task_ids):
+        for task_id, params in zip(task_ids, params_list):
+            if task_id in submitted_task_ids:
+                logger.info(f"任务 {task_id} 已提交过视频生成，跳过")
+                continue
             img_path = task_image_paths[task_id]
             if img_path not in tasks_by_image:
                 tasks_by_image[img_path] = {
@@ -129,101 +198,295 @@ def process_batch_tasks(task_ids, image_path, params_list):
                     'params_list': []
                 }
             tasks_by_image[img_path]['task_ids'].append(task_id)
-            tasks_by_image[img_path]['params_list'].append(params_list[i])
+            tasks_by_image[img_path]['params_list'].append(params)
 
         # 对每个不同的图片进行处理
         for img_path, img_tasks in tasks_by_image.items():
             logger.info(f"处理图片: {img_path}, 任务数: {len(img_tasks['task_ids'])}")
 
             # 检查是否有预设的提示词
-            has_preset_prompt = False
+            refined_prompt = None
             for params in img_tasks['params_list']:
                 if 'prompt' in params and params['prompt']:
                     refined_prompt = params['prompt']
-                    has_preset_prompt = True
                     logger.info(f"使用预设的提示词: {refined_prompt}")
                     break
 
-            # 如果没有预设的提示词，则生成新的提示词
-            if not has_preset_prompt:
-                # 检查图片是否已经处理过
-                if img_path in processed_images:
-                    # 如果图片已经处理过，直接使用缓存的结果
-                    logger.info(f"使用缓存的图片处理结果: {img_path}")
-                    image_description = processed_images[img_path]['description']
-                    refined_prompt = processed_images[img_path]['prompt']
-                else:
-                    # 如果图片没有处理过，进行处理
-                    # Step 1: 使用VLM处理图片
-                    # 使用第一个任务的VLM模型参数
-                    vlm_model = img_tasks['params_list'][0].get('vlm_model', VLM_MODEL)
-                    api_key = img_tasks['params_list'][0].get('api_key', None)
-                    image_description = process_image_with_vlm(img_path, vlm_model=vlm_model, api_key=api_key)
-
-                    if not image_description:
-                        for task_id in img_tasks['task_ids']:
-                            update_task_status(task_id, 'failed', '处理图片失败')
-                        continue
-
-                    # 更新所有任务状态
-                    for task_id in img_tasks['task_ids']:
-                        update_task_status(task_id, 'refining_prompt', '正在精化提示词...')
-
-                    # Step 2: 精化提示词
-                    # 使用第一个任务的LLM模型和提示词模板参数
-                    llm_model = img_tasks['params_list'][0].get('llm_model', LLM_MODEL)
-                    user_prompt = img_tasks['params_list'][0].get('user_prompt', DEFAULT_USER_PROMPT)
-                    # 获取API Key
-                    api_key = img_tasks['params_list'][0].get('api_key', None)
-                    # 组合用户提示词和系统提示词
-                    prompt_template = get_full_prompt_template(user_prompt)
-                    refined_prompt = refine_prompt(image_description, llm_model=llm_model, prompt_template=prompt_template, api_key=api_key)
-
-                    if not refined_prompt:
-                        for task_id in img_tasks['task_ids']:
-                            update_task_status(task_id, 'failed', '精化提示词失败')
-                        continue
-
-                    # 将处理结果保存到缓存
-                    processed_images[img_path] = {
-                        'description': image_description,
-                        'prompt': refined_prompt
-                    }
-
-            # 更新所有任务的提示词
-            for task_id in img_tasks['task_ids']:
-                update_task_prompt(task_id, refined_prompt)
-                update_task_status(task_id, 'generating_video', '正在生成视频...')
-
-            # 为每个任务生成视频（使用不同的随机种子）
-            for i, (task_id, params) in enumerate(zip(img_tasks['task_ids'], img_tasks['params_list'])):
-                # 更新任务模型
-                model = params.get('model', I2V_MODEL)
-                update_task_model(task_id, model)
-
-                # 生成视频
-                logger.info(f"为任务 {task_id} 生成视频 (第 {i+1}/{len(img_tasks['task_ids'])} 个)")
-                # 获取API Key
-                api_key = params.get('api_key', None)
-
-                request_id = generate_video(
-                    img_path,
-                    refined_prompt,
-                    model=model,
-                    negative_prompt=params.get('negative_prompt', DEFAULT_NEGATIVE_PROMPT),
-                    image_size=params.get('image_size', DEFAULT_VIDEO_SIZE),
-                    seed=params.get('seed'),
-                    api_key=api_key
-                )
+            # 检查是否已经在之前的运行中生成过提示词
+            if not refined_prompt:
+                for task_id in img_tasks['task_ids']:
+                    if task_id in saved_prompts:
+                        refined_prompt = saved_prompts[task_id]
+                        logger.info(f"使用已保存的提示词: {refined_prompt}")
+                        break
 
-                # 更新任务的请求ID
-                update_task_request_id(task_id, request_id)
+            if refined_prompt:
+                queue_video_submissions(img_tasks['task_ids'], img_path, refined_prompt, img_tasks['params_list'])
+                continue
+
+            # 没有可用的提示词，交给图片描述阶段（描述和提示词缓存在各自的阶段中查找）
+            for task_id in img_tasks['task_ids']:
+                update_task_status(task_id, 'processing_image', '正在处理图片...')
+            submit_job('describe', img_tasks['task_ids'], img_tasks['task_ids'], img_path, img_tasks['params_list'])
 
     except Exception as e:
         logger.error(f"处理批量任务时出错: {str(e)}")
         for task_id in task_ids:
             update_task_status(task_id, 'failed', f'错误: {str(e)}')
 
+def find_near_duplicate_description(image_path, vlm_model):
+    """Return the cached description of a near-identical earlier image, or None."""
+    if NEAR_DUPLICATE_MAX_DISTANCE <= 0:
+        return None
+    try:
+        matches = image_index.find_similar(image_path, NEAR_DUPLICATE_MAX_DISTANCE, NEAR_DUPLICATE_MAX_COLOR_DIFF)
+    except Exception as e:
+        logger.error(f"查找近似图片时出错: {str(e)}")
+        return None
+
+    for digest, distance in matches:
+        image_description = description_cache.get(make_cache_key(digest, vlm_model), count=False)
+        if image_description:
+            logger.info(f"复用近似图片的描述: {image_path} (汉明距离 {distance})")
+            image_index.record_reuse()
+            return image_description
+    return None
+
+def describe_image_cached(image_path, vlm_model, api_key=None):
+    """
+    Describe an image with the VLM, reusing the description of identical or
+    near-identical image content.
+
+    A reused description also makes the prompt cache hit, so the refined prompt
+    of the earlier image is reused as well.
+    """
+    key = make_cache_key(file_sha256(image_path), vlm_model)
+    image_description = description_cache.get(key)
+    if image_description:
+        logger.info(f"使用缓存的图片描述: {image_path}")
+        return image_description
+
+    image_description = find_near_duplicate_description(image_path, vlm_model)
+    if image_description:
+        description_cache.set(key, image_description)
+        return image_description
+
+    image_description = process_image_with_vlm(image_path, vlm_model=vlm_model, api_key=api_key, raise_transient=True)
+    if image_description:
+        description_cache.set(key, image_description)
+    return image_description
+
+def describe_image(task_ids, image_path, params_list):
+    """Pipeline stage 1: describe the image with the VLM."""
+    try:
+        # 使用第一个任务的VLM模型参数
+        vlm_model = params_list[0].get('vlm_model', VLM_MODEL)
+        api_key = params_list[0].get('api_key', None)
+        image_description = describe_image_cached(image_path, vlm_model, api_key)
+
+        if not image_description:
+            for task_id in task_ids:
+                update_task_status(task_id, 'failed', '处理图片失败')
+            return
+
+        # 更新所有任务状态
+        for task_id in task_ids:
+            update_task_status(task_id, 'refining_prompt', '正在精化提示词...')
+
+        submit_job('refine', task_ids, task_ids, image_path, image_description, params_list)
+
+    except Exception as e:
+        if is_transient_error(e):
+            wait_for_retry(task_ids, e)
+            raise
+        logger.error(f"处理图片 {image_path} 时出错: {str(e)}")
+        for task_id in task_ids:
+            update_task_status(task_id, 'failed', f'错误: {str(e)}')
+
+def refine_prompt_cached(image_description, llm_model, prompt_template, api_key=None, use_cache=True):
+    """Refine a description with the LLM, reusing the result of an identical earlier request."""
+    if not use_cache:
+        return refine_prompt(image_description, llm_model=llm_model, prompt_template=prompt_template,
+                             api_key=api_key, temperature=PROMPT_TEMPERATURE, raise_transient=True)
+
+    key = make_cache_key(image_description, llm_model, prompt_template, PROMPT_TEMPERATURE)
+    refined_prompt = prompt_cache.get(key)
+    if refined_prompt:
+        logger.info("使用缓存的提示词")
+        return refined_prompt
+
+    refined_prompt = refine_prompt(image_description, llm_model=llm_model, prompt_template=prompt_template,
+                                   api_key=api_key, temperature=PROMPT_TEMPERATURE, raise_transient=True)
+    if refined_prompt:
+        prompt_cache.set(key, refined_prompt)
+    return refined_prompt
+
+def refine_image_prompt(task_ids, image_path, image_description, params_list):
+    """Pipeline stage 2: turn the image description into a video prompt with the LLM."""
+    try:
+        # 使用第一个任务的LLM模型和提示词模板参数
+        llm_model = params_list[0].get('llm_model', LLM_MODEL)
+        user_prompt = params_list[0].get('user_prompt', DEFAULT_USER_PROMPT)
+        api_key = params_list[0].get('api_key', None)
+        # 组合用户提示词和系统提示词
+        prompt_template = get_full_prompt_template(user_prompt)
+        # 需要每次生成不同提示词的任务不使用缓存
+        use_cache = PROMPT_CACHE_ENABLED and not params_list[0].get('vary_prompt')
+        refined_prompt = refine_prompt_cached(image_description, llm_model, prompt_template, api_key, use_cache=use_cache)
+
+        if not refined_prompt:
+            for task_id in task_ids:
+                update_task_status(task_id, 'failed', '精化提示词失败')
+            return
+
+        queue_video_submissions(task_ids, image_path, refined_prompt, params_list)
+
+    except Exception as e:
+        if is_transient_error(e):
+            wait_for_retry(task_ids, e)
+            raise
+        logger.error(f"精化图片 {image_path} 的提示词时出错: {str(e)}")
+        for task_id in task_ids:
+            update_task_status(task_id, 'failed', f'错误: {str(e)}')
+
+def queue_video_submissions(task_ids, image_path, prompt, params_list):
+    """Save the prompt of each task and queue one submit job per task."""
+    for task_id, params in zip(task_ids, params_list):
+        update_task(
+            task_id, prompt=prompt, model=params.get('model', I2V_MODEL),
+            status='generating_video', message='等待提交视频生成...'
+        )
+        submit_job('submit', [task_id], task_id, image_path, prompt, params)
+
+def submit_task_video(task_id, image_path, prompt, params):
+    """Pipeline stage 3: submit the video generation of one task and hand it to the poller."""
+    try:
+        # 已经提交过的任务由轮询阶段负责，不再重复提交
+        task = get_db().execute('SELECT request_id FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        if task is None:
+            logger.info(f"任务 {task_id} 已被删除，跳过提交")
+            return
+        if task['request_id']:
+            logger.info(f"任务 {task_id} 已提交过视频生成，跳过")
+            return
+
+        generation_key = make_generation_key(image_path, prompt, params)
+        if not generation_key:
+            start_video_generation(task_id, image_path, prompt, params)
+            return
+
+        # 相同的生成请求同一时间只提交一次：后到的任务复用已有的视频或正在生成的请求
+        with submission_locks.hold(generation_key):
+            if is_generation_cacheable(params) and reuse_generated_video(task_id, generation_key):
+                return
+            if SINGLE_FLIGHT_ENABLED and attach_to_inflight_request(task_id, generation_key, params):
+                return
+            update_task(task_id, generation_key=generation_key)
+            start_video_generation(task_id, image_path, prompt, params)
+
+    except Exception as e:
+        # 只有确定没有提交成功的错误才会重试，不会重复生成付费的视频
+        if is_transient_error(e, idempotent=False):
+            wait_for_retry([task_id], e)
+            raise
+        logger.error(f"提交任务 {task_id} 的视频生成时出错: {str(e)}")
+        update_task_status(task_id, 'failed', f'错误: {str(e)}')
+
+def start_video_generation(task_id, image_path, prompt, params):
+    """Submit the video generation of a task and hand the request to the poller."""
+    update_task_status(task_id, 'generating_video', '正在生成视频...')
+    request_id, elapsed = submit_video_generation(image_path, prompt, params)
+
+    if not request_id:
+        update_task_status(task_id, 'failed', '提交视频生成任务失败')
+        return
+
+    logger.info(f"任务 {task_id} 提交成功，耗时 {elapsed:.2f} 秒，request_id: {request_id}")
+
+    # 保存请求ID，交给共享的视频状态轮询器等待视频生成完成
+    submitted_at = time.time()
+    update_task(
+        task_id, request_id=request_id, submitted_at=datetime.fromtimestamp(submitted_at).isoformat(),
+        status='waiting_for_video', message=f'等待视频生成完成...（提交耗时 {elapsed:.1f} 秒）'
+    )
+    submit_job('poll', [task_id], request_id, task_id, params, submitted_at)
+
+def make_generation_key(image_path, prompt, params):
+    """
+    Return the key identifying identical generation requests, or None if the
+    request must not share its result with others.
+
+    Only requests with a fixed seed are identical: without one every task asks
+    for its own random video. Extended videos depend on more than the first
+    generation, and regenerated tasks explicitly ask for a new video.
+    """
+    if not (GENERATION_CACHE_ENABLED or SINGLE_FLIGHT_ENABLED) or params.get('extend') or params.get('regenerate'):
+        return None
+    if params.get('seed') is None:
+        return None
+    return make_cache_key(
+        file_sha256(image_path),
+        prompt,
+        params.get('negative_prompt', DEFAULT_NEGATIVE_PROMPT),
+        params.get('seed'),
+        params.get('model', I2V_MODEL),
+        params.get('image_size', DEFAULT_VIDEO_SIZE)
+    )
+
+def is_generation_cacheable(params):
+    """Only generations with a fixed seed are deterministic enough to reuse later."""
+    return GENERATION_CACHE_ENABLED and params.get('seed') is not None and not params.get('extend')
+
+def attach_to_inflight_request(task_id, generation_key, params):
+    """Attach a task to an identical request that is still generating. Returns True if attached."""
+    row = get_db().execute(
+        INFLIGHT_REQUEST_SQL,
+        (generation_key, task_id, 'generating_video', 'waiting_for_video')
+    ).fetchone()
+    if row is None:
+        return False
+
+    request_id = row['request_id']
+    submitted_at = datetime.fromisoformat(row['submitted_at']).timestamp() if row['submitted_at'] else time.time()
+    logger.info(f"任务 {task_id} 与正在生成的相同请求合并，request_id: {request_id}")
+
+    update_task(
+        task_id, generation_key=generation_key, request_id=request_id, submitted_at=row['submitted_at'],
+        status='waiting_for_video', message='相同的视频正在生成，等待共享结果...'
+    )
+    submit_job('poll', [task_id], request_id, task_id, params, submitted_at)
+    return True
+
+def reuse_generated_video(task_id, generation_key):
+    """Complete a task with the video of an identical earlier generation. Returns True on a hit."""
+    cached = generation_cache.get(generation_key, count=False)
+    hit = bool(cached) and os.path.exists(os.path.join(app.config['OUTPUT_FOLDER'], cached['video_path']))
+    generation_cache.record_lookup(hit)
+    if not hit:
+        return False
+
+    logger.info(f"任务 {task_id} 复用已生成的视频: {cached['video_path']}")
+    update_task(
+        task_id, generation_key=generation_key, video_path=cached['video_path'],
+        status='completed', message='视频生成成功（复用相同参数的生成结果）'
+    )
+    return True
+
+def submit_video_generation(image_path, prompt, params):
+    """Submit one video generation and return ``(request_id, elapsed_seconds)``."""
+    started = time.monotonic()
+    request_id = generate_video(
+        image_path,
+        prompt,
+        model=params.get('model', I2V_MODEL),
+        negative_prompt=params.get('negative_prompt', DEFAULT_NEGATIVE_PROMPT),
+        image_size=params.get('image_size', DEFAULT_VIDEO_SIZE),
+        seed=params.get('seed'),
+        api_key=params.get('api_key', None),
+        raise_transient=True
+    )
+    return request_id, time.monotonic() - started
+
 def process_task(task_id, image_path, params):
     """Background task to process an image and generate a video."""
     try:
@@ -249,81 +512,65 @@ def process_task(task_id, image_path, params):
             return
 
         # 调用批量处理函数，但只处理一个任务
+        # 提交成功后任务会交给共享的视频状态轮询器，不再在这里等待
         process_batch_tasks([task_id], task_image_path, [params])
 
-        # 获取请求ID
-        db = get_db()
-        task = db.execute('SELECT request_id FROM tasks WHERE id = ?', (task_id,)).fetchone()
-        request_id = task['request_id'] if task else None
-
-        if not request_id:
-            update_task_status(task_id, 'failed', '提交视频生成任务失败')
-            return
-
-        # Update task with the request ID
-        update_task_request_id(task_id, request_id)
-
-        # Step 4: Wait for the video to be generated
-        update_task_status(task_id, 'waiting_for_video', '等待视频生成完成...')
-
-        # 设置最大重试次数和等待时间
-        max_retries = 60  # 最多等待60次
-        retry_interval = 10  # 每次等待10秒
-        retries = 0
-
-        while retries < max_retries:
-            # 检查视频状态
-            # 获取API Key
-            api_key = params.get('api_key', None)
-            video_info = get_video_status(request_id, api_key=api_key)
-
-            # 如果获取到视频信息，说明视频已经生成完成
-            if video_info:
-                break
+    except Exception as e:
+        logger.error(f"处理任务 {task_id} 时出错: {str(e)}")
+        update_task_status(task_id, 'failed', f'错误: {str(e)}')
 
-            # 等待一段时间后再次检查
-            time.sleep(retry_interval)
-            retries += 1
-            logger.info(f"等待视频生成，已重试 {retries}/{max_retries} 次")
+def download_task_video(task_id, video_url, params, shared_task_ids=None):
+    """
+    Background job that downloads a finished video and extends it if requested.
 
-        # 如果达到最大重试次数仍未获取到视频信息，则标记为失败
-        if not video_info:
-            update_task_status(task_id, 'failed', '获取视频状态失败，请稍后再试')
+    ``shared_task_ids`` are other tasks attached to the same request; they get
+    the same downloaded video instead of downloading it again.
+    """
+    task_ids = [task_id] + list(shared_task_ids or [])
+    try:
+        # 如果任务已经有视频（例如被手动检查更新过），则不再重复下载
+        db = get_db()
+        tasks = []
+        for tid in task_ids:
+            task = db.execute('SELECT video_path, generation_key FROM tasks WHERE id = ?', (tid,)).fetchone()
+            if not task:
+                logger.info(f"任务 {tid} 已不存在，跳过下载")
+            elif task['video_path']:
+                logger.info(f"任务 {tid} 已有视频，跳过下载")
+            else:
+                tasks.append((tid, task))
+        if not tasks:
             return
+        task_id, task = tasks[0]
+        task_ids = [tid for tid, _ in tasks]
 
-        # Step 5: Download the video
-        video_url = video_info.get('url')
+        for tid in task_ids:
+            update_task_status(tid, 'downloading_video', '正在下载视频...')
 
-        # 设置下载重试参数
-        download_retries = 10  # 最多重试下载10次
-        download_retry_interval = 5  # 每次重试间隔为5秒
-        download_attempt = 0
-        downloaded_path = None
-
-        # 重试下载视频
-        while download_attempt < download_retries and not downloaded_path:
-            # 直接使用download_video函数下载视频
-            downloaded_path = download_video(video_url, app.config['OUTPUT_FOLDER'])
-
-            if downloaded_path:
-                break
-
-            download_attempt += 1
-            logger.info(f"下载视频失败，正在重试 {download_attempt}/{download_retries}")
-            update_task_status(task_id, 'downloading_video', f'下载视频中，重试 {download_attempt}/{download_retries}')
-            time.sleep(download_retry_interval)
+        # 超时、断线和5xx错误会抛出，由调度器按退避间隔重试整个下载任务
+        downloaded_path = download_video(video_url, app.config['OUTPUT_FOLDER'], raise_transient=True)
 
         if not downloaded_path:
-            update_task_status(task_id, 'failed', '下载视频失败，请稍后再试')
+            for tid in task_ids:
+                update_task_status(tid, 'failed', '下载视频失败，请稍后再试')
             return
 
-        # Update task with the video path
-        update_task_video_path(task_id, os.path.basename(downloaded_path))
+        video_filename = os.path.basename(downloaded_path)
+
+        # 记录生成结果，之后相同的请求可以直接复用
+        if task['generation_key'] and is_generation_cacheable(params):
+            generation_cache.set(task['generation_key'], {'video_path': video_filename})
 
-        # Step 6: Extend the video if requested
-        if params.get('extend', False):
-            update_task_status(task_id, 'extending_video', '正在延长视频...')
+        # Update task with the video path; 不需要延长的任务（包括共享请求的其他任务）直接完成
+        extend = params.get('extend', False)
+        for tid in task_ids:
+            if tid == task_id and extend:
+                update_task(tid, video_path=video_filename, status='extending_video', message='正在延长视频...')
+            else:
+                update_task(tid, video_path=video_filename, status='completed', message='视频生成成功')
 
+        # Extend the video if requested
+        if extend:
             # 获取任务的提示词
             db = get_db()
             task = db.execute('SELECT prompt FROM tasks WHERE id = ?', (task_id,)).fetchone()
@@ -348,68 +595,202 @@ def process_task(task_id, image_path, params):
                 return
 
             # Update task with the extended video path
-            update_task_video_path(task_id, os.path.basename(extended_video_path))
-
-        # Update task status to completed
-        update_task_status(task_id, 'completed', '视频生成成功')
+            update_task(
+                task_id, video_path=os.path.basename(extended_video_path),
+                status='completed', message='视频生成成功'
+            )
 
     except Exception as e:
-        logger.error(f"处理任务 {task_id} 时出错: {str(e)}")
-        update_task_status(task_id, 'failed', f'错误: {str(e)}')
+        if is_transient_error(e):
+            wait_for_retry(task_ids, e)
+            raise
+        logger.error(f"下载任务 {task_id} 的视频时出错: {str(e)}")
+        fail_tasks_quietly(task_ids, f'错误: {str(e)}')
+
+def watch_task_video(request_id, task_id, params, submitted_at, job_id=None):
+    """Detached job: register a submitted video with the shared status poller."""
+    # 补全模型和尺寸，轮询器按 (model, image_size) 选择历史耗时
+    params = dict(params, model=params.get('model') or I2V_MODEL, image_size=params.get('image_size') or DEFAULT_VIDEO_SIZE)
+    video_poller.watch(request_id, task_id, params, submitted_at=submitted_at, job_id=job_id)
+
+def on_video_ready(request_id, waiting_tasks, state):
+    """Poller callback: hand finished videos to the download stage."""
+    # 共享同一个请求的任务只下载一次视频；需要延长的任务各自处理
+    shared = [task_id for task_id, waiting in waiting_tasks.items() if not waiting['params'].get('extend')]
+    for task_id, waiting in waiting_tasks.items():
+        # 无论交接是否成功都要结束轮询任务，否则它会一直停留在运行状态
+        handed_over = []
+        try:
+            try:
+                update_task_generation_time(task_id, state['elapsed'])
+            except Exception as e:
+                logger.error(f"记录任务 {task_id} 的生成耗时失败: {str(e)}")
+
+            if shared and task_id == shared[0]:
+                handed_over = shared
+                submit_job('download', shared, task_id, state['url'], waiting['params'], shared[1:])
+            elif task_id not in shared:
+                handed_over = [task_id]
+                submit_job('download', [task_id], task_id, state['url'], waiting['params'])
+        except Exception as e:
+            logger.error(f"提交任务 {task_id} 的视频下载失败: {str(e)}")
+            fail_tasks_quietly(handed_over, f'提交视频下载失败: {str(e)}')
+        finally:
+            scheduler.complete_job(waiting['job_id'])
+
+def on_video_failed(request_id, waiting_tasks, reason):
+    """Poller callback: mark tasks whose generation failed or timed out."""
+    message = f'视频生成失败: {reason}' if reason else '获取视频状态失败，请稍后再试'
+    for task_id, waiting in waiting_tasks.items():
+        try:
+            fail_tasks_quietly([task_id], message)
+        finally:
+            scheduler.complete_job(waiting['job_id'])
+
+# 任务在调度器中最终失败时显示的消息
+JOB_FAILURE_MESSAGES = {
+    'describe': '处理图片失败',
+    'refine': '精化提示词失败',
+    'submit': '提交视频生成任务失败',
+    'download': '下载视频失败，请稍后再试'
+}
+
+def job_task_ids(stage, args):
+    """Return the IDs of the tasks a scheduler job works on."""
+    if stage == 'poll':
+        task_ids = args[1]
+    elif stage == 'download' and len(args) > 3 and args[3]:
+        # 共享下载的任务都在等待这一次下载
+        task_ids = [args[0]] + list(args[3])
+    else:
+        task_ids = args[0]
+    return list(task_ids) if isinstance(task_ids, (list, tuple)) else [task_ids]
+
+def fail_tasks_without_api_key(stage, args):
+    """JobStore callback: fail the tasks of a resumed job whose API key was lost."""
+    with app.app_context():
+        fail_tasks_quietly(job_task_ids(stage, args), SECRETS_LOST_ERROR)
+
+def wait_for_retry(task_ids, error):
+    """Tell the tasks of a job that failed transiently that the scheduler will retry it."""
+    for task_id in task_ids:
+        try:
+            update_task(task_id, message=f'暂时失败，稍后自动重试: {str(error)}')
+        except Exception as e:
+            logger.error(f"更新任务 {task_id} 的状态失败: {str(e)}")
+
+def fail_job_tasks(stage, args, error):
+    """Scheduler callback: fail the tasks of a job that will not be retried again."""
+    message = JOB_FAILURE_MESSAGES.get(stage, '处理失败')
+    fail_tasks_quietly(job_task_ids(stage, args), f'{message}: {str(error)}')
+
+def fail_tasks_quietly(task_ids, message):
+    """Mark tasks as failed, logging instead of raising if the update fails."""
+    for task_id in task_ids:
+        try:
+            update_task_status(task_id, 'failed', message)
+        except Exception as e:
+            logger.error(f"更新任务 {task_id} 的状态失败: {str(e)}")
 
 def update_task_status(task_id, status, message):
     """Update the status of a task in the database."""
-    db = get_db()
-    db.execute(
-        'UPDATE tasks SET status = ?, message = ?, updated_at = ? WHERE id = ?',
-        (status, message, datetime.now().isoformat(), task_id)
-    )
-    db.commit()
+    update_task(task_id, status=status, message=message)
 
-def update_task_prompt(task_id, prompt):
-    """Update the prompt of a task in the database."""
-    db = get_db()
-    db.execute(
-        'UPDATE tasks SET prompt = ?, updated_at = ? WHERE id = ?',
-        (prompt, datetime.now().isoformat(), task_id)
-    )
-    db.commit()
+def update_task_generation_time(task_id, seconds):
+    """Record how long the video generation of a task took."""
+    update_task(task_id, generation_seconds=seconds)
 
-def update_task_request_id(task_id, request_id):
-    """Update the request ID of a task in the database."""
-    db = get_db()
-    db.execute(
-        'UPDATE tasks SET request_id = ?, updated_at = ? WHERE id = ?',
-        (request_id, datetime.now().isoformat(), task_id)
-    )
-    db.commit()
+def merge_task_videos(task_id, video_paths, merged_prompt):
+    """Background job that merges videos into the given task."""
+    try:
+        # 合并视频
+        merged_path = merge_videos(video_paths)
 
-def update_task_video_path(task_id, video_path):
-    """Update the video path of a task in the database."""
-    db = get_db()
-    db.execute(
-        'UPDATE tasks SET video_path = ?, updated_at = ? WHERE id = ?',
-        (video_path, datetime.now().isoformat(), task_id)
-    )
-    db.commit()
+        if not merged_path:
+            update_task_status(task_id, 'failed', '合并视频失败')
+            return
 
-def update_task_model(task_id, model):
-    """Update the model of a task in the database."""
-    db = get_db()
-    db.execute(
-        'UPDATE tasks SET model = ?, updated_at = ? WHERE id = ?',
-        (model, datetime.now().isoformat(), task_id)
-    )
-    db.commit()
+        # 更新任务状态和视频路径；如果有合并的提示词，同时更新任务提示词
+        fields = {'video_path': os.path.basename(merged_path)}
+        if merged_prompt:
+            fields['prompt'] = merged_prompt
+        update_task(
+            task_id, status='completed', message=f'视频合成成功，合成了 {len(video_paths)} 个视频', **fields
+        )
+    except Exception as e:
+        logger.error(f"合并视频任务出错: {str(e)}")
+        update_task_status(task_id, 'failed', f'合并视频出错: {str(e)}')
 
-def update_task_request_id(task_id, request_id):
-    """Update the request ID of a task in the database."""
-    db = get_db()
-    db.execute(
-        'UPDATE tasks SET request_id = ?, updated_at = ? WHERE id = ?',
-        (request_id, datetime.now().isoformat(), task_id)
-    )
-    db.commit()
+def submit_job(stage, task_ids, *args):
+    """Submit a job to the scheduler, failing its tasks if the queue is full."""
+    try:
+        scheduler.submit(stage, *args)
+        return True
+    except SchedulerFullError as e:
+        logger.error(f"提交后台任务失败: {str(e)}")
+        for task_id in task_ids:
+            update_task_status(task_id, 'failed', '任务队列已满，请稍后再试')
+        return False
+
+scheduler.register_stage('batch', process_batch_tasks, workers=STAGE_WORKERS['batch'])
+scheduler.register_stage('task', process_task, workers=STAGE_WORKERS['task'])
+scheduler.register_stage('describe', describe_image, workers=STAGE_WORKERS['describe'])
+scheduler.register_stage('refine', refine_image_prompt, workers=STAGE_WORKERS['refine'])
+scheduler.register_stage('submit', submit_task_video, workers=STAGE_WORKERS['submit'])
+scheduler.register_stage('poll', watch_task_video, workers=STAGE_WORKERS['poll'], detached=True)
+scheduler.register_stage('download', download_task_video, workers=STAGE_WORKERS['download'])
+scheduler.register_stage('merge', merge_task_videos, workers=STAGE_WORKERS['merge'])
+
+# 根据历史任务学习每个 (model, image_size) 的生成耗时，用于安排轮询时间和估算完成时间
+completion_estimator = CompletionTimeEstimator(
+    min_interval=VIDEO_POLL_MIN_INTERVAL,
+    max_interval=VIDEO_POLL_MAX_INTERVAL,
+    fallback_interval=VIDEO_POLL_INTERVAL
+)
+
+def load_completion_history():
+    """Feed the completion times of recent tasks into the estimator."""
+    with app.app_context():
+        rows = get_db().execute(GENERATION_HISTORY_SQL).fetchall()
+    # 按时间顺序加入，保证每个配置保留的是最近的样本
+    for row in reversed(rows):
+        completion_estimator.record((row['model'], row['image_size'] or DEFAULT_VIDEO_SIZE), row['generation_seconds'])
+    logger.info(f"已加载 {len(rows)} 条视频生成耗时记录")
+
+load_completion_history()
+
+def task_eta(task):
+    """Estimated seconds until the video of a waiting task is ready, or None."""
+    if task['status'] != 'waiting_for_video' or not task['submitted_at']:
+        return None
+    try:
+        elapsed = time.time() - datetime.fromisoformat(task['submitted_at']).timestamp()
+    except ValueError:
+        return None
+    profile = (task['model'] or I2V_MODEL, task['image_size'] or DEFAULT_VIDEO_SIZE)
+    eta = completion_estimator.eta(profile, elapsed)
+    return round(eta) if eta is not None else None
+
+# 共享的视频状态轮询器，所有等待中的视频由一个线程统一轮询
+video_poller = VideoStatusPoller(
+    query_video_status,
+    on_complete=on_video_ready,
+    on_failed=on_video_failed,
+    estimator=completion_estimator,
+    timeout=VIDEO_POLL_TIMEOUT,
+    max_concurrency=VIDEO_POLL_CONCURRENCY,
+    context_factory=app.app_context
+)
+
+def start_background_workers():
+    """Start the scheduler and the poller; queued jobs from earlier runs are resumed."""
+    scheduler.start()
+    video_poller.start()
+
+@app.before_request
+def ensure_scheduler_started():
+    """Start the background workers in the process that serves requests."""
+    start_background_workers()
 
 @app.route('/')
 def index():
@@ -425,60 +806,255 @@ def task_list():
 def preview(task_id):
     """Render the video preview page."""
     db = get_db()
-    task = db.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
+    task = db.execute(TASK_BY_ID_SQL, (task_id,)).fetchone()
 
     if not task:
         return redirect(url_for('tasks'))
 
     return render_template('preview.html', task=task)
 
+# 任务列表可以返回的字段；eta 是根据状态计算的预计剩余时间（秒）
+TASK_LIST_FIELDS = [
+    'id', 'status', 'message', 'created_at', 'updated_at',
+    'image_path', 'prompt', 'video_path', 'parent_task_id',
+    'request_id', 'model', 'vlm_model', 'llm_model', 'prompt_template',
+    'image_size', 'submitted_at', 'generation_seconds', 'eta'
+]
+# 计算 eta 需要的列
+ETA_COLUMNS = ['status', 'submitted_at', 'model', 'image_size']
+
+def encode_task_cursor(task):
+    """Build the opaque cursor that continues a task list after ``task``."""
+    return base64.urlsafe_b64encode(json.dumps([task['created_at'], task['id']]).encode('utf-8')).decode('ascii')
+
+def decode_task_cursor(cursor):
+    """Return ``(created_at, id)`` of a task list cursor. Raises ValueError if it is invalid."""
+    try:
+        created_at, task_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError('无效的cursor参数')
+    return created_at, task_id
+
+def task_list_item(row, fields):
+    """Build the task list entry of a row with the requested fields."""
+    task_dict = {field: row[field] for field in fields if field != 'eta'}
+    if 'eta' in fields:
+        task_dict['eta'] = task_eta(row)
+    return task_dict
+
+def parse_task_list_args(args):
+    """
+    Parse the ``limit`` and ``fields`` query parameters of the task list.
+
+    Returns:
+        tuple: (limit, fields, columns); ``columns`` are the table columns to select
+    """
+    limit = args.get('limit', str(TASK_PAGE_SIZE))
+    if not limit.isdigit() or int(limit) < 1:
+        raise ValueError('limit 必须是正整数')
+    limit = min(int(limit), TASK_PAGE_MAX_SIZE)
+
+    fields = [f.strip() for f in args['fields'].split(',') if f.strip()] if args.get('fields') else TASK_LIST_FIELDS
+    unknown = [f for f in fields if f not in TASK_LIST_FIELDS]
+    if unknown:
+        raise ValueError(f"未知的字段: {', '.join(unknown)}")
+
+    # 只查询需要的列，游标总是需要 created_at 和 id
+    columns = [f for f in fields if f != 'eta']
+    for column in ['id', 'created_at'] + (ETA_COLUMNS if 'eta' in fields else []):
+        if column not in columns:
+            columns.append(column)
+
+    return limit, fields, columns
+
+def parse_task_filters(args):
+    """
+    Parse the ``status``, ``created_after`` and ``created_before`` query parameters.
+
+    Returns:
+        tuple: (statuses, conditions, params); ``statuses`` is None when every
+        status is included, ``conditions`` and ``params`` filter on the creation time
+    """
+    statuses = None
+    if args.get('status'):
+        statuses = [status.strip() for status in args['status'].split(',') if status.strip()] or None
+
+    conditions = []
+    params = []
+    if args.get('created_after'):
+        conditions.append('created_at > ?')
+        params.append(args['created_after'])
+    if args.get('created_before'):
+        conditions.append('created_at < ?')
+        params.append(args['created_before'])
+    return statuses, conditions, params
+
+def parse_sync_cursor(value):
+    """Parse a ``sync_cursor`` sent back by the client."""
+    if not value.isdigit():
+        raise ValueError('无效的since参数')
+    return int(value)
+
+def read_task_changes(db, since, fields, columns, limit, filters=None):
+    """
+    Read the tasks inserted or updated after the sync cursor ``since`` and
+    the IDs of tasks deleted after it.
+
+    ``filters`` are the ``(statuses, conditions, params)`` of ``parse_task_filters``.
+    Changed tasks outside the creation time range are left out. Changed tasks
+    whose status is no longer included are returned in ``deleted``, since
+    they left the filtered list.
+
+    ``reset`` is true when the cursor is too old (its tombstones were pruned)
+    or there are more than ``limit`` changes; the client should then reload
+    the list from the first page.
+
+    Returns:
+        dict: ``{"tasks", "deleted", "sync_cursor", "reset"}``, or None if nothing changed
+    """
+    sync_cursor = get_sync_value(db, 'task_revision')
+    if since == sync_cursor:
+        return None
+    if since < get_sync_value(db, 'tombstone_floor') or since > sync_cursor:
+        return {'tasks': [], 'deleted': [], 'sync_cursor': str(sync_cursor), 'reset': True}
+
+    statuses, conditions, params = filters or (None, [], [])
+    if statuses and 'status' not in columns:
+        columns = columns + ['status']
+    rows = db.execute(task_changes_sql(columns, conditions), [since] + params + [limit + 1]).fetchall()
+    deleted = [row['id'] for row in db.execute(
+        'SELECT id FROM task_tombstones WHERE revision > ? ORDER BY revision LIMIT ?', (since, limit + 1)
+    ).fetchall()]
+
+    if len(rows) > limit or len(deleted) > limit:
+        return {'tasks': [], 'deleted': [], 'sync_cursor': str(sync_cursor), 'reset': True}
+
+    if statuses:
+        deleted += [row['id'] for row in rows if row['status'] not in statuses]
+        rows = [row for row in rows if row['status'] in statuses]
+
+    return {
+        'tasks': [task_list_item(row, fields) for row in rows],
+        'deleted': deleted,
+        'sync_cursor': str(sync_cursor),
+        'reset': False
+    }
+
 @app.route('/api/tasks', methods=['GET'])
 def get_tasks():
-    """Get all tasks."""
+    """
+    Get one page of tasks, newest first, or the changes since a sync cursor.
+
+    Query parameters:
+        limit: Tasks per page (default ``TASK_PAGE_SIZE``)
+        cursor: ``next_cursor`` of the previous page
+        fields: Comma-separated fields to return (default all of ``TASK_LIST_FIELDS``)
+        status: Comma-separated statuses to include
+        created_after / created_before: Only tasks created after / before this ISO time
+        since: ``sync_cursor`` of an earlier response; returns only the tasks
+            that changed after it (see ``read_task_changes``), or 204 if none did.
+            ``status`` and ``created_after``/``created_before`` apply to the changes too
+
+    Returns ``{"tasks": [...], "next_cursor": ..., "sync_cursor": ...}``;
+    ``next_cursor`` is null on the last page.
+    """
     try:
-        db = get_db()
-        tasks = db.execute('SELECT * FROM tasks ORDER BY created_at DESC').fetchall()
-
-        # Convert tasks to a list of dictionaries
-        task_list = []
-        for task in tasks:
-            # 获取所有列名
-            columns = task.keys()
-
-            # 创建基本任务字典
-            task_dict = {
-                'id': task['id'],
-                'status': task['status'],
-                'message': task['message'],
-                'created_at': task['created_at'],
-                'updated_at': task['updated_at']
-            }
+        args = request.args
+        limit, fields, columns = parse_task_list_args(args)
+        filters = parse_task_filters(args)
+        statuses, created_conditions, created_params = filters
+
+        if args.get('since') is not None:
+            changes = read_task_changes(get_db(), parse_sync_cursor(args['since']), fields, columns, limit, filters)
+            return jsonify(changes) if changes is not None else ('', 204)
+
+        # 先读取修订号再读取任务，之后的增量同步不会漏掉读取期间的变化
+        sync_cursor = get_sync_value(get_db(), 'task_revision')
+
+        conditions = []
+        params = []
+        if args.get('cursor'):
+            created_at, task_id = decode_task_cursor(args['cursor'])
+            conditions.append(TASK_PAGE_CURSOR_CONDITION)
+            params.extend([created_at, task_id])
+        if statuses:
+            conditions.append(f"status IN ({', '.join('?' for _ in statuses)})")
+            params.extend(statuses)
+        conditions.extend(created_conditions)
+        params.extend(created_params)
+
+        rows = get_db().execute(task_page_sql(columns, conditions), params + [limit + 1]).fetchall()
+
+        next_cursor = encode_task_cursor(rows[limit - 1]) if len(rows) > limit else None
+        return jsonify({
+            'tasks': [task_list_item(row, fields) for row in rows[:limit]],
+            'next_cursor': next_cursor,
+            'sync_cursor': str(sync_cursor)
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"获取任务列表时出错: {str(e)}")
+        return jsonify({'error': f"获取任务列表时出错: {str(e)}"}), 500
 
-            # 添加可能存在的其他字段
-            optional_fields = [
-                'image_path', 'prompt', 'video_path', 'parent_task_id',
-                'request_id', 'model', 'vlm_model', 'llm_model', 'prompt_template'
-            ]
+@app.route('/api/tasks/events', methods=['GET'])
+def task_events():
+    """
+    Stream task changes as Server-Sent Events.
+
+    Every committed change to the tasks table wakes the stream, which sends
+    one ``tasks`` event with the same payload as ``GET /api/tasks?since=``.
+    The event ID is the sync cursor, so a reconnecting ``EventSource`` resumes
+    where it left off.
+
+    Query parameters:
+        since: Sync cursor to start from (default: now); the ``Last-Event-ID``
+            header takes precedence
+        fields / limit / status / created_after / created_before: As for ``GET /api/tasks``
+    """
+    try:
+        limit, fields, columns = parse_task_list_args(request.args)
+        filters = parse_task_filters(request.args)
+        since = request.headers.get('Last-Event-ID') or request.args.get('since')
+        since = parse_sync_cursor(since) if since else get_sync_value(get_db(), 'task_revision')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-            for field in optional_fields:
-                if field in columns:
-                    task_dict[field] = task[field]
-                else:
-                    task_dict[field] = None
+    db_path = app.config['DATABASE']
 
-            task_list.append(task_dict)
+    def stream():
+        nonlocal since
+        yield f"retry: {TASK_EVENTS_RETRY_MS}\n\n"
 
-        return jsonify(task_list)
-    except Exception as e:
-        logger.error(f"获取任务列表时出错: {str(e)}")
-        return jsonify({'error': f"获取任务列表时出错: {str(e)}"}), 500
+        # 事件流可能持续很久，使用自己的连接，客户端断开时关闭
+        db = connect(db_path)
+        try:
+            while True:
+                # 先记下通知计数再查询，查询期间提交的变更会让下面的等待立即返回
+                generation = task_changes.generation
+                changes = read_task_changes(db, since, fields, columns, limit, filters)
+                if changes is not None:
+                    since = int(changes['sync_cursor'])
+                    yield f"id: {since}\nevent: tasks\ndata: {json.dumps(changes, ensure_ascii=False)}\n\n"
+
+                # 超时也会重新查询一次，其他进程（如命令行）写入的变更最多延迟一个心跳周期
+                if task_changes.wait(generation, TASK_EVENTS_KEEPALIVE_SECONDS) == generation:
+                    yield ': keepalive\n\n'
+        finally:
+            db.close()
+
+    return Response(
+        stream(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/api/tasks/<task_id>', methods=['GET'])
 def get_task(task_id):
     """Get a specific task."""
     try:
         db = get_db()
-        task = db.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        task = db.execute(TASK_BY_ID_SQL, (task_id,)).fetchone()
 
         if not task:
             return jsonify({'error': 'Task not found'}), 404
@@ -498,7 +1074,8 @@ def get_task(task_id):
         # 添加可能存在的其他字段
         optional_fields = [
             'image_path', 'prompt', 'video_path', 'parent_task_id',
-            'request_id', 'model', 'vlm_model', 'llm_model', 'prompt_template'
+            'request_id', 'model', 'vlm_model', 'llm_model', 'prompt_template',
+            'image_size', 'submitted_at', 'generation_seconds'
         ]
 
         for field in optional_fields:
@@ -507,6 +1084,9 @@ def get_task(task_id):
             else:
                 task_dict[field] = None
 
+        # 预计剩余时间（秒）
+        task_dict['eta'] = task_eta(task)
+
         # 确保模型字段有默认值
         if not task_dict['model']:
             task_dict['model'] = I2V_MODEL
@@ -520,7 +1100,7 @@ def get_task(task_id):
 def check_task_video(task_id):
     """Check if a video is available for a task and update the task if needed."""
     db = get_db()
-    task = db.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
+    task = db.execute(TASK_BY_ID_SQL, (task_id,)).fetchone()
 
     if not task:
         return jsonify({'error': 'Task not found', 'updated': False}), 404
@@ -564,8 +1144,10 @@ def check_task_video(task_id):
 
             if downloaded_path:
                 # 更新任务状态和视频路径
-                update_task_status(task_id, 'completed', '视频生成成功')
-                update_task_video_path(task_id, os.path.basename(downloaded_path))
+                update_task(
+                    task_id, video_path=os.path.basename(downloaded_path),
+                    status='completed', message='视频生成成功'
+                )
 
                 # 记录下载成功信息
                 logger.info(f"Video downloaded for task {task_id}: {downloaded_path}")
@@ -587,6 +1169,67 @@ def check_task_video(task_id):
         logger.error(f"Error checking video status for task {task_id}: {str(e)}")
         return jsonify({'error': str(e), 'updated': False}), 500
 
+def parse_task_params(form, overrides=None):
+    """Build the task parameters from the form fields and optional per-task overrides."""
+    values = dict(form.items())
+    if overrides:
+        values.update({key: value for key, value in overrides.items() if value is not None})
+
+    params = {
+        'model': values.get('model', I2V_MODEL),
+        'vlm_model': values.get('vlm_model', VLM_MODEL),
+        'llm_model': values.get('llm_model', LLM_MODEL),
+        'negative_prompt': values.get('negative_prompt', DEFAULT_NEGATIVE_PROMPT),
+        'image_size': values.get('image_size', DEFAULT_VIDEO_SIZE),
+        'extend': str(values.get('extend', 'false')).lower() == 'true',
+        'user_prompt': values.get('user_prompt', DEFAULT_USER_PROMPT),
+        'vary_prompt': str(values.get('vary_prompt', 'false')).lower() == 'true',
+        'api_key': values.get('api_key', '')
+    }
+
+    # Get seed if provided
+    seed = str(values.get('seed', '')).strip()
+    if seed and seed.isdigit():
+        params['seed'] = int(seed)
+
+    # 预设的提示词（跳过VLM和LLM处理）
+    if values.get('prompt'):
+        params['prompt'] = values['prompt']
+
+    return params
+
+def save_uploaded_image(file):
+    """
+    Save an uploaded image under its content hash and return the filename.
+
+    The file stays pinned until ``upload_store.release`` is called, see ``UploadStore.save``.
+    """
+    filename = upload_store.save(file)
+    file_path = upload_store.path(filename)
+
+    # 计算感知哈希，之后可以找到与之近似的图片
+    try:
+        image_index.add(file_path)
+    except Exception as e:
+        logger.warning(f"计算图片感知哈希失败: {str(e)}")
+    return filename
+
+def insert_task_row(db, task_id, filename, params):
+    """Insert a new pending task row without committing."""
+    now = datetime.now().isoformat()
+    db.execute(
+        'INSERT INTO tasks (id, status, message, image_path, model, vlm_model, llm_model, prompt_template, image_size, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (
+            task_id, 'pending', '任务已创建', filename,
+            params.get('model', I2V_MODEL),
+            params.get('vlm_model', VLM_MODEL),
+            params.get('llm_model', LLM_MODEL),
+            params.get('user_prompt', DEFAULT_USER_PROMPT),
+            params.get('image_size', DEFAULT_VIDEO_SIZE),
+            now, now
+        )
+    )
+
 @app.route('/api/tasks', methods=['POST'])
 def create_task():
     """Create a new task."""
@@ -601,108 +1244,127 @@ def create_task():
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
 
-    # Generate a unique filename
-    filename = str(uuid.uuid4()) + os.path.splitext(file.filename)[1]
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-
     # Save the file
-    file.save(file_path)
+    filename = save_uploaded_image(file)
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
 
-    # Get parameters from form
-    params = {
-        'model': request.form.get('model', I2V_MODEL),
-        'vlm_model': request.form.get('vlm_model', VLM_MODEL),
-        'llm_model': request.form.get('llm_model', LLM_MODEL),
-        'negative_prompt': request.form.get('negative_prompt', DEFAULT_NEGATIVE_PROMPT),
-        'image_size': request.form.get('image_size', DEFAULT_VIDEO_SIZE),
-        'extend': request.form.get('extend', 'false').lower() == 'true',
-        'user_prompt': request.form.get('user_prompt', DEFAULT_USER_PROMPT),
-        'api_key': request.form.get('api_key', '')
-    }
+    try:
+        # Get parameters from form
+        params = parse_task_params(request.form)
 
-    # Get seed if provided
-    seed = request.form.get('seed')
-    if seed and seed.isdigit():
-        params['seed'] = int(seed)
+        # Generate a task ID
+        task_id = str(uuid.uuid4())
 
-    # Generate a task ID
-    task_id = str(uuid.uuid4())
+        # Create a new task in the database
+        db = get_db()
+        insert_task_row(db, task_id, filename, params)
+        db.commit()
+        task_changes.notify()
+    finally:
+        # 任务已经引用图片（或没有创建成功），不再需要保护它不被删除
+        upload_store.release(filename)
 
-    # Create a new task in the database
-    db = get_db()
-    try:
-        # 使用新的表结构，包含所有新字段
-        db.execute(
-            'INSERT INTO tasks (id, status, message, image_path, model, vlm_model, llm_model, prompt_template, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-            (
-                task_id, 'pending', '任务已创建', filename,
-                params.get('model', I2V_MODEL),
-                params.get('vlm_model', VLM_MODEL),
-                params.get('llm_model', LLM_MODEL),
-                params.get('user_prompt', DEFAULT_USER_PROMPT),
-                datetime.now().isoformat(), datetime.now().isoformat()
-            )
-        )
-    except sqlite3.OperationalError:
-        # 如果表中没有model字段，使用旧的表结构
-        db.execute(
-            'INSERT INTO tasks (id, status, message, image_path, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
-            (task_id, 'pending', '任务已创建', filename, datetime.now().isoformat(), datetime.now().isoformat())
-        )
-    db.commit()
-
-    # 将任务添加到批处理队列
-    # 检查是否有批量任务参数
-    batch_id = request.form.get('batch_id')
-
-    if batch_id:
-        # 如果是批量任务的一部分，将任务添加到批处理列表
-        if batch_id not in tasks:
-            tasks[batch_id] = {
-                'task_ids': [],
-                'params_list': []
-            }
+    # 提交单个任务到调度器
+    if not submit_job('task', [task_id], task_id, file_path, params):
+        return jsonify({'error': '任务队列已满，请稍后再试', 'task_id': task_id}), 503
 
-        tasks[batch_id]['task_ids'].append(task_id)
-        tasks[batch_id]['params_list'].append(params)
-
-        # 检查是否是批处理的最后一个任务
-        batch_size = int(request.form.get('batch_size', 1))
-        batch_index = int(request.form.get('batch_index', 0))
-
-        logger.info(f"添加任务到批处理队列: batch_id={batch_id}, index={batch_index}, size={batch_size}")
-
-        if batch_index == batch_size - 1:
-            # 如果是最后一个任务，启动批处理
-            batch_data = tasks[batch_id]
-
-            # 启动后台线程处理批量任务
-            def run_batch_with_context():
-                with app.app_context():
-                    # 使用任意图片路径作为默认值，实际上会从数据库中获取每个任务的图片路径
-                    process_batch_tasks(
-                        batch_data['task_ids'],
-                        "",  # 空字符串作为默认图片路径，实际上会从数据库中获取
-                        batch_data['params_list']
-                    )
-                    # 处理完成后清除批处理数据
-                    if batch_id in tasks:
-                        del tasks[batch_id]
-
-            thread = threading.Thread(target=run_batch_with_context)
-            thread.daemon = True
-            thread.start()
-    else:
-        # 如果不是批量任务，直接处理单个任务
-        def run_task_with_context():
-            with app.app_context():
-                process_task(task_id, file_path, params)
+    return jsonify({'task_id': task_id})
 
-        thread = threading.Thread(target=run_task_with_context)
-        thread.daemon = True
-        thread.start()
+@app.route('/api/tasks/bulk', methods=['POST'])
+def create_bulk_tasks():
+    """
+    Create tasks for many images in one request.
+
+    Form fields:
+        images / image: One or more image files
+        task_count: Number of tasks per image (ignored when param_sets is given)
+        param_sets: Optional JSON list of per-task parameter overrides; every image
+            gets one task per entry
+        Any other field of ``POST /api/tasks`` is shared by all tasks.
+    """
+    files = [f for f in request.files.getlist('images') + request.files.getlist('image') if f and f.filename]
+    if not files:
+        return jsonify({'error': 'No selected file'}), 400
 
-    return jsonify({'task_id': task_id})
+    # 解析每个任务的参数组合
+    try:
+        param_sets = json.loads(request.form.get('param_sets') or '[]')
+    except ValueError:
+        return jsonify({'error': 'param_sets 必须是JSON数组'}), 400
+    if not isinstance(param_sets, list) or not all(isinstance(item, dict) for item in param_sets):
+        return jsonify({'error': 'param_sets 必须是JSON对象数组'}), 400
+
+    if not param_sets:
+        task_count = request.form.get('task_count', '1')
+        if not task_count.isdigit() or int(task_count) < 1:
+            return jsonify({'error': 'task_count 必须是正整数'}), 400
+        param_sets = [{} for _ in range(int(task_count))]
+
+    total_tasks = len(files) * len(param_sets)
+    if total_tasks > BULK_MAX_TASKS:
+        return jsonify({'error': f'单次最多创建 {BULK_MAX_TASKS} 个任务'}), 400
+
+    # 保存所有图片，插入任务之前图片一直被保护，不会被同时进行的删除清理掉
+    filenames = []
+    insert_error = None
+    db = get_db()
+    try:
+        for file in files:
+            filenames.append(save_uploaded_image(file))
+
+        task_ids = []
+        params_list = []
+        for filename in filenames:
+            for overrides in param_sets:
+                params = parse_task_params(request.form, overrides)
+                # 如果同一张图片有多个任务，为没有指定种子的任务生成不同的随机种子
+                if len(param_sets) > 1 and 'seed' not in params:
+                    params['seed'] = random.randint(0, 2147483647)
+                task_ids.append(str(uuid.uuid4()))
+                params_list.append((filename, params))
+
+        # 在一个事务中插入所有任务
+        try:
+            for task_id, (filename, params) in zip(task_ids, params_list):
+                insert_task_row(db, task_id, filename, params)
+            db.commit()
+            task_changes.notify()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"批量创建任务时出错: {str(e)}")
+            insert_error = e
+    finally:
+        upload_store.release(*filenames)
+
+    if insert_error is not None:
+        for filename in set(filenames):
+            upload_store.remove_if_unused(db, filename)
+        return jsonify({'error': f'批量创建任务时出错: {str(insert_error)}'}), 500
+
+    logger.info(f"批量创建了 {len(task_ids)} 个任务，图片数: {len(filenames)}")
+
+    # 所有任务作为一个批处理一起提交，同一张图片只进行一次VLM和LLM处理
+    # 使用空字符串作为默认图片路径，实际上会从数据库中获取每个任务的图片路径
+    if not submit_job('batch', task_ids, task_ids, "", [params for _, params in params_list]):
+        return jsonify({'error': '任务队列已满，请稍后再试', 'task_ids': task_ids}), 503
+
+    return jsonify({'task_ids': task_ids})
+
+@app.route('/api/pipeline/stats', methods=['GET'])
+def get_pipeline_stats():
+    """Return queue depth, running jobs and throughput of every pipeline stage."""
+    return jsonify({
+        'stages': scheduler.stats(),
+        'poller': video_poller.stats(),
+        'video_endpoints': endpoint_selector.stats(),
+        'encoded_image_cache': encoded_image_cache.stats(),
+        'near_duplicates': image_index.stats(),
+        'caches': {
+            'vlm_description': description_cache.stats(),
+            'refined_prompt': prompt_cache.stats(),
+            'video_generation': generation_cache.stats()
+        }
+    })
 
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
@@ -720,36 +1382,16 @@ def delete_task(task_id):
     try:
         # 获取任务信息
         db = get_db()
-        task = db.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        task = db.execute(TASK_BY_ID_SQL, (task_id,)).fetchone()
 
         if not task:
             return jsonify({'error': '任务不存在'}), 404
 
-        # 删除图片文件（如果存在且没有其他任务使用）
-        if task['image_path']:
-            # 检查是否有其他任务使用相同的图片
-            other_tasks_using_image = db.execute(
-                'SELECT COUNT(*) as count FROM tasks WHERE image_path = ? AND id != ?',
-                (task['image_path'], task_id)
-            ).fetchone()['count']
-
-            if other_tasks_using_image > 0:
-                logger.info(f"图片 {task['image_path']} 被其他 {other_tasks_using_image} 个任务使用，不删除")
-            else:
-                # 如果没有其他任务使用该图片，则删除
-                image_path = os.path.join(app.config['UPLOAD_FOLDER'], task['image_path'])
-                try:
-                    if os.path.exists(image_path):
-                        os.remove(image_path)
-                        logger.info(f"已删除图片文件: {image_path}")
-                except Exception as e:
-                    logger.error(f"删除图片文件时出错: {str(e)}")
-
         # 删除视频文件（如果存在且没有其他任务使用）
         if task['video_path']:
             # 检查是否有其他任务使用相同的视频
             other_tasks_using_video = db.execute(
-                'SELECT COUNT(*) as count FROM tasks WHERE video_path = ? AND id != ?',
+                VIDEO_USERS_SQL,
                 (task['video_path'], task_id)
             ).fetchone()['count']
 
@@ -765,9 +1407,14 @@ def delete_task(task_id):
                 except Exception as e:
                     logger.error(f"删除视频文件时出错: {str(e)}")
 
-        # 从数据库中删除任务
+        # 从数据库中删除任务，触发器同时减少图片的引用计数
         db.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
         db.commit()
+        task_changes.notify()
+
+        # 删除图片文件（如果没有其他任务使用）
+        if task['image_path']:
+            upload_store.remove_if_unused(db, task['image_path'])
 
         return jsonify({'success': True, 'message': '任务已成功删除'})
 
@@ -784,7 +1431,7 @@ def regenerate_task(task_id):
         api_key = data.get('api_key', None)
         # 获取任务信息
         db = get_db()
-        task = db.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        task = db.execute(TASK_BY_ID_SQL, (task_id,)).fetchone()
 
         if not task:
             return jsonify({'error': '任务不存在'}), 404
@@ -800,9 +1447,10 @@ def regenerate_task(task_id):
         # 创建新任务记录
         db.execute(
             'INSERT INTO tasks (id, status, message, image_path, model, prompt, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
-            (new_task_id, 'pending', '任务已提交，等待处理', image_path, model, prompt, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            (new_task_id, 'pending', '任务已提交，等待处理', image_path, model, prompt, datetime.now().isoformat(), datetime.now().isoformat())
         )
         db.commit()
+        task_changes.notify()
 
         # 准备任务参数
         params = {
@@ -810,23 +1458,18 @@ def regenerate_task(task_id):
             'negative_prompt': DEFAULT_NEGATIVE_PROMPT,
             'width': 720,
             'height': 1280,
-            'api_key': api_key
+            'api_key': api_key,
+            'regenerate': True
         }
 
         # 如果有提示词，添加到参数中
         if prompt:
             params['prompt'] = prompt
 
-        # 启动任务处理线程
-        def run_task_with_context():
-            with app.app_context():
-                # 获取完整的图片路径
-                full_image_path = os.path.join(app.config['UPLOAD_FOLDER'], image_path)
-                process_task(new_task_id, full_image_path, params)
-
-        thread = threading.Thread(target=run_task_with_context)
-        thread.daemon = True
-        thread.start()
+        # 提交任务到调度器
+        full_image_path = os.path.join(app.config['UPLOAD_FOLDER'], image_path)
+        if not submit_job('task', [new_task_id], new_task_id, full_image_path, params):
+            return jsonify({'error': '任务队列已满，请稍后再试'}), 503
 
         return jsonify({
             'success': True,
@@ -844,7 +1487,7 @@ def get_last_frame(task_id):
     try:
         # 获取任务信息
         db = get_db()
-        task = db.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        task = db.execute(TASK_BY_ID_SQL, (task_id,)).fetchone()
 
         if not task:
             return jsonify({'error': '任务不存在'}), 404
@@ -929,7 +1572,7 @@ def regenerate_from_last_frame(task_id):
 
         # 获取任务信息
         db = get_db()
-        task = db.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        task = db.execute(TASK_BY_ID_SQL, (task_id,)).fetchone()
 
         if not task:
             return jsonify({'error': '任务不存在'}), 404
@@ -1001,9 +1644,10 @@ def regenerate_from_last_frame(task_id):
             # 创建新任务记录
             db.execute(
                 'INSERT INTO tasks (id, status, message, image_path, model, prompt, parent_task_id, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                (new_task_id, 'pending', '任务已提交，等待处理', last_frame_filename, model, prompt, task_id, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                (new_task_id, 'pending', '任务已提交，等待处理', last_frame_filename, model, prompt, task_id, datetime.now().isoformat(), datetime.now().isoformat())
             )
             db.commit()
+            task_changes.notify()
 
             # 准备任务参数
             params = {
@@ -1018,14 +1662,9 @@ def regenerate_from_last_frame(task_id):
             if prompt:
                 params['prompt'] = prompt
 
-            # 启动任务处理线程
-            def run_task_with_context():
-                with app.app_context():
-                    process_task(new_task_id, last_frame_path, params)
-
-            thread = threading.Thread(target=run_task_with_context)
-            thread.daemon = True
-            thread.start()
+            # 提交任务到调度器
+            if not submit_job('task', [new_task_id], new_task_id, last_frame_path, params):
+                return jsonify({'error': '任务队列已满，请稍后再试'}), 503
 
             return jsonify({
                 'success': True,
@@ -1054,7 +1693,7 @@ def check_video_status():
 
         # 直接调用SiliconFlow API获取视频状态
         from config import API_BASE_URL
-        import requests
+        from rate_limiter import throttled_post
 
         # 获取API Key
         from config import API_KEY
@@ -1077,7 +1716,9 @@ def check_video_status():
         api_url = f"{API_BASE_URL}/video/status"
         logger.info(f"Directly checking video status with API URL: {api_url}")
 
-        response = requests.post(
+        response = throttled_post(
+            'status',
+            api_key,
             api_url,
             headers=headers,
             json=payload
@@ -1104,7 +1745,8 @@ def check_all_videos():
         db = get_db()
         # 获取所有处于等待视频状态的任务
         tasks = db.execute(
-            'SELECT * FROM tasks WHERE (status = "waiting_for_video" OR status = "generating_video") AND request_id IS NOT NULL AND video_path IS NULL'
+            WAITING_TASKS_SQL,
+            ('waiting_for_video', 'generating_video')
         ).fetchall()
 
         logger.info(f"找到 {len(tasks)} 个等待视频的任务")
@@ -1133,8 +1775,10 @@ def check_all_videos():
 
                         if downloaded_path:
                             # 更新任务状态和视频路径
-                            update_task_status(task_id, 'completed', '视频生成成功')
-                            update_task_video_path(task_id, os.path.basename(downloaded_path))
+                            update_task(
+                                task_id, video_path=os.path.basename(downloaded_path),
+                                status='completed', message='视频生成成功'
+                            )
 
                             updated_tasks.append({
                                 'id': task_id,
@@ -1173,11 +1817,11 @@ def update_task_video(task_id):
         if not downloaded_path:
             return jsonify({'error': '下载视频失败'}), 500
 
-        # 更新任务状态
-        update_task_status(task_id, 'completed', '视频生成完成')
-
-        # 更新任务的视频路径
-        update_task_video_path(task_id, os.path.basename(downloaded_path))
+        # 更新任务的状态和视频路径
+        update_task(
+            task_id, video_path=os.path.basename(downloaded_path),
+            status='completed', message='视频生成完成'
+        )
 
         return jsonify({
             'success': True,
@@ -1212,10 +1856,10 @@ def test_api_key():
 
         # 使用一个简单的API调用来测试API Key是否有效
         # 这里使用模型列表API，这是一个轻量级调用
-        import requests
+        import http_client
         from config import API_BASE_URL
 
-        response = requests.get(
+        response = http_client.get(
             f"{API_BASE_URL}/models",
             headers=headers
         )
@@ -1275,7 +1919,7 @@ def merge_videos_api():
         first_task_model = None  # 用于存储第一个任务的模型
 
         for i, task_id in enumerate(task_ids):
-            task = db.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
+            task = db.execute(TASK_BY_ID_SQL, (task_id,)).fetchone()
 
             if not task:
                 return jsonify({'error': f'任务 {task_id} 不存在'}), 404
@@ -1334,34 +1978,11 @@ def merge_videos_api():
                 (new_task_id, 'merging_videos', merge_message, datetime.now().isoformat(), datetime.now().isoformat())
             )
         db.commit()
+        task_changes.notify()
 
-        # 启动后台线程合并视频
-        def merge_videos_thread():
-            try:
-                with app.app_context():
-                    # 合并视频
-                    merged_path = merge_videos(video_paths)
-
-                    if not merged_path:
-                        update_task_status(new_task_id, 'failed', '合并视频失败')
-                        return
-
-                    # 更新任务状态和视频路径
-                    update_task_status(new_task_id, 'completed', f'视频合成成功，合成了 {len(video_paths)} 个视频')
-                    update_task_video_path(new_task_id, os.path.basename(merged_path))
-
-                    # 如果有合并的提示词，更新任务提示词
-                    if merged_prompt:
-                        update_task_prompt(new_task_id, merged_prompt)
-            except Exception as e:
-                logger.error(f"合并视频线程出错: {str(e)}")
-                with app.app_context():
-                    update_task_status(new_task_id, 'failed', f'合并视频出错: {str(e)}')
-
-        # 启动线程
-        thread = threading.Thread(target=merge_videos_thread)
-        thread.daemon = True
-        thread.start()
+        # 提交合并任务到调度器
+        if not submit_job('merge', [new_task_id], new_task_id, video_paths, merged_prompt):
+            return jsonify({'error': '任务队列已满，请稍后再试'}), 503
 
         return jsonify({
             'success': True,
@@ -1379,7 +2000,7 @@ def open_task_folder(task_id):
     try:
         # 获取任务信息
         db = get_db()
-        task = db.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        task = db.execute(TASK_BY_ID_SQL, (task_id,)).fetchone()
 
         if not task:
             return jsonify({'error': '任务不存在'}), 404
@@ -1433,4 +2054,7 @@ def open_task_folder(task_id):
         return jsonify({'error': f'打开任务文件夹时出错: {str(e)}'}), 500
 
 if __name__ == '__main__':
+    # 调试模式下重载器的父进程不处理请求，只在实际服务的子进程中恢复后台任务
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_workers()
     app.run(debug=True, port=5001)
@@ -0,0 +1,124 @@
+"""
+Benchmark the hot queries on the tasks table.
+
+Fills a temporary database with synthetic tasks, then prints the query plan
+(``EXPLAIN QUERY PLAN``) and the average run time of every query the
+application runs on the tasks table. Run it with ``--without-indexes`` to
+compare against full table scans.
+
+Usage:
+    python benchmark_db.py [--tasks 100000] [--runs 20] [--without-indexes]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from database import connect, create_schema, get_sync_value, TASK_INDEXES
+from database import (TASK_BY_ID_SQL, WAITING_TASKS_SQL, VIDEO_USERS_SQL, INFLIGHT_REQUEST_SQL, GENERATION_HISTORY_SQL,
+                      TASK_PAGE_CURSOR_CONDITION, task_page_sql, task_changes_sql)
+from upload_store import REFCOUNT_SQL
+
+# 网页任务列表请求的列（static/js/task-manager.js 的 TASK_LIST_FIELDS 加上计算 eta 需要的列）
+LIST_COLUMNS = ['id', 'status', 'message', 'created_at', 'image_path', 'video_path', 'parent_task_id', 'request_id',
+                'submitted_at', 'model', 'image_size']
+
+STATUSES = ['completed'] * 90 + ['failed'] * 6 + ['waiting_for_video'] * 2 + ['generating_video', 'pending']
+
+
+def fill_tasks(db, count):
+    """Insert ``count`` synthetic tasks and return a sample task."""
+    started = datetime.now() - timedelta(days=365)
+    rows = []
+    for i in range(count):
+        task_id = str(uuid.uuid4())
+        status = random.choice(STATUSES)
+        created_at = (started + timedelta(seconds=i * 300)).isoformat()
+        done = status == 'completed'
+        rows.append((
+            task_id, status, '', f"{uuid.uuid4().hex}.jpg", 'prompt',
+            f"req-{i}" if status != 'pending' else None,
+            f"video_{i}.mp4" if done else None,
+            'Wan-AI/Wan2.1-I2V-14B-720P', '1280x720',
+            rows[-1][0] if rows and i % 10 == 0 else None,
+            random.uniform(60, 600) if done else None,
+            uuid.uuid4().hex, created_at, created_at
+        ))
+
+    db.executemany(
+        'INSERT INTO tasks (id, status, message, image_path, prompt, request_id, video_path, model, image_size, '
+        'parent_task_id, generation_seconds, generation_key, created_at, updated_at) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        rows
+    )
+    db.commit()
+    return rows[len(rows) // 2]
+
+
+def hot_queries(sample, revision):
+    """
+    The queries the application runs on the tasks table, as ``(name, sql, params)``.
+
+    The SQL comes from the same constants and builders the application uses,
+    so the benchmark measures exactly what the application runs.
+
+    ``revision`` is the current task revision; the delta sync query asks for
+    the last few changes, as a client polling in steady state would.
+    """
+    task_id, video_path = sample[0], sample[6] or 'video_0.mp4'
+    return [
+        ('get task', TASK_BY_ID_SQL, (task_id,)),
+        ('list tasks: first page', task_page_sql(LIST_COLUMNS), (51,)),
+        ('list tasks: next page',
+         task_page_sql(LIST_COLUMNS, [TASK_PAGE_CURSOR_CONDITION]), (sample[12], sample[0], 51)),
+        ('check all videos', WAITING_TASKS_SQL, ('waiting_for_video', 'generating_video')),
+        ('delete: video in use', VIDEO_USERS_SQL, (video_path, task_id)),
+        ('in-flight request', INFLIGHT_REQUEST_SQL, (sample[11], task_id, 'generating_video', 'waiting_for_video')),
+        ('generation history', GENERATION_HISTORY_SQL, ()),
+        ('task changes since', task_changes_sql(LIST_COLUMNS), (revision - 5, 51)),
+        ('upload refcount', REFCOUNT_SQL, (sample[3],)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the hot queries on the tasks table')
+    parser.add_argument('--tasks', type=int, default=100000, help='Number of synthetic tasks')
+    parser.add_argument('--runs', type=int, default=20, help='Runs per query')
+    parser.add_argument('--without-indexes', action='store_true', help='Drop the secondary indexes first')
+    args = parser.parse_args()
+
+    random.seed(42)
+    with tempfile.TemporaryDirectory() as directory:
+        db = connect(os.path.join(directory, 'benchmark.sqlite'))
+        create_schema(db)
+        if args.without_indexes:
+            for name in TASK_INDEXES:
+                db.execute(f'DROP INDEX {name}')
+
+        started = time.perf_counter()
+        sample = fill_tasks(db, args.tasks)
+        db.execute('ANALYZE')
+        print(f"Inserted {args.tasks} tasks in {time.perf_counter() - started:.1f} s\n")
+
+        revision = get_sync_value(db, 'task_revision')
+        for name, sql, params in hot_queries(sample, revision):
+            plan = db.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+
+            started = time.perf_counter()
+            for _ in range(args.runs):
+                db.execute(sql, params).fetchall()
+            elapsed = (time.perf_counter() - started) / args.runs * 1000
+
+            print(f"{name}: {elapsed:.2f} ms")
+            for row in plan:
+                print(f"    {row['detail']}")
+
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -72,3 +72,113 @@ def get_full_prompt_template(user_prompt=None):
 
 # File paths
 OUTPUT_DIR = "output"  # Directory to save generated videos
+
+# Pipeline Configuration
+# 后台处理拆分为多个阶段，每个阶段有自己的队列和工作线程：
+# 拆分批量任务 -> 图片描述(VLM) -> 精化提示词(LLM) -> 提交视频生成 -> 轮询状态 -> 下载
+SCHEDULER_QUEUE_SIZE = int(os.environ.get('SCHEDULER_QUEUE_SIZE', 1000))  # 每个阶段在内存中排队的最大任务数
+STAGE_WORKERS = {
+    'batch': int(os.environ.get('STAGE_WORKERS_BATCH', 2)),  # 拆分批量任务并分发到后续阶段
+    'task': int(os.environ.get('STAGE_WORKERS_TASK', 2)),  # 单个任务（查找图片后按批量任务处理）
+    'describe': int(os.environ.get('STAGE_WORKERS_DESCRIBE', 4)),  # 使用VLM描述图片
+    'refine': int(os.environ.get('STAGE_WORKERS_REFINE', 4)),  # 使用LLM精化提示词
+    'submit': int(os.environ.get('STAGE_WORKERS_SUBMIT', 4)),  # 提交视频生成请求
+    'poll': int(os.environ.get('STAGE_WORKERS_POLL', 1)),  # 把已提交的请求交给视频状态轮询器
+    'download': int(os.environ.get('STAGE_WORKERS_DOWNLOAD', 4)),  # 下载（以及延长）生成的视频
+    'merge': int(os.environ.get('STAGE_WORKERS_MERGE', 1)),  # 视频合并（ffmpeg）
+}
+BULK_MAX_TASKS = int(os.environ.get('BULK_MAX_TASKS', 500))  # 批量接口单次请求最多创建的任务数
+
+# 持久化任务队列：任务保存在数据库中，服务重启后自动恢复
+JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', 60))  # 租约时长，进程退出后超过该时间其任务会被重新领取
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))  # 任务抛出异常时的最大尝试次数
+JOB_RETRY_DELAY = float(os.environ.get('JOB_RETRY_DELAY', 30))  # 重试的基础延迟（指数退避）
+# 加密保存任务中的 API Key 的密钥（Fernet 格式，需要安装 cryptography）
+# 不设置时 API Key 只保存在内存中，服务重启或由其他进程领取的未完成任务会失败并提示重新提交
+JOB_SECRET_KEY = os.environ.get('JOB_SECRET_KEY', '')
+
+# Task List
+# 任务列表接口按创建时间倒序分页（游标分页），每页的任务数
+TASK_PAGE_SIZE = int(os.environ.get('TASK_PAGE_SIZE', 50))  # 默认每页任务数
+TASK_PAGE_MAX_SIZE = int(os.environ.get('TASK_PAGE_MAX_SIZE', 500))  # 每页最多任务数
+# 增量同步：被删除任务的墓碑保留时间（天），更久没有同步的页面会重新加载任务列表
+TASK_TOMBSTONE_RETENTION_DAYS = float(os.environ.get('TASK_TOMBSTONE_RETENTION_DAYS', 7))
+# 任务事件流（SSE）：没有变更时发送心跳的间隔（秒），断线后浏览器重连的等待时间（毫秒）
+TASK_EVENTS_KEEPALIVE_SECONDS = float(os.environ.get('TASK_EVENTS_KEEPALIVE_SECONDS', 15))
+TASK_EVENTS_RETRY_MS = int(os.environ.get('TASK_EVENTS_RETRY_MS', 2000))
+
+# Video Submit Endpoint
+# 记住每个 base URL 和模型可用的提交接口（/videos 或 /video/submit），每次只发送一次请求
+VIDEO_ENDPOINT_FAILURE_THRESHOLD = int(os.environ.get('VIDEO_ENDPOINT_FAILURE_THRESHOLD', 3))  # 连续失败多少次后切换到另一个接口
+VIDEO_ENDPOINT_REPROBE_SECONDS = float(os.environ.get('VIDEO_ENDPOINT_REPROBE_SECONDS', 600))  # 使用备用接口时，每隔多少秒重新探测首选接口
+
+# Video Status Polling
+# 所有等待中的视频由一个共享的轮询器统一检查状态
+# 轮询间隔根据历史任务的耗时分布自适应：早期稀疏，预计完成时间附近密集
+VIDEO_POLL_INTERVAL = float(os.environ.get('VIDEO_POLL_INTERVAL', 10))  # 没有历史数据时的固定轮询间隔（秒）
+VIDEO_POLL_MIN_INTERVAL = float(os.environ.get('VIDEO_POLL_MIN_INTERVAL', 3))  # 预计完成时间附近的轮询间隔（秒）
+VIDEO_POLL_MAX_INTERVAL = float(os.environ.get('VIDEO_POLL_MAX_INTERVAL', 60))  # 两次轮询之间的最长间隔（秒）
+VIDEO_POLL_TIMEOUT = float(os.environ.get('VIDEO_POLL_TIMEOUT', 600))  # 超过该秒数仍未完成则视为失败
+VIDEO_POLL_CONCURRENCY = int(os.environ.get('VIDEO_POLL_CONCURRENCY', 4))  # 同时进行的状态查询数量
+
+# Rate Limiting
+# 按 API Key 和接口类型限流：每分钟请求数(rpm)、每分钟token数(tpm)、同时进行的请求数(max_in_flight)
+# 设置为0表示不限制该项
+RATE_LIMITS = {
+    'chat': {  # VLM 图片识别和 LLM 提示词精化
+        'rpm': int(os.environ.get('RATE_LIMIT_CHAT_RPM', 60)),
+        'tpm': int(os.environ.get('RATE_LIMIT_CHAT_TPM', 100000)),
+        'max_in_flight': int(os.environ.get('RATE_LIMIT_CHAT_IN_FLIGHT', 8)),
+    },
+    'video_submit': {  # 提交视频生成
+        'rpm': int(os.environ.get('RATE_LIMIT_VIDEO_SUBMIT_RPM', 20)),
+        'max_in_flight': int(os.environ.get('RATE_LIMIT_VIDEO_SUBMIT_IN_FLIGHT', 4)),
+    },
+    'status': {  # 查询视频状态
+        'rpm': int(os.environ.get('RATE_LIMIT_STATUS_RPM', 300)),
+        'max_in_flight': int(os.environ.get('RATE_LIMIT_STATUS_IN_FLIGHT', 8)),
+    },
+}
+RATE_LIMIT_MAX_RETRIES = int(os.environ.get('RATE_LIMIT_MAX_RETRIES', 3))  # 收到429后的最大重试次数
+
+# Image Preprocessing
+# 上传前修正方向、裁剪到视频宽高比并缩小，按大小预算重新编码
+IMAGE_PREPROCESS_ENABLED = os.environ.get('IMAGE_PREPROCESS_ENABLED', 'true').lower() == 'true'
+IMAGE_UPLOAD_MAX_KB = int(os.environ.get('IMAGE_UPLOAD_MAX_KB', 1024))  # 上传图片的大小预算（KB）
+IMAGE_JPEG_QUALITY = int(os.environ.get('IMAGE_JPEG_QUALITY', 90))  # 重新编码时首先尝试的JPEG质量
+IMAGE_MIN_JPEG_QUALITY = int(os.environ.get('IMAGE_MIN_JPEG_QUALITY', 60))  # 低于该质量时改为缩小尺寸
+IMAGE_CROP_TO_VIDEO = os.environ.get('IMAGE_CROP_TO_VIDEO', 'false').lower() == 'true'  # 居中裁剪到视频宽高比（可能裁掉主体），默认只等比缩小
+VLM_IMAGE_MAX_SIDE = int(os.environ.get('VLM_IMAGE_MAX_SIDE', 1024))  # 发送给VLM的图片最长边
+
+# Result Caches
+# 图片描述按图片内容和VLM模型缓存在数据库中，超出数量时淘汰最久未使用的条目
+VLM_CACHE_MAX_ENTRIES = int(os.environ.get('VLM_CACHE_MAX_ENTRIES', 10000))
+VLM_CACHE_TTL_DAYS = float(os.environ.get('VLM_CACHE_TTL_DAYS', 30))  # 图片描述的有效期（天）
+# 精化后的提示词按 (图片描述, LLM模型, 提示词模板, 温度) 缓存；任务可以选择每次重新生成
+PROMPT_CACHE_ENABLED = os.environ.get('PROMPT_CACHE_ENABLED', 'true').lower() == 'true'
+PROMPT_CACHE_MAX_ENTRIES = int(os.environ.get('PROMPT_CACHE_MAX_ENTRIES', 10000))
+PROMPT_CACHE_TTL_DAYS = float(os.environ.get('PROMPT_CACHE_TTL_DAYS', 30))  # 提示词的有效期（天）
+PROMPT_TEMPERATURE = float(os.environ.get('PROMPT_TEMPERATURE', 0.7))  # 精化提示词时LLM的温度
+# 近似重复图片（重新导出、轻微裁剪或重新压缩）按感知哈希(dHash)匹配，复用之前图片的描述和提示词
+NEAR_DUPLICATE_MAX_DISTANCE = int(os.environ.get('NEAR_DUPLICATE_MAX_DISTANCE', 6))  # 最大汉明距离（共64位），0表示不复用
+NEAR_DUPLICATE_MAX_COLOR_DIFF = float(os.environ.get('NEAR_DUPLICATE_MAX_COLOR_DIFF', 24))  # 4x4网格每格平均颜色的最大差异（0-255），颜色不同的变体不复用
+# 生成结果缓存（可选）：固定种子且 (图片内容, 提示词, 负面提示词, 种子, 模型, 尺寸) 完全相同时直接复用已生成的视频
+GENERATION_CACHE_ENABLED = os.environ.get('GENERATION_CACHE_ENABLED', 'false').lower() == 'true'
+GENERATION_CACHE_MAX_ENTRIES = int(os.environ.get('GENERATION_CACHE_MAX_ENTRIES', 5000))
+GENERATION_CACHE_TTL_DAYS = float(os.environ.get('GENERATION_CACHE_TTL_DAYS', 30))  # 生成结果的有效期（天）
+# 相同的生成请求（固定种子）正在进行时，后提交的任务合并到该请求并共享下载的视频，不再重复提交；没有种子的任务各自生成
+SINGLE_FLIGHT_ENABLED = os.environ.get('SINGLE_FLIGHT_ENABLED', 'true').lower() == 'true'
+
+# Encoded Image Cache
+# 同一张图片的base64编码只计算一次，VLM和所有视频提交共用
+ENCODED_IMAGE_CACHE_MB = int(os.environ.get('ENCODED_IMAGE_CACHE_MB', 256))  # 缓存的编码结果总大小上限（MB）
+
+# HTTP Client
+# 所有API请求和下载共用一个带连接池的会话，复用TCP/TLS连接
+HTTP_POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', 10))  # 缓存连接池的主机数
+HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 32))  # 每个主机保持的最大连接数，应不小于各阶段工作线程数之和
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 10))  # 建立连接的超时时间（秒）
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 120))  # 等待响应的超时时间（秒）
+HTTP_MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', 3))  # 连接失败（以及GET请求的5xx）的最大重试次数
+HTTP_RETRY_BACKOFF = float(os.environ.get('HTTP_RETRY_BACKOFF', 0.5))  # 重试的退避系数（秒）
+HTTP_ASYNC_MAX_CONNECTIONS = int(os.environ.get('HTTP_ASYNC_MAX_CONNECTIONS', 100))  # 异步接口每个事件循环的最大连接数
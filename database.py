@@ -1,77 +1,390 @@
 """
 Database module for SiliconFlow I2V Generator.
+
+The database runs in WAL mode, so the UI can read while background workers
+write. Every thread keeps its own connection open and reuses it across
+requests and jobs.
 """
 
 import sqlite3
+import threading
+import time
+from datetime import datetime
+
 import click
 from flask import current_app, g
 from flask.cli import with_appcontext
 
+from task_events import ChangeNotifier
+
+# 每个线程复用自己的数据库连接
+_local = threading.local()
+
+# 任务提交变更后通知事件流（/api/tasks/events）
+task_changes = ChangeNotifier()
+
+# 可以通过 update_task 更新的字段
+TASK_FIELDS = {
+    'status', 'message', 'image_path', 'prompt', 'request_id', 'video_path', 'model',
+    'vlm_model', 'llm_model', 'prompt_template', 'parent_task_id', 'image_size',
+    'submitted_at', 'generation_seconds', 'generation_key'
+}
+
+# tasks表的二级索引：名称 -> 定义
+TASK_INDEXES = {
+    # 任务列表按 (创建时间, ID) 排序和分页
+    'idx_tasks_created_at_id': 'tasks (created_at, id)',
+    # 检查等待中的视频：只包含已提交但还没有视频的任务，索引很小
+    'idx_tasks_waiting': 'tasks (status) WHERE request_id IS NOT NULL AND video_path IS NULL',
+    # 删除任务时检查视频是否被其他任务使用
+    'idx_tasks_video_path': 'tasks (video_path) WHERE video_path IS NOT NULL',
+    # 延长视频等派生任务
+    'idx_tasks_parent_task_id': 'tasks (parent_task_id)',
+    # 合并相同的生成请求
+    'idx_tasks_generation_key': 'tasks (generation_key)',
+    # 增量同步读取修订号之后变化的任务
+    'idx_tasks_revision': 'tasks (revision)',
+    # 自适应轮询读取最近的生成耗时
+    'idx_tasks_generation_history': 'tasks (created_at) WHERE generation_seconds IS NOT NULL',
+}
+
+# 应用在tasks表上的热点查询，benchmark_db.py 测量的也是这些语句
+TASK_BY_ID_SQL = 'SELECT * FROM tasks WHERE id = ?'
+WAITING_TASKS_SQL = 'SELECT * FROM tasks WHERE status IN (?, ?) AND request_id IS NOT NULL AND video_path IS NULL'
+VIDEO_USERS_SQL = 'SELECT COUNT(*) as count FROM tasks WHERE video_path = ? AND id != ?'
+INFLIGHT_REQUEST_SQL = (
+    'SELECT request_id, submitted_at FROM tasks WHERE generation_key = ? AND id != ? '
+    'AND request_id IS NOT NULL AND video_path IS NULL AND status IN (?, ?) '
+    'ORDER BY submitted_at DESC LIMIT 1'
+)
+GENERATION_HISTORY_SQL = (
+    'SELECT model, image_size, generation_seconds FROM tasks '
+    'WHERE generation_seconds IS NOT NULL ORDER BY created_at DESC LIMIT 2000'
+)
+# 任务列表的分页条件，参数为上一页最后一个任务的 (created_at, id)
+TASK_PAGE_CURSOR_CONDITION = '(created_at, id) < (?, ?)'
+
+def task_page_sql(columns, conditions=()):
+    """Return the task list query: ``columns`` of the tasks matching ``conditions``, newest first, with a LIMIT parameter."""
+    where = f"WHERE {' AND '.join(conditions)} " if conditions else ''
+    return f"SELECT {', '.join(columns)} FROM tasks {where}ORDER BY created_at DESC, id DESC LIMIT ?"
+
+def task_changes_sql(columns, conditions=()):
+    """Return the delta sync query: ``columns`` of the tasks changed after a revision parameter, with a LIMIT parameter."""
+    where = ''.join(f' AND {condition}' for condition in conditions)
+    return f"SELECT {', '.join(columns)} FROM tasks WHERE revision > ?{where} ORDER BY revision LIMIT ?"
+
+def connect(db_path, **kwargs):
+    """
+    Open a SQLite connection with the pragmas used by every part of the application.
+
+    Args:
+        db_path (str): Path of the SQLite database
+        **kwargs: Extra arguments for ``sqlite3.connect``
+    """
+    kwargs.setdefault('timeout', 30)
+    conn = sqlite3.connect(db_path, **kwargs)
+    conn.row_factory = sqlite3.Row
+    # WAL模式下读写互不阻塞；NORMAL在WAL下只在检查点时fsync，断电最多丢失最后几个事务
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    conn.execute('PRAGMA cache_size = -16000')
+    return conn
+
 def get_db():
-    """Get a database connection."""
+    """Get this thread's database connection."""
     if 'db' not in g:
-        g.db = sqlite3.connect(
-            current_app.config['DATABASE'],
-            detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        g.db.row_factory = sqlite3.Row
+        path = current_app.config['DATABASE']
+        conns = getattr(_local, 'conns', None)
+        if conns is None:
+            conns = _local.conns = {}
+        if path not in conns:
+            conns[path] = connect(path, detect_types=sqlite3.PARSE_DECLTYPES)
+        g.db = conns[path]
 
     return g.db
 
 def close_db(e=None):
-    """Close the database connection."""
+    """Release the database connection of the current context."""
     db = g.pop('db', None)
 
-    if db is not None:
-        db.close()
+    # 连接留给当前线程复用，只回滚没有提交的事务
+    if db is not None and db.in_transaction:
+        db.rollback()
+
+def update_task(task_id, **fields):
+    """
+    Update several fields of a task in one statement and one commit.
+
+    ``updated_at`` is set automatically. Fields whose value is None are written
+    as NULL; leave a field out to keep its current value.
+    """
+    unknown = set(fields) - TASK_FIELDS
+    if unknown:
+        raise ValueError(f"Unknown task fields: {', '.join(sorted(unknown))}")
+
+    fields['updated_at'] = datetime.now().isoformat()
+    db = get_db()
+    db.execute(
+        f"UPDATE tasks SET {', '.join(f'{name} = ?' for name in fields)} WHERE id = ?",
+        list(fields.values()) + [task_id]
+    )
+    db.commit()
+    task_changes.notify()
+
+def get_sync_value(db, name):
+    """Return a counter of the ``sync_state`` table."""
+    return db.execute('SELECT value FROM sync_state WHERE name = ?', (name,)).fetchone()[0]
+
+def prune_tombstones(db, max_age_seconds):
+    """Delete tombstones of tasks deleted more than ``max_age_seconds`` ago."""
+    cutoff = time.time() - max_age_seconds
+    row = db.execute('SELECT MAX(revision) FROM task_tombstones WHERE deleted_at < ?', (cutoff,)).fetchone()
+    if row[0] is None:
+        return
+    # 先记录被清理的最大修订号，比它更早的同步游标必须重新加载
+    db.execute(
+        "UPDATE sync_state SET value = MAX(value, ?) WHERE name = 'tombstone_floor'", (row[0],)
+    )
+    db.execute('DELETE FROM task_tombstones WHERE revision <= ?', (row[0],))
+    db.commit()
+
+def create_schema(db):
+    """Create or migrate all tables, indexes and triggers on a connection."""
+    # Create tables
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS tasks (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            message TEXT,
+            image_path TEXT,
+            prompt TEXT,
+            request_id TEXT,
+            video_path TEXT,
+            model TEXT,
+            vlm_model TEXT,
+            llm_model TEXT,
+            prompt_template TEXT,
+            parent_task_id TEXT,
+            image_size TEXT,
+            submitted_at TEXT,
+            generation_seconds REAL,
+            generation_key TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    ''')
+
+    # Check if new columns exist, add them if they don't
+    try:
+        db.execute('SELECT vlm_model FROM tasks LIMIT 1')
+    except sqlite3.OperationalError:
+        db.execute('ALTER TABLE tasks ADD COLUMN vlm_model TEXT')
+
+    try:
+        db.execute('SELECT llm_model FROM tasks LIMIT 1')
+    except sqlite3.OperationalError:
+        db.execute('ALTER TABLE tasks ADD COLUMN llm_model TEXT')
+
+    try:
+        db.execute('SELECT parent_task_id FROM tasks LIMIT 1')
+    except sqlite3.OperationalError:
+        db.execute('ALTER TABLE tasks ADD COLUMN parent_task_id TEXT')
+
+    try:
+        db.execute('SELECT prompt_template FROM tasks LIMIT 1')
+    except sqlite3.OperationalError:
+        db.execute('ALTER TABLE tasks ADD COLUMN prompt_template TEXT')
+
+    # 视频生成耗时统计，用于自适应轮询和预计完成时间
+    try:
+        db.execute('SELECT image_size FROM tasks LIMIT 1')
+    except sqlite3.OperationalError:
+        db.execute('ALTER TABLE tasks ADD COLUMN image_size TEXT')
+
+    try:
+        db.execute('SELECT submitted_at FROM tasks LIMIT 1')
+    except sqlite3.OperationalError:
+        db.execute('ALTER TABLE tasks ADD COLUMN submitted_at TEXT')
+
+    try:
+        db.execute('SELECT generation_seconds FROM tasks LIMIT 1')
+    except sqlite3.OperationalError:
+        db.execute('ALTER TABLE tasks ADD COLUMN generation_seconds REAL')
+
+    # 生成请求的键：用于合并相同的请求，视频下载完成后据此记录生成结果
+    try:
+        db.execute('SELECT generation_key FROM tasks LIMIT 1')
+    except sqlite3.OperationalError:
+        db.execute('ALTER TABLE tasks ADD COLUMN generation_key TEXT')
+
+    # 修订号：任务每次插入或更新时递增，用于增量同步任务列表
+    try:
+        db.execute('SELECT revision FROM tasks LIMIT 1')
+    except sqlite3.OperationalError:
+        db.execute('ALTER TABLE tasks ADD COLUMN revision INTEGER NOT NULL DEFAULT 0')
+
+    # 任务表的二级索引，覆盖列表、状态检查、删除和任务关系等常用查询
+    for name, definition in TASK_INDEXES.items():
+        db.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {definition}')
+    # 已被 idx_tasks_created_at_id 取代
+    db.execute('DROP INDEX IF EXISTS idx_tasks_created_at')
+
+    # 持久化的后台任务队列，进程重启后可以从中断的地方继续
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            stage TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            state TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_run_at REAL NOT NULL,
+            lease_owner TEXT,
+            lease_expires_at REAL,
+            last_error TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    ''')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_jobs_state_next_run ON jobs (state, next_run_at)')
+
+    # 从参数中移除的密钥（API Key），加密后保存；空字符串表示没有保存
+    try:
+        db.execute('SELECT secrets FROM jobs LIMIT 1')
+    except sqlite3.OperationalError:
+        db.execute('ALTER TABLE jobs ADD COLUMN secrets TEXT')
+
+    # 持久化的结果缓存（图片描述等），按命名空间区分
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS cache_entries (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used_at REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (namespace, key)
+        )
+    ''')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_cache_entries_last_used ON cache_entries (namespace, last_used_at)')
+
+    # 图片感知哈希（dHash），用于查找近似重复的图片
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS image_hashes (
+            digest TEXT PRIMARY KEY,
+            dhash TEXT NOT NULL,
+            colors TEXT,
+            created_at REAL NOT NULL
+        )
+    ''')
+    # 颜色布局：dHash只看亮度，用来区分颜色不同的变体
+    try:
+        db.execute('SELECT colors FROM image_hashes LIMIT 1')
+    except sqlite3.OperationalError:
+        db.execute('ALTER TABLE image_hashes ADD COLUMN colors TEXT')
+
+    # 上传图片按内容哈希存储，引用计数由触发器随tasks表自动维护
+    uploads_exists = db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'uploads'"
+    ).fetchone() is not None
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS uploads (
+            filename TEXT PRIMARY KEY,
+            refcount INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    if not uploads_exists:
+        # 首次创建时统计已有任务对图片的引用
+        db.execute(
+            'INSERT INTO uploads (filename, refcount) '
+            'SELECT image_path, COUNT(*) FROM tasks WHERE image_path IS NOT NULL GROUP BY image_path'
+        )
+    db.executescript('''
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_uploads_insert AFTER INSERT ON tasks
+        WHEN NEW.image_path IS NOT NULL
+        BEGIN
+            INSERT OR IGNORE INTO uploads (filename, refcount) VALUES (NEW.image_path, 0);
+            UPDATE uploads SET refcount = refcount + 1 WHERE filename = NEW.image_path;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_uploads_delete AFTER DELETE ON tasks
+        WHEN OLD.image_path IS NOT NULL
+        BEGIN
+            UPDATE uploads SET refcount = refcount - 1 WHERE filename = OLD.image_path;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_uploads_update AFTER UPDATE OF image_path ON tasks
+        WHEN OLD.image_path IS NOT NEW.image_path
+        BEGIN
+            UPDATE uploads SET refcount = refcount - 1 WHERE filename = OLD.image_path;
+            INSERT OR IGNORE INTO uploads (filename, refcount)
+                SELECT NEW.image_path, 0 WHERE NEW.image_path IS NOT NULL;
+            UPDATE uploads SET refcount = refcount + 1 WHERE filename = NEW.image_path;
+        END;
+    ''')
+
+    # 增量同步：全局修订号随每次写入递增，被删除的任务留下墓碑记录
+    # 修订号在写事务内分配，SQLite只有一个写者，所以按提交顺序单调递增
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS sync_state (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+    db.execute("INSERT OR IGNORE INTO sync_state (name, value) VALUES ('task_revision', 0)")
+    # 早于该修订号的墓碑已被清理，更早的游标需要重新加载
+    db.execute("INSERT OR IGNORE INTO sync_state (name, value) VALUES ('tombstone_floor', 0)")
+
+    # 早期版本的再次生成任务用空格分隔日期和时间，统一为ISO格式（T分隔），
+    # 否则按 (created_at, id) 排序和分页时这些任务会排错位置。
+    # 需要扫描整个表，只在第一次启动时执行，之后由 sync_state 中的标记跳过
+    if db.execute("INSERT OR IGNORE INTO sync_state (name, value) VALUES ('iso_timestamps', 1)").rowcount:
+        for column in ('created_at', 'updated_at'):
+            db.execute(
+                f"UPDATE tasks SET {column} = replace({column}, ' ', 'T') WHERE {column} LIKE '____-__-__ __:__:__%'"
+            )
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS task_tombstones (
+            id TEXT PRIMARY KEY,
+            revision INTEGER NOT NULL,
+            deleted_at REAL NOT NULL
+        )
+    ''')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_task_tombstones_revision ON task_tombstones (revision)')
+    db.executescript('''
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_revision_insert AFTER INSERT ON tasks
+        BEGIN
+            UPDATE sync_state SET value = value + 1 WHERE name = 'task_revision';
+            UPDATE tasks SET revision = (SELECT value FROM sync_state WHERE name = 'task_revision')
+                WHERE rowid = NEW.rowid;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_revision_update AFTER UPDATE ON tasks
+        WHEN NEW.revision IS OLD.revision
+        BEGIN
+            UPDATE sync_state SET value = value + 1 WHERE name = 'task_revision';
+            UPDATE tasks SET revision = (SELECT value FROM sync_state WHERE name = 'task_revision')
+                WHERE rowid = NEW.rowid;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_revision_delete AFTER DELETE ON tasks
+        BEGIN
+            UPDATE sync_state SET value = value + 1 WHERE name = 'task_revision';
+            INSERT OR REPLACE INTO task_tombstones (id, revision, deleted_at)
+                VALUES (OLD.id, (SELECT value FROM sync_state WHERE name = 'task_revision'), CAST(strftime('%s', 'now') AS REAL));
+        END;
+    ''')
+
+    db.commit()
+
+    # 让SQLite根据需要更新索引的统计信息
+    db.execute('PRAGMA optimize')
 
 def init_db(app):
     """Initialize the database."""
     with app.app_context():
-        db = get_db()
-
-        # Create tables
-        db.execute('''
-            CREATE TABLE IF NOT EXISTS tasks (
-                id TEXT PRIMARY KEY,
-                status TEXT NOT NULL,
-                message TEXT,
-                image_path TEXT,
-                prompt TEXT,
-                request_id TEXT,
-                video_path TEXT,
-                model TEXT,
-                vlm_model TEXT,
-                llm_model TEXT,
-                prompt_template TEXT,
-                parent_task_id TEXT,
-                created_at TEXT NOT NULL,
-                updated_at TEXT NOT NULL
-            )
-        ''')
-
-        # Check if new columns exist, add them if they don't
-        try:
-            db.execute('SELECT vlm_model FROM tasks LIMIT 1')
-        except sqlite3.OperationalError:
-            db.execute('ALTER TABLE tasks ADD COLUMN vlm_model TEXT')
-
-        try:
-            db.execute('SELECT llm_model FROM tasks LIMIT 1')
-        except sqlite3.OperationalError:
-            db.execute('ALTER TABLE tasks ADD COLUMN llm_model TEXT')
-
-        try:
-            db.execute('SELECT parent_task_id FROM tasks LIMIT 1')
-        except sqlite3.OperationalError:
-            db.execute('ALTER TABLE tasks ADD COLUMN parent_task_id TEXT')
-
-        try:
-            db.execute('SELECT prompt_template FROM tasks LIMIT 1')
-        except sqlite3.OperationalError:
-            db.execute('ALTER TABLE tasks ADD COLUMN prompt_template TEXT')
-
-        db.commit()
+        create_schema(get_db())
 
 @click.command('init-db')
 @with_appcontext
@@ -0,0 +1,278 @@
+"""
+Shared HTTP client for all SiliconFlow and download traffic.
+
+One ``requests.Session`` with keep-alive connection pools is shared by every
+thread, so repeated API calls and downloads reuse open TCP/TLS connections
+instead of opening a new one per request.
+
+The ``*_async`` functions do the same for asyncio callers with one pooled
+``httpx.AsyncClient`` per event loop. httpx is only needed for the async API.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import weakref
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import (HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT,
+                    HTTP_MAX_RETRIES, HTTP_RETRY_BACKOFF, HTTP_ASYNC_MAX_CONNECTIONS)
+
+# 异步客户端需要httpx，未安装时同步接口仍然可用
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+_session = None
+_session_lock = threading.Lock()
+
+# 每个事件循环一个异步客户端，事件循环结束后自动释放
+_async_clients = weakref.WeakKeyDictionary()
+
+
+class StreamingJsonBody:
+    """
+    A JSON request body that streams large values instead of serializing them in memory.
+
+    Values in the payload that provide ``stream_length()`` and ``stream_chunks()``
+    (such as ``utils.EncodedImage``) are written as JSON strings chunk by chunk
+    while the request is sent. Their chunks must be ASCII that needs no JSON
+    escaping (base64 data URIs are). The rest of the payload is serialized
+    normally. The body has a known length, so it is sent with Content-Length
+    and can be re-sent on retries.
+
+    Pass it as ``data=`` to the sync functions and as ``content=`` to the async
+    ones, with the headers from ``headers()``.
+    """
+
+    def __init__(self, payload):
+        streamed = []
+
+        def placeholder(value):
+            if hasattr(value, 'stream_chunks'):
+                streamed.append(value)
+                return f"__stream_{len(streamed) - 1}_{id(self)}__"
+            raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+        text = json.dumps(payload, ensure_ascii=False, default=placeholder)
+
+        # 按占位符切分：JSON片段与需要流式写入的值交替出现
+        self._parts = []
+        for index, value in enumerate(streamed):
+            before, text = text.split(f'"__stream_{index}_{id(self)}__"', 1)
+            self._parts.append(before.encode('utf-8') + b'"')
+            self._parts.append(value)
+            text = '"' + text
+        self._parts.append(text.encode('utf-8'))
+
+        self._length = sum(
+            part.stream_length() if hasattr(part, 'stream_chunks') else len(part)
+            for part in self._parts
+        )
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        for part in self._parts:
+            if hasattr(part, 'stream_chunks'):
+                yield from part.stream_chunks()
+            else:
+                yield part
+
+    def async_stream(self):
+        """Return an async iterable over the body, as httpx expects for async requests."""
+        return _AsyncBodyStream(self)
+
+    def headers(self, headers=None):
+        """Return ``headers`` with the Content-Type and Content-Length of this body."""
+        headers = dict(headers or {})
+        headers['Content-Type'] = 'application/json'
+        headers['Content-Length'] = str(self._length)
+        return headers
+
+
+class _AsyncBodyStream:
+    """Async-only view of a ``StreamingJsonBody`` (httpx treats sync iterables as sync bodies)."""
+
+    def __init__(self, body):
+        self.body = body
+
+    async def __aiter__(self):
+        for chunk in self.body:
+            yield chunk
+
+
+def _build_retry():
+    """
+    Retry policy of the shared session.
+
+    Connection failures are retried for every method because the request never
+    reached the server. Read errors and 5xx responses are only retried for GET
+    and HEAD: repeating a POST could submit the same video generation twice.
+    429 responses of POST calls are handled by ``rate_limiter.throttled_post``.
+    """
+    return Retry(
+        total=HTTP_MAX_RETRIES,
+        connect=HTTP_MAX_RETRIES,
+        read=HTTP_MAX_RETRIES,
+        status=HTTP_MAX_RETRIES,
+        backoff_factor=HTTP_RETRY_BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+
+
+def is_transient_error(error, idempotent=True):
+    """
+    Return whether a failed request is worth trying again later.
+
+    Rate limits (429), 5xx responses, connection errors and timeouts are
+    transient; other errors (bad API key, rejected input) would fail again.
+    With ``idempotent=False`` only failures where the server cannot have
+    acted on the request count, so a retried POST never creates something
+    twice: a read timeout may mean the request went through.
+    """
+    response = getattr(error, 'response', None)
+    if response is not None:
+        return response.status_code == 429 or response.status_code >= 500
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return idempotent
+    if httpx is not None:
+        if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+            return True
+        if isinstance(error, httpx.TransportError):
+            return idempotent
+    return False
+
+
+def get_session():
+    """Return the process-wide session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=HTTP_POOL_CONNECTIONS,
+                    pool_maxsize=HTTP_POOL_MAXSIZE,
+                    max_retries=_build_retry()
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+                logger.info(f"HTTP client ready (pool size {HTTP_POOL_MAXSIZE})")
+    return _session
+
+
+def request(method, url, timeout=None, **kwargs):
+    """
+    Send a request through the shared session.
+
+    Args:
+        method (str): HTTP method
+        url (str): Request URL
+        timeout (float or tuple, optional): Overrides the default
+            ``(connect, read)`` timeout
+
+    Returns:
+        requests.Response: The response
+    """
+    if timeout is None:
+        timeout = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+    return get_session().request(method, url, timeout=timeout, **kwargs)
+
+
+def get(url, **kwargs):
+    """GET through the shared session."""
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    """POST through the shared session."""
+    return request('POST', url, **kwargs)
+
+
+def _async_timeout(timeout):
+    """Convert a requests-style timeout to ``httpx.Timeout``."""
+    if timeout is None:
+        timeout = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(timeout)
+
+
+def get_async_client():
+    """
+    Return the pooled async client of the running event loop, creating it on first use.
+
+    Raises:
+        RuntimeError: If httpx is not installed
+    """
+    if httpx is None:
+        raise RuntimeError("The async API requires httpx. Install it with 'pip install httpx'.")
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        limits = httpx.Limits(
+            max_connections=HTTP_ASYNC_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_POOL_MAXSIZE
+        )
+        # httpx的传输层只重试连接失败，与同步会话对POST请求的策略一致
+        transport = httpx.AsyncHTTPTransport(retries=HTTP_MAX_RETRIES, limits=limits)
+        client = httpx.AsyncClient(transport=transport, timeout=_async_timeout(None))
+        _async_clients[loop] = client
+    return client
+
+
+async def close_async_client():
+    """Close the async client of the running event loop, if there is one."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def request_async(method, url, timeout=None, **kwargs):
+    """
+    Send a request through the pooled async client.
+
+    Args:
+        method (str): HTTP method
+        url (str): Request URL
+        timeout (float or tuple, optional): Overrides the default
+            ``(connect, read)`` timeout
+
+    Returns:
+        httpx.Response: The response
+    """
+    if isinstance(kwargs.get('content'), StreamingJsonBody):
+        kwargs['content'] = kwargs['content'].async_stream()
+    return await get_async_client().request(method, url, timeout=_async_timeout(timeout), **kwargs)
+
+
+async def get_async(url, **kwargs):
+    """GET through the pooled async client."""
+    return await request_async('GET', url, **kwargs)
+
+
+async def post_async(url, **kwargs):
+    """POST through the pooled async client."""
+    return await request_async('POST', url, **kwargs)
+
+
+def stream_async(method, url, timeout=None, **kwargs):
+    """Return an async context manager that streams the response body."""
+    return get_async_client().stream(method, url, timeout=_async_timeout(timeout), **kwargs)
@@ -0,0 +1,184 @@
+"""
+Perceptual-hash index of uploaded images.
+
+Catalog photos are often the same shot re-exported, slightly cropped or
+re-compressed, which defeats exact content hashing. Every upload gets a
+difference hash (dHash) that stays nearly the same under such changes; the
+index finds earlier images within a small Hamming distance so their analysis
+results can be reused.
+
+The dHash only sees brightness, so a red and a blue version of the same
+product hash alike. Every image also stores a coarse color layout (the mean
+color of each cell of a 4x4 grid), and a match must agree on it as well.
+"""
+
+import logging
+import threading
+import time
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from database import connect
+from utils import file_sha256
+
+logger = logging.getLogger(__name__)
+
+
+def dhash(image_path, hash_size=8):
+    """
+    Compute the difference hash of an image.
+
+    Args:
+        image_path (str): Path to the image file
+        hash_size (int): Hash is ``hash_size * hash_size`` bits
+
+    Returns:
+        int: The hash
+    """
+    with Image.open(image_path) as image:
+        # JPEG可以直接以较低分辨率解码，加快大图的处理
+        image.draft('L', (hash_size * 8, hash_size * 8))
+        image = ImageOps.exif_transpose(image).convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = np.asarray(image, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def color_layout(image_path, grid=4):
+    """
+    Compute the mean RGB color of every cell of a ``grid`` x ``grid`` grid.
+
+    Returns:
+        numpy.ndarray: ``grid * grid * 3`` uint8 values
+    """
+    with Image.open(image_path) as image:
+        image.draft('RGB', (grid * 16, grid * 16))
+        image = ImageOps.exif_transpose(image).convert('RGB').resize((grid, grid), Image.BOX)
+    return np.asarray(image, dtype=np.uint8).flatten()
+
+
+def color_difference(colors, other):
+    """Return the largest mean per-channel difference between corresponding grid cells."""
+    diff = np.abs(colors.astype(np.int16) - other.astype(np.int16)).reshape(-1, 3)
+    return float(diff.mean(axis=1).max())
+
+
+class PerceptualIndex:
+    """dHashes and color layouts of images keyed by content SHA-256, persisted in the ``image_hashes`` table."""
+
+    def __init__(self, db_path):
+        """
+        Args:
+            db_path (str): Path of the SQLite database
+        """
+        self.db_path = db_path
+        self._digests = []
+        self._hashes = np.zeros(0, dtype=np.uint64)
+        self._pending = []
+        self._known = {}
+        # 摘要 -> 颜色布局；较早版本保存的图片没有颜色布局，不参与匹配
+        self._colors = {}
+        self._loaded = False
+        self.reused = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connect(self):
+        """Return this thread's connection to the database."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = connect(self.db_path, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def _load(self):
+        """Load the stored hashes on first use. Must hold the lock."""
+        if self._loaded:
+            return
+        rows = self._connect().execute('SELECT digest, dhash, colors FROM image_hashes').fetchall()
+        for row in rows:
+            self._known[row['digest']] = int(row['dhash'], 16)
+            if row['colors']:
+                self._colors[row['digest']] = np.frombuffer(bytes.fromhex(row['colors']), dtype=np.uint8)
+            self._digests.append(row['digest'])
+        self._hashes = np.array([self._known[digest] for digest in self._digests], dtype=np.uint64)
+        self._loaded = True
+        logger.info(f"已加载 {len(rows)} 个图片感知哈希")
+
+    def add(self, image_path):
+        """
+        Hash an image and add it to the index.
+
+        Returns:
+            tuple: ``(digest, dhash)``
+        """
+        digest = file_sha256(image_path)
+        with self._lock:
+            self._load()
+            if digest in self._known and digest in self._colors:
+                return digest, self._known[digest]
+
+        value = dhash(image_path)
+        colors = color_layout(image_path)
+        with self._lock:
+            if digest not in self._known:
+                self._connect().execute(
+                    'INSERT OR IGNORE INTO image_hashes (digest, dhash, colors, created_at) VALUES (?, ?, ?, ?)',
+                    (digest, f"{value:016x}", colors.tobytes().hex(), time.time())
+                )
+                self._known[digest] = value
+                self._pending.append(digest)
+            elif digest not in self._colors:
+                # 较早保存的图片再次上传时补上颜色布局
+                self._connect().execute(
+                    'UPDATE image_hashes SET colors = ? WHERE digest = ?', (colors.tobytes().hex(), digest)
+                )
+            self._colors[digest] = colors
+        return digest, self._known[digest]
+
+    def find_similar(self, image_path, max_distance, max_color_difference, limit=5):
+        """
+        Find earlier images whose dHash is within ``max_distance`` bits and whose
+        grid cells all differ by at most ``max_color_difference`` (0-255) in mean color.
+
+        Returns:
+            list: ``(digest, distance)`` tuples, nearest first, without the image itself
+        """
+        digest, value = self.add(image_path)
+        with self._lock:
+            if self._pending:
+                self._digests.extend(self._pending)
+                self._hashes = np.concatenate([
+                    self._hashes,
+                    np.array([self._known[d] for d in self._pending], dtype=np.uint64)
+                ])
+                self._pending = []
+            hashes = self._hashes
+            digests = self._digests
+            colors = self._colors
+
+        if not len(hashes):
+            return []
+
+        # 异或后统计不同的位数（汉明距离）
+        xor = np.bitwise_xor(hashes, np.uint64(value))
+        distances = np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+        candidates = np.nonzero(distances <= max_distance)[0]
+        # 颜色不同的变体（同一商品的不同颜色）亮度结构相同，需要再比较颜色布局
+        matches = sorted(
+            (int(distances[i]), digests[i]) for i in candidates
+            if digests[i] != digest and digests[i] in colors
+            and color_difference(colors[digest], colors[digests[i]]) <= max_color_difference
+        )
+        return [(match, distance) for distance, match in matches[:limit]]
+
+    def record_reuse(self):
+        """Count a result that was reused from a near-duplicate image."""
+        with self._lock:
+            self.reused += 1
+
+    def stats(self):
+        """Return the number of indexed images and how often results were reused."""
+        with self._lock:
+            return {'images': len(self._known) if self._loaded else None, 'reused': self.reused}
@@ -2,71 +2,85 @@
 Functions for image handling and VLM processing.
 """
 
-import requests
+import asyncio
 import json
 import logging
-import base64
-from config import API_BASE_URL, VLM_MODEL
+from config import API_BASE_URL, VLM_MODEL, VLM_IMAGE_MAX_SIDE
+from utils import prepare_image
+from http_client import StreamingJsonBody, is_transient_error
+from rate_limiter import throttled_post, throttled_post_async, estimate_tokens
 
 logger = logging.getLogger(__name__)
 
-def process_image_with_vlm(image_path, vlm_model=None, api_key=None):
+def _build_vlm_request(image_path, vlm_model=None, api_key=None):
+    """Build the API key, headers, streaming body and token estimate of a VLM request."""
+    if not api_key:
+        from config import API_KEY
+        api_key = API_KEY
+
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+
+    # Downsize the image (cached per image and settings); it is base64-encoded
+    # into the request body while it is sent
+    image = prepare_image(image_path, max_side=VLM_IMAGE_MAX_SIDE)
+
+    # Use the provided model or default to the one in config
+    model_to_use = vlm_model or VLM_MODEL
+
+    # Prepare the request payload
+    payload = {
+        "model": model_to_use,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": "Describe this image in detail. Focus on the main subjects, actions, environment, colors, and mood."
+                    },
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": image
+                        }
+                    }
+                ]
+            }
+        ],
+        "max_tokens": 1024
+    }
+
+    tokens = estimate_tokens(payload["messages"][0]["content"][0]["text"], max_tokens=payload["max_tokens"], images=1)
+    return api_key, headers, StreamingJsonBody(payload), tokens
+
+def process_image_with_vlm(image_path, vlm_model=None, api_key=None, raise_transient=False):
     """
     Process an image with the Vision Language Model to identify its content.
 
     Args:
         image_path (str): Path to the image file
         vlm_model (str, optional): The VLM model to use. Defaults to the one in config.
+        raise_transient (bool, optional): Raise transient errors (timeouts, 429, 5xx)
+            instead of returning None, so the caller can retry later.
 
     Returns:
         str: Text description of the image content
     """
     try:
         # Prepare the API request
-        if not api_key:
-            from config import API_KEY
-            api_key = API_KEY
-
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-
-        # Encode the image to base64
-        with open(image_path, "rb") as image_file:
-            base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-
-        # Use the provided model or default to the one in config
-        model_to_use = vlm_model or VLM_MODEL
-
-        # Prepare the request payload
-        payload = {
-            "model": model_to_use,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": "Describe this image in detail. Focus on the main subjects, actions, environment, colors, and mood."
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            "max_tokens": 1024
-        }
+        api_key, headers, body, tokens = _build_vlm_request(image_path, vlm_model, api_key)
 
         # Make the API request
-        response = requests.post(
+        response = throttled_post(
+            'chat',
+            api_key,
             f"{API_BASE_URL}/chat/completions",
-            headers=headers,
-            json=payload
+            tokens=tokens,
+            headers=body.headers(headers),
+            data=body
         )
 
         # Check if the request was successful
@@ -81,6 +95,42 @@ def process_image_with_vlm(image_path, vlm_model=None, api_key=None):
         logger.info("Successfully processed image with VLM")
         return description
 
+    except Exception as e:
+        logger.error(f"Error processing image with VLM: {e}")
+        if raise_transient and is_transient_error(e):
+            raise
+        return None
+
+async def process_image_with_vlm_async(image_path, vlm_model=None, api_key=None):
+    """
+    Async version of ``process_image_with_vlm``.
+
+    Args:
+        image_path (str): Path to the image file
+        vlm_model (str, optional): The VLM model to use. Defaults to the one in config.
+
+    Returns:
+        str: Text description of the image content
+    """
+    try:
+        # 读取和编码图片放到线程中，避免阻塞事件循环
+        api_key, headers, body, tokens = await asyncio.to_thread(_build_vlm_request, image_path, vlm_model, api_key)
+
+        response = await throttled_post_async(
+            'chat',
+            api_key,
+            f"{API_BASE_URL}/chat/completions",
+            tokens=tokens,
+            headers=body.headers(headers),
+            content=body
+        )
+        response.raise_for_status()
+
+        description = response.json()["choices"][0]["message"]["content"]
+
+        logger.info("Successfully processed image with VLM")
+        return description
+
     except Exception as e:
         logger.error(f"Error processing image with VLM: {e}")
         return None
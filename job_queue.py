@@ -0,0 +1,312 @@
+"""
+SQLite-backed job store for the background scheduler.
+
+Every job submitted to the scheduler is persisted in the ``jobs`` table with its
+stage, arguments, attempt count, next run time and lease owner, so work that was
+queued or running when the process stopped is picked up again after a restart.
+
+Secrets in the job arguments (the user's API key in the task parameters) are
+never written to the payload. They are kept in memory, and when a secret key
+is configured and ``cryptography`` is installed they are also stored
+encrypted in the ``secrets`` column, so jobs resumed after a restart or
+claimed by another process still have them. A job whose secrets are gone is
+failed instead of running with a different key.
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from database import connect
+
+# 加密保存密钥需要cryptography，未安装时密钥只保存在内存中
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:
+    Fernet = None
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+# 不写入数据库的参数字段
+SECRET_FIELDS = ('api_key',)
+
+# 服务重启或换了进程后，没有保存的密钥无法恢复
+SECRETS_LOST_ERROR = 'API Key 在服务重启后丢失，请重新提交任务'
+
+
+def _split_secrets(args):
+    """
+    Remove the secret fields from the parameter dicts in ``args``.
+
+    Parameters are passed either as a dict or as a list of dicts.
+
+    Returns:
+        tuple: (args without secrets, ``{(index, item index or None, field): value}``)
+    """
+    secrets = {}
+
+    def strip(value, index, item):
+        if not isinstance(value, dict) or not any(field in value for field in SECRET_FIELDS):
+            return value
+        value = dict(value)
+        for field in SECRET_FIELDS:
+            # 空值（没有填写，使用默认配置）不需要保存
+            secret = value.pop(field, None)
+            if secret:
+                secrets[(index, item, field)] = secret
+        return value
+
+    stripped = []
+    for index, arg in enumerate(args):
+        if isinstance(arg, (list, tuple)):
+            arg = [strip(value, index, item) for item, value in enumerate(arg)]
+        stripped.append(strip(arg, index, None))
+    return stripped, secrets
+
+
+def _restore_secrets(args, secrets):
+    """Put the secrets removed by ``_split_secrets`` back into ``args``."""
+    for (index, item, field), value in secrets.items():
+        target = args[index] if item is None else args[index][item]
+        target[field] = value
+    return args
+
+
+def make_owner_id():
+    """Build a lease owner ID that is unique per process."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class JobStore:
+    """Persist scheduler jobs in the ``jobs`` table of the application database."""
+
+    def __init__(self, db_path, owner=None, lease_seconds=60, secret_key=None, on_secrets_lost=None):
+        """
+        Args:
+            db_path (str): Path of the SQLite database
+            owner (str, optional): Lease owner ID of this process
+            lease_seconds (float): How long a claimed job stays leased without renewal
+            secret_key (str, optional): Fernet key used to store secrets encrypted
+            on_secrets_lost (callable, optional): Called with ``(stage, args)`` for
+                every job that is failed because its secrets are gone
+        """
+        self.db_path = db_path
+        self.owner = owner or make_owner_id()
+        self.lease_seconds = lease_seconds
+        self.on_secrets_lost = on_secrets_lost
+        self._local = threading.local()
+        # 任务ID -> 从参数中移除的密钥
+        self._secrets = {}
+        self._secrets_lock = threading.Lock()
+
+        self._cipher = None
+        if secret_key:
+            if Fernet is None:
+                logger.warning("未安装cryptography，API Key 不会加密保存，服务重启后未完成的任务需要重新提交")
+            else:
+                self._cipher = Fernet(secret_key.encode('ascii') if isinstance(secret_key, str) else secret_key)
+
+    def _connect(self):
+        """Return this thread's connection to the database."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = connect(self.db_path, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def _seal(self, secrets):
+        """
+        Return the value of the ``secrets`` column: None without secrets, the
+        encrypted secrets, or an empty string if they cannot be stored.
+        """
+        if not secrets:
+            return None
+        if self._cipher is None:
+            return ''
+        data = json.dumps([[index, item, field, value] for (index, item, field), value in secrets.items()])
+        return self._cipher.encrypt(data.encode('utf-8')).decode('ascii')
+
+    def _unseal(self, sealed):
+        """Decrypt the ``secrets`` column; return None if the secrets cannot be recovered."""
+        if not sealed or self._cipher is None:
+            return None
+        try:
+            data = json.loads(self._cipher.decrypt(sealed.encode('ascii')))
+        except InvalidToken:
+            logger.error("无法解密保存的 API Key，密钥可能已更换")
+            return None
+        return {(index, item, field): value for index, item, field, value in data}
+
+    def enqueue(self, stage, args, delay=0):
+        """Insert a new queued job and return its ID."""
+        job_id = str(uuid.uuid4())
+        now = datetime.now().isoformat()
+        args, secrets = _split_secrets(args)
+        if secrets:
+            with self._secrets_lock:
+                self._secrets[job_id] = secrets
+        self._connect().execute(
+            'INSERT INTO jobs (id, stage, payload, secrets, state, attempts, next_run_at, created_at, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?)',
+            (job_id, stage, json.dumps(args, ensure_ascii=False), self._seal(secrets),
+             JOB_QUEUED, time.time() + delay, now, now)
+        )
+        return job_id
+
+    def claim(self, limit, stage=None):
+        """
+        Lease up to ``limit`` due jobs for this process.
+
+        A job is due when it is queued and its next run time has passed, or when it
+        is running under a lease that has expired (its owner died or was restarted).
+
+        Args:
+            limit (int): Maximum number of jobs to lease
+            stage (str, optional): Only lease jobs of this stage
+
+        Returns:
+            list: ``(job_id, stage, args)`` tuples
+        """
+        if limit <= 0:
+            return []
+
+        query = ('SELECT id, stage, payload, secrets FROM jobs '
+                 'WHERE ((state = ? AND next_run_at <= ?) OR (state = ? AND lease_expires_at < ?))')
+        now = time.time()
+        args = [JOB_QUEUED, now, JOB_RUNNING, now]
+        if stage is not None:
+            query += ' AND stage = ?'
+            args.append(stage)
+        query += ' ORDER BY next_run_at LIMIT ?'
+        args.append(limit)
+
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(query, args).fetchall()
+
+            for row in rows:
+                conn.execute(
+                    'UPDATE jobs SET state = ?, attempts = attempts + 1, lease_owner = ?, '
+                    'lease_expires_at = ?, updated_at = ? WHERE id = ?',
+                    (JOB_RUNNING, self.owner, now + self.lease_seconds, datetime.now().isoformat(), row['id'])
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        jobs = []
+        for row in rows:
+            args = json.loads(row['payload'])
+            with self._secrets_lock:
+                secrets = self._secrets.get(row['id'])
+            if secrets is None and row['secrets'] is not None:
+                secrets = self._unseal(row['secrets'])
+                if secrets is None:
+                    self._fail_without_secrets(row['id'], row['stage'], args)
+                    continue
+                with self._secrets_lock:
+                    self._secrets[row['id']] = secrets
+            jobs.append((row['id'], row['stage'], _restore_secrets(args, secrets or {})))
+        return jobs
+
+    def _fail_without_secrets(self, job_id, stage, args):
+        """Fail a job whose secrets were lost instead of running it with other credentials."""
+        logger.error(f"Job {job_id} ({stage}) lost its API key, failing it")
+        self.fail(job_id, SECRETS_LOST_ERROR)
+        if self.on_secrets_lost:
+            try:
+                self.on_secrets_lost(stage, args)
+            except Exception as e:
+                logger.error(f"Error handling lost secrets of job {job_id}: {e}")
+
+    def renew_leases(self):
+        """Extend the lease of every job this process is running."""
+        self._connect().execute(
+            'UPDATE jobs SET lease_expires_at = ? WHERE state = ? AND lease_owner = ?',
+            (time.time() + self.lease_seconds, JOB_RUNNING, self.owner)
+        )
+
+    def _forget_secrets(self, job_id):
+        with self._secrets_lock:
+            self._secrets.pop(job_id, None)
+
+    def complete(self, job_id):
+        """Mark a job as done."""
+        self._forget_secrets(job_id)
+        self._connect().execute(
+            'UPDATE jobs SET state = ?, secrets = NULL, lease_owner = NULL, lease_expires_at = NULL, updated_at = ? '
+            'WHERE id = ?',
+            (JOB_DONE, datetime.now().isoformat(), job_id)
+        )
+
+    def retry(self, job_id, error, delay):
+        """Put a failed job back in the queue to run again after ``delay`` seconds."""
+        self._connect().execute(
+            'UPDATE jobs SET state = ?, next_run_at = ?, last_error = ?, lease_owner = NULL, '
+            'lease_expires_at = NULL, updated_at = ? WHERE id = ?',
+            (JOB_QUEUED, time.time() + delay, error, datetime.now().isoformat(), job_id)
+        )
+
+    def fail(self, job_id, error):
+        """Mark a job as permanently failed."""
+        self._forget_secrets(job_id)
+        self._connect().execute(
+            'UPDATE jobs SET state = ?, secrets = NULL, last_error = ?, lease_owner = NULL, lease_expires_at = NULL, '
+            'updated_at = ? WHERE id = ?',
+            (JOB_FAILED, error, datetime.now().isoformat(), job_id)
+        )
+
+    def purge(self, max_age_seconds):
+        """Delete finished jobs that have not changed for ``max_age_seconds``."""
+        cutoff = datetime.fromtimestamp(time.time() - max_age_seconds).isoformat()
+        self._connect().execute(
+            'DELETE FROM jobs WHERE state IN (?, ?) AND updated_at < ?',
+            (JOB_DONE, JOB_FAILED, cutoff)
+        )
+
+    def scrub_secrets(self):
+        """Move secrets out of payloads stored before they were kept out of the payload."""
+        conn = self._connect()
+        rows = conn.execute(
+            'SELECT id, payload, state FROM jobs WHERE ' + ' OR '.join('payload LIKE ?' for _ in SECRET_FIELDS),
+            [f'%"{field}"%' for field in SECRET_FIELDS]
+        ).fetchall()
+        for row in rows:
+            args, secrets = _split_secrets(json.loads(row['payload']))
+            # 已经结束的任务不再需要密钥
+            sealed = self._seal(secrets) if row['state'] in (JOB_QUEUED, JOB_RUNNING) else None
+            conn.execute(
+                'UPDATE jobs SET payload = ?, secrets = ? WHERE id = ?',
+                (json.dumps(args, ensure_ascii=False), sealed, row['id'])
+            )
+        if rows:
+            logger.info(f"已从 {len(rows)} 个已保存的后台任务中移除密钥")
+
+    def attempts(self, job_id):
+        """Return how many times a job has been claimed."""
+        row = self._connect().execute('SELECT attempts FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return row['attempts'] if row else 0
+
+    def counts(self):
+        """Return the number of jobs per stage and state."""
+        rows = self._connect().execute(
+            'SELECT stage, state, COUNT(*) AS count FROM jobs WHERE state IN (?, ?) GROUP BY stage, state',
+            (JOB_QUEUED, JOB_RUNNING)
+        ).fetchall()
+        counts = {}
+        for row in rows:
+            counts.setdefault(row['stage'], {})[row['state']] = row['count']
+        return counts
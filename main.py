@@ -7,13 +7,15 @@ refines the text into a prompt, and generates a video using the I2V model.
 
 import os
 import argparse
+import asyncio
 import logging
 import time
 from config import OUTPUT_DIR, DEFAULT_VIDEO_SIZE, DEFAULT_NEGATIVE_PROMPT
 from utils import ensure_directory_exists
-from image_processor import process_image_with_vlm
-from prompt_generator import refine_prompt
+from image_processor import process_image_with_vlm, process_image_with_vlm_async
+from prompt_generator import refine_prompt, refine_prompt_async
 from video_generator import generate_video, get_video_status, download_video
+from video_generator import generate_video_async, wait_for_video_async, download_video_async
 from video_extender import extend_video
 
 # Set up logging
@@ -119,6 +121,94 @@ def process_image_to_video(image_path, output_dir=OUTPUT_DIR, negative_prompt=DE
         logger.error(f"Error processing image to video: {e}")
         return None
 
+async def process_image_to_video_async(image_path, output_dir=OUTPUT_DIR, negative_prompt=DEFAULT_NEGATIVE_PROMPT,
+                                       image_size=DEFAULT_VIDEO_SIZE, seed=None, extend=False, api_key=None):
+    """
+    Async version of ``process_image_to_video``.
+
+    All API calls run on the event loop, so many images can be processed
+    concurrently with ``asyncio.gather``. Unlike the synchronous version it
+    waits until the video generation has finished.
+
+    Args:
+        image_path (str): Path to the input image
+        output_dir (str): Directory to save the output
+        negative_prompt (str): Negative prompt for video generation
+        image_size (str): Size of the video
+        seed (int): Random seed for generation
+        extend (bool): Whether to extend the video
+        api_key (str, optional): SiliconFlow API Key
+
+    Returns:
+        str: Path to the generated video
+    """
+    try:
+        ensure_directory_exists(output_dir)
+
+        # Step 1: Process the image with VLM
+        image_description = await process_image_with_vlm_async(image_path, api_key=api_key)
+        if not image_description:
+            logger.error("Failed to process image with VLM")
+            return None
+
+        # Step 2: Refine the prompt
+        refined_prompt = await refine_prompt_async(image_description, api_key=api_key)
+        if not refined_prompt:
+            logger.error("Failed to refine prompt")
+            return None
+
+        # Step 3: Generate the video
+        request_id = await generate_video_async(
+            image_path,
+            refined_prompt,
+            negative_prompt=negative_prompt,
+            image_size=image_size,
+            seed=seed,
+            api_key=api_key
+        )
+        if not request_id:
+            logger.error("Failed to submit video generation task")
+            return None
+
+        # Step 4: Wait for the video to be generated
+        video_info = await wait_for_video_async(request_id, api_key=api_key)
+        if not video_info:
+            logger.error("Failed to get video status")
+            return None
+
+        # Step 5: Download the video
+        video_path = await download_video_async(video_info.get("url"), output_dir)
+        if not video_path:
+            logger.error("Failed to download video")
+            return None
+
+        logger.info(f"Video generated successfully: {video_path}")
+
+        # Step 6: Extend the video if requested
+        if extend:
+            # 延长视频需要ffmpeg/OpenCV处理，放到线程中执行
+            extended_video_path = await asyncio.to_thread(
+                extend_video,
+                video_path,
+                refined_prompt,
+                negative_prompt=negative_prompt,
+                image_size=image_size,
+                seed=seed,
+                api_key=api_key
+            )
+            if not extended_video_path:
+                logger.error("Failed to extend video")
+                return video_path  # Return the original video path
+
+            logger.info(f"Video extended successfully: {extended_video_path}")
+            return extended_video_path
+
+        return video_path
+
+    except Exception as e:
+        logger.error(f"Error processing image to video: {e}")
+        return None
+
 def main():
     """Main function."""
     parser = argparse.ArgumentParser(description="Generate videos from images using SiliconFlow models")
@@ -2,14 +2,72 @@
 Functions for refining text into I2V prompts.
 """
 
-import requests
 import json
 import logging
 from config import API_BASE_URL, LLM_MODEL, get_full_prompt_template
+from http_client import is_transient_error
+from rate_limiter import throttled_post, throttled_post_async, estimate_tokens
 
 logger = logging.getLogger(__name__)
 
-def refine_prompt(image_description, llm_model=None, prompt_template=None, api_key=None):
+def _build_refine_request(image_description, llm_model=None, prompt_template=None, api_key=None, temperature=0.7):
+    """Build the API key, headers, payload and token estimate of a prompt refinement request."""
+    # Get API Key
+    if not api_key:
+        from config import API_KEY
+        api_key = API_KEY
+
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+
+    # Use the provided model or default to the one in config
+    model_to_use = llm_model or LLM_MODEL
+
+    # Use custom prompt template if provided, otherwise use the default from config
+    if prompt_template:
+        system_message = prompt_template
+    else:
+        system_message = get_full_prompt_template()
+
+    # Prepare the request payload
+    payload = {
+        "model": model_to_use,
+        "messages": [
+            {
+                "role": "system",
+                "content": system_message
+            },
+            {
+                "role": "user",
+                "content": f"Here is an image description. Please refine it into a high-quality prompt for image-to-video generation:\n\n{image_description}"
+            }
+        ],
+        "max_tokens": 512,
+        "temperature": temperature
+    }
+
+    tokens = estimate_tokens(*(message["content"] for message in payload["messages"]), max_tokens=payload["max_tokens"])
+    return api_key, headers, payload, tokens
+
+def _extract_prompt(result):
+    """Extract the refined prompt from a chat completion response."""
+    message = result["choices"][0]["message"]
+    refined_prompt = message.get("content", "")
+
+    # 如果content为空，尝试从reasoning_content获取内容
+    if not refined_prompt and "reasoning_content" in message:
+        refined_prompt = message["reasoning_content"]
+        # 从reasoning_content中提取最后一段作为提示词
+        paragraphs = refined_prompt.split('\n\n')
+        if len(paragraphs) > 1:
+            refined_prompt = paragraphs[-1]
+
+    return refined_prompt
+
+def refine_prompt(image_description, llm_model=None, prompt_template=None, api_key=None, temperature=0.7,
+                  raise_transient=False):
     """
     Refine the image description into a high-quality I2V prompt.
 
@@ -17,51 +75,23 @@ def refine_prompt(image_description, llm_model=None, prompt_template=None, api_k
         image_description (str): Description of the image content
         llm_model (str, optional): The LLM model to use. Defaults to the one in config.
         prompt_template (str, optional): Custom system prompt template to use.
+        temperature (float, optional): Sampling temperature of the LLM.
+        raise_transient (bool, optional): Raise transient errors (timeouts, 429, 5xx)
+            instead of returning None, so the caller can retry later.
 
     Returns:
         str: Refined prompt for I2V generation
     """
     try:
-        # Get API Key
-        if not api_key:
-            from config import API_KEY
-            api_key = API_KEY
-
         # Prepare the API request
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-
-        # Use the provided model or default to the one in config
-        model_to_use = llm_model or LLM_MODEL
-
-        # Use custom prompt template if provided, otherwise use the default from config
-        if prompt_template:
-            system_message = prompt_template
-        else:
-            system_message = get_full_prompt_template()
-
-        # Prepare the request payload
-        payload = {
-            "model": model_to_use,
-            "messages": [
-                {
-                    "role": "system",
-                    "content": system_message
-                },
-                {
-                    "role": "user",
-                    "content": f"Here is an image description. Please refine it into a high-quality prompt for image-to-video generation:\n\n{image_description}"
-                }
-            ],
-            "max_tokens": 512,
-            "temperature": 0.7
-        }
+        api_key, headers, payload, tokens = _build_refine_request(image_description, llm_model, prompt_template, api_key, temperature)
 
         # Make the API request
-        response = requests.post(
+        response = throttled_post(
+            'chat',
+            api_key,
             f"{API_BASE_URL}/chat/completions",
+            tokens=tokens,
             headers=headers,
             json=payload
         )
@@ -74,16 +104,7 @@ def refine_prompt(image_description, llm_model=None, prompt_template=None, api_k
         logger.info(f"API response: {result}")
 
         # Extract the refined prompt
-        message = result["choices"][0]["message"]
-        refined_prompt = message.get("content", "")
-
-        # 如果content为空，尝试从reasoning_content获取内容
-        if not refined_prompt and "reasoning_content" in message:
-            refined_prompt = message["reasoning_content"]
-            # 从reasoning_content中提取最后一段作为提示词
-            paragraphs = refined_prompt.split('\n\n')
-            if len(paragraphs) > 1:
-                refined_prompt = paragraphs[-1]
+        refined_prompt = _extract_prompt(result)
 
         logger.info(f"Successfully refined prompt: {refined_prompt}")
         return refined_prompt
@@ -96,4 +117,45 @@ def refine_prompt(image_description, llm_model=None, prompt_template=None, api_k
                 logger.error(f"Response content: {response.text}")
             except:
                 pass
+        if raise_transient and is_transient_error(e):
+            raise
+        return None
+
+async def refine_prompt_async(image_description, llm_model=None, prompt_template=None, api_key=None, temperature=0.7):
+    """
+    Async version of ``refine_prompt``.
+
+    Args:
+        image_description (str): Description of the image content
+        llm_model (str, optional): The LLM model to use. Defaults to the one in config.
+        prompt_template (str, optional): Custom system prompt template to use.
+        temperature (float, optional): Sampling temperature of the LLM.
+
+    Returns:
+        str: Refined prompt for I2V generation
+    """
+    response = None
+    try:
+        api_key, headers, payload, tokens = _build_refine_request(image_description, llm_model, prompt_template, api_key, temperature)
+
+        response = await throttled_post_async(
+            'chat',
+            api_key,
+            f"{API_BASE_URL}/chat/completions",
+            tokens=tokens,
+            headers=headers,
+            json=payload
+        )
+        response.raise_for_status()
+
+        refined_prompt = _extract_prompt(response.json())
+
+        logger.info(f"Successfully refined prompt: {refined_prompt}")
+        return refined_prompt
+
+    except Exception as e:
+        logger.error(f"Error refining prompt: {e}")
+        if response is not None:
+            logger.error(f"Response status code: {response.status_code}")
+            logger.error(f"Response content: {response.text}")
         return None
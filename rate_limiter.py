@@ -0,0 +1,213 @@
+"""
+Client-side rate limiting for SiliconFlow API calls.
+
+Calls are grouped by API key and endpoint class (``chat``, ``video_submit``,
+``status``). Each group has a requests-per-minute bucket, an optional
+tokens-per-minute bucket and a cap on requests in flight, so large batches run
+at the provider's ceiling instead of tripping 429 errors.
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+
+import http_client
+from config import RATE_LIMITS, RATE_LIMIT_MAX_RETRIES
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """A thread-safe token bucket that refills continuously."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self, amount=1):
+        """
+        Take ``amount`` tokens if they are available.
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise the seconds to wait before trying again
+        """
+        # 单次请求不可能超过桶的容量，否则会永远等待
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now >= self.blocked_until and self.tokens >= amount:
+                self.tokens -= amount
+                return 0.0
+            return max(self.blocked_until - now, (amount - self.tokens) / self.rate, 0.001)
+
+    def acquire(self, amount=1):
+        """Block until ``amount`` tokens are available and take them."""
+        while True:
+            wait = self.try_acquire(amount)
+            if not wait:
+                return
+            time.sleep(min(wait, 5.0))
+
+    async def acquire_async(self, amount=1):
+        """Wait without blocking the event loop until ``amount`` tokens are available and take them."""
+        while True:
+            wait = self.try_acquire(amount)
+            if not wait:
+                return
+            await asyncio.sleep(min(wait, 5.0))
+
+    def pause(self, seconds):
+        """Stop handing out tokens for ``seconds`` (e.g. after a 429)."""
+        with self._lock:
+            now = time.monotonic()
+            self.blocked_until = max(self.blocked_until, now + seconds)
+            self.tokens = 0.0
+            self.updated_at = now
+
+
+class _Limit:
+    """The buckets and in-flight semaphore of one (API key, endpoint class) pair."""
+
+    def __init__(self, settings):
+        self.requests = TokenBucket(settings['rpm']) if settings.get('rpm') else None
+        self.tokens = TokenBucket(settings['tpm']) if settings.get('tpm') else None
+        max_in_flight = settings.get('max_in_flight')
+        self.in_flight = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+
+
+class RateLimiter:
+    """Rate limits keyed by API key and endpoint class."""
+
+    def __init__(self, limits):
+        """
+        Args:
+            limits (dict): ``{endpoint_class: {'rpm': ..., 'tpm': ..., 'max_in_flight': ...}}``;
+                a missing or zero value disables that limit
+        """
+        self.limits = limits
+        self._groups = {}
+        self._lock = threading.Lock()
+
+    def _group(self, endpoint_class, api_key):
+        # API Key只以哈希形式作为键保存
+        key = (endpoint_class, hashlib.sha256((api_key or '').encode('utf-8')).hexdigest())
+        with self._lock:
+            group = self._groups.get(key)
+            if group is None:
+                group = _Limit(self.limits.get(endpoint_class, {}))
+                self._groups[key] = group
+            return group
+
+    @contextmanager
+    def limit(self, endpoint_class, api_key, tokens=0):
+        """Wait for a request slot (and ``tokens`` LLM tokens) and hold it for the block."""
+        group = self._group(endpoint_class, api_key)
+        if group.requests:
+            group.requests.acquire()
+        if group.tokens and tokens:
+            group.tokens.acquire(tokens)
+        if group.in_flight:
+            group.in_flight.acquire()
+        try:
+            yield
+        finally:
+            if group.in_flight:
+                group.in_flight.release()
+
+    @asynccontextmanager
+    async def limit_async(self, endpoint_class, api_key, tokens=0):
+        """Async version of ``limit``; the limits are shared with threaded callers."""
+        group = self._group(endpoint_class, api_key)
+        if group.requests:
+            await group.requests.acquire_async()
+        if group.tokens and tokens:
+            await group.tokens.acquire_async(tokens)
+        if group.in_flight:
+            # 与线程共用同一个信号量，协程中以非阻塞方式轮询
+            while not group.in_flight.acquire(blocking=False):
+                await asyncio.sleep(0.05)
+        try:
+            yield
+        finally:
+            if group.in_flight:
+                group.in_flight.release()
+
+    def backoff(self, endpoint_class, api_key, seconds):
+        """Pause all requests of a group after the provider rejected one with 429."""
+        group = self._group(endpoint_class, api_key)
+        logger.warning(f"Rate limited on {endpoint_class}, pausing for {seconds:.1f} seconds")
+        if group.requests:
+            group.requests.pause(seconds)
+        if group.tokens:
+            group.tokens.pause(seconds)
+
+
+def estimate_tokens(*texts, max_tokens=0, images=0):
+    """Roughly estimate the tokens a chat request will consume."""
+    # 粗略估算：约4个字符一个token，每张图片按1000个token计算
+    return sum(len(text) for text in texts if text) // 4 + max_tokens + images * 1000
+
+
+def _retry_after(response, attempt):
+    """Seconds to wait after a 429, from the Retry-After header or exponential backoff."""
+    header = response.headers.get('Retry-After')
+    if header:
+        try:
+            return max(1.0, float(header))
+        except ValueError:
+            pass
+    return 2.0 ** attempt
+
+
+def throttled_post(endpoint_class, api_key, url, tokens=0, **kwargs):
+    """
+    ``http_client.post`` behind the shared rate limiter, retrying on 429.
+
+    Returns:
+        requests.Response: The last response received
+    """
+    for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+        with rate_limiter.limit(endpoint_class, api_key, tokens=tokens):
+            response = http_client.post(url, **kwargs)
+
+        if response.status_code != 429 or attempt == RATE_LIMIT_MAX_RETRIES:
+            return response
+
+        rate_limiter.backoff(endpoint_class, api_key, _retry_after(response, attempt))
+
+    return response
+
+
+async def throttled_post_async(endpoint_class, api_key, url, tokens=0, **kwargs):
+    """
+    Async version of ``throttled_post`` using ``http_client.post_async``.
+
+    Returns:
+        httpx.Response: The last response received
+    """
+    for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+        async with rate_limiter.limit_async(endpoint_class, api_key, tokens=tokens):
+            response = await http_client.post_async(url, **kwargs)
+
+        if response.status_code != 429 or attempt == RATE_LIMIT_MAX_RETRIES:
+            return response
+
+        rate_limiter.backoff(endpoint_class, api_key, _retry_after(response, attempt))
+
+    return response
+
+
+# 进程内共享的限流器
+rate_limiter = RateLimiter(RATE_LIMITS)
@@ -0,0 +1,153 @@
+"""
+Persistent result cache for expensive API calls.
+
+Results such as VLM image descriptions are stored in the ``cache_entries``
+table of the application database, so they survive restarts and are shared by
+every upload of the same content. Each cache is a namespace in that table with
+its own size limit (least recently used entries are evicted first) and
+optional time to live.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from database import connect
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(*parts):
+    """Build a cache key from JSON-serializable parts."""
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class PersistentCache:
+    """A namespace of the ``cache_entries`` table with LRU and TTL eviction."""
+
+    def __init__(self, db_path, namespace, max_entries=10000, ttl_seconds=None, evict_every=50):
+        """
+        Args:
+            db_path (str): Path of the SQLite database
+            namespace (str): Name of the cache inside the table
+            max_entries (int): Entries kept before the least recently used are evicted
+            ttl_seconds (float, optional): Entries older than this are treated as missing
+            evict_every (int): Run eviction after this many insertions
+        """
+        self.db_path = db_path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.evict_every = evict_every
+
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._counter_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connect(self):
+        """Return this thread's connection to the database."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = connect(self.db_path, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def record_lookup(self, hit):
+        """Count a lookup in the hit/miss statistics (for callers that validate hits themselves)."""
+        with self._counter_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key, count=True):
+        """
+        Return the cached value for ``key``, or None.
+
+        Args:
+            key (str): Cache key
+            count (bool): Whether the lookup counts towards the hit/miss statistics
+        """
+        try:
+            conn = self._connect()
+            now = time.time()
+            row = conn.execute(
+                'SELECT value, created_at FROM cache_entries WHERE namespace = ? AND key = ?',
+                (self.namespace, key)
+            ).fetchone()
+
+            if row is not None and self.ttl_seconds and now - row['created_at'] > self.ttl_seconds:
+                conn.execute('DELETE FROM cache_entries WHERE namespace = ? AND key = ?', (self.namespace, key))
+                row = None
+
+            if row is None:
+                if count:
+                    self.record_lookup(False)
+                return None
+
+            conn.execute(
+                'UPDATE cache_entries SET last_used_at = ?, hits = hits + 1 WHERE namespace = ? AND key = ?',
+                (now, self.namespace, key)
+            )
+            if count:
+                self.record_lookup(True)
+            return json.loads(row['value'])
+        except Exception as e:
+            # 缓存不可用时按未命中处理，不影响主流程
+            logger.error(f"Error reading {self.namespace} cache: {e}")
+            if count:
+                self.record_lookup(False)
+            return None
+
+    def set(self, key, value):
+        """Store a JSON-serializable value under ``key``."""
+        try:
+            now = time.time()
+            self._connect().execute(
+                'INSERT OR REPLACE INTO cache_entries (namespace, key, value, created_at, last_used_at, hits) '
+                'VALUES (?, ?, ?, ?, ?, 0)',
+                (self.namespace, key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+
+            with self._counter_lock:
+                self._writes += 1
+                evict = self._writes % self.evict_every == 0
+            if evict:
+                self.evict()
+        except Exception as e:
+            logger.error(f"Error writing {self.namespace} cache: {e}")
+
+    def evict(self):
+        """Delete expired entries and the least recently used ones beyond ``max_entries``."""
+        conn = self._connect()
+        if self.ttl_seconds:
+            conn.execute(
+                'DELETE FROM cache_entries WHERE namespace = ? AND created_at < ?',
+                (self.namespace, time.time() - self.ttl_seconds)
+            )
+        conn.execute(
+            'DELETE FROM cache_entries WHERE namespace = ? AND key IN ('
+            'SELECT key FROM cache_entries WHERE namespace = ? ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)',
+            (self.namespace, self.namespace, self.max_entries)
+        )
+
+    def stats(self):
+        """Return the number of entries and the hit/miss counters of this process."""
+        try:
+            entries = self._connect().execute(
+                'SELECT COUNT(*) FROM cache_entries WHERE namespace = ?', (self.namespace,)
+            ).fetchone()[0]
+        except Exception:
+            entries = None
+        with self._counter_lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None
+            }
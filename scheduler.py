@@ -0,0 +1,315 @@
+"""
+Background job scheduler for the SiliconFlow I2V application.
+
+Long running work is split into pipeline stages (image description, prompt
+refinement, video submission, download, ...). Every stage has its own bounded
+queue and its own worker threads, so cheap chat calls can run far ahead of the
+slow video queue and downloads never block new submissions.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class SchedulerFullError(Exception):
+    """Raised when a stage queue has no room for another job."""
+
+
+class KeyedLock:
+    """One lock per key, created on demand and dropped when nobody holds or waits for it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}
+
+    @contextmanager
+    def hold(self, key):
+        """Hold the lock of ``key`` for the duration of the ``with`` block."""
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+
+        entry[0].acquire()
+        try:
+            yield
+        finally:
+            entry[0].release()
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+
+class _Stage:
+    """Queue, workers and counters of one pipeline stage."""
+
+    def __init__(self, name, handler, workers, queue_size, detached):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.queue_size = queue_size
+        self.detached = detached
+
+        self.pending = deque()
+        self.running = 0
+        self.condition = threading.Condition()
+        self.threads = []
+
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.recent = deque(maxlen=1000)
+
+    def record(self, started, ok):
+        """Record a finished job. Must hold the condition."""
+        now = time.monotonic()
+        if ok:
+            self.completed += 1
+        else:
+            self.failed += 1
+        self.busy_seconds += now - started
+        self.recent.append(now)
+
+    def stats(self):
+        with self.condition:
+            now = time.monotonic()
+            finished = self.completed + self.failed
+            return {
+                'workers': self.workers,
+                'queued': len(self.pending),
+                'running': self.running,
+                'completed': self.completed,
+                'failed': self.failed,
+                'throughput_per_minute': sum(1 for t in self.recent if now - t <= 60),
+                'avg_seconds': round(self.busy_seconds / finished, 3) if finished else None
+            }
+
+
+class TaskScheduler:
+    """
+    A set of pipeline stages, each with its own bounded queue and worker threads.
+
+    With a ``job_store`` every job is persisted first. A dispatcher thread then
+    leases due jobs from the store into the stage queues, so jobs that do not
+    fit in memory wait in the database, failed jobs are retried with backoff, and
+    jobs left over from a previous process are resumed after a restart.
+
+    Handlers raise to have their job retried. Errors they cannot recover from
+    should be handled inside the handler instead, since raising only delays
+    them by the retry backoff.
+    """
+
+    def __init__(self, max_queue_size=1000, context_factory=None, job_store=None,
+                 max_attempts=3, retry_delay=30, dispatch_interval=2, job_retention=7 * 24 * 3600,
+                 on_job_failed=None):
+        """
+        Args:
+            max_queue_size (int): Default number of jobs a stage keeps in memory
+            context_factory (callable, optional): Returns a context manager that
+                every job runs inside (e.g. ``app.app_context``)
+            job_store (job_queue.JobStore, optional): Persistent store for jobs
+            max_attempts (int): How often a failing job is tried before giving up
+            retry_delay (float): Base delay in seconds before retrying a failed job
+            dispatch_interval (float): Seconds between two scans of the job store
+            job_retention (float): Seconds finished jobs are kept in the store
+            on_job_failed (callable, optional): Called with ``(stage, args, error)``
+                when a job has failed for good: on its last attempt, or at once
+                without a job store
+        """
+        self.max_queue_size = max_queue_size
+        self.context_factory = context_factory
+        self.job_store = job_store
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.dispatch_interval = dispatch_interval
+        self.job_retention = job_retention
+        self.on_job_failed = on_job_failed
+
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._dispatch_wakeup = threading.Event()
+        self._started = False
+
+    def register_stage(self, stage, handler, workers=1, queue_size=None, detached=False):
+        """
+        Register a pipeline stage.
+
+        Args:
+            stage (str): Stage name
+            handler (callable): Runs one job of the stage
+            workers (int): Number of worker threads dedicated to the stage
+            queue_size (int, optional): Jobs kept in memory for the stage
+            detached (bool): Handlers of detached stages receive the job ID as
+                ``job_id`` keyword and the job stays leased after the handler
+                returns, until someone calls ``complete_job``. This is used for
+                work that continues outside the workers, such as waiting on the
+                video status poller.
+        """
+        with self._lock:
+            if self._started:
+                raise RuntimeError("Stages must be registered before the scheduler starts")
+            self._stages[stage] = _Stage(stage, handler, workers, queue_size or self.max_queue_size, detached)
+
+    def start(self):
+        """Start the worker threads. Calling it more than once is harmless."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        for stage in self._stages.values():
+            for i in range(stage.workers):
+                worker = threading.Thread(target=self._worker_loop, args=(stage,), name=f"{stage.name}-worker-{i}")
+                worker.daemon = True
+                worker.start()
+                stage.threads.append(worker)
+
+        if self.job_store is not None:
+            dispatcher = threading.Thread(target=self._dispatch_loop, name="scheduler-dispatcher")
+            dispatcher.daemon = True
+            dispatcher.start()
+
+        logger.info("Scheduler started: " + ", ".join(f"{s.name}={s.workers}" for s in self._stages.values()))
+
+    def submit(self, stage, *args):
+        """
+        Queue a job for the given stage.
+
+        Returns:
+            str: The job ID when a job store is used, otherwise None
+
+        Raises:
+            KeyError: If the stage is not registered
+            SchedulerFullError: If the stage queue is full and there is no job store
+        """
+        self.start()
+
+        if stage not in self._stages:
+            raise KeyError(f"Unknown stage: {stage}")
+
+        if self.job_store is not None:
+            job_id = self.job_store.enqueue(stage, args)
+            self._dispatch_wakeup.set()
+            return job_id
+
+        target = self._stages[stage]
+        with target.condition:
+            if len(target.pending) >= target.queue_size:
+                raise SchedulerFullError(f"Stage {stage} queue is full ({target.queue_size} jobs)")
+            target.pending.append((None, args))
+            target.condition.notify()
+        return None
+
+    def complete_job(self, job_id):
+        """Mark a detached job as done."""
+        if self.job_store is not None and job_id:
+            self.job_store.complete(job_id)
+
+    def stats(self):
+        """Return queue depth, running jobs and throughput per stage."""
+        stored = self.job_store.counts() if self.job_store is not None else {}
+        result = {}
+        for name, stage in self._stages.items():
+            result[name] = stage.stats()
+            result[name]['stored'] = stored.get(name, {})
+        return result
+
+    def _dispatch_loop(self):
+        """Lease due jobs from the store into the stage queues."""
+        last_renewal = 0
+        last_purge = 0
+        while True:
+            try:
+                now = time.time()
+                if now - last_renewal > self.job_store.lease_seconds / 3:
+                    self.job_store.renew_leases()
+                    last_renewal = now
+                if now - last_purge > 3600:
+                    self.job_store.purge(self.job_retention)
+                    last_purge = now
+
+                for stage in self._stages.values():
+                    with stage.condition:
+                        free = stage.queue_size - len(stage.pending)
+
+                    jobs = self.job_store.claim(free, stage=stage.name)
+                    if jobs:
+                        with stage.condition:
+                            stage.pending.extend((job_id, args) for job_id, _, args in jobs)
+                            stage.condition.notify(len(jobs))
+            except Exception as e:
+                logger.error(f"Scheduler dispatcher error: {e}")
+
+            self._dispatch_wakeup.wait(self.dispatch_interval)
+            self._dispatch_wakeup.clear()
+
+    def _run_job(self, stage, job_id, args):
+        if stage.detached:
+            stage.handler(*args, job_id=job_id)
+        else:
+            stage.handler(*args)
+
+    def _worker_loop(self, stage):
+        while True:
+            with stage.condition:
+                while not stage.pending:
+                    stage.condition.wait()
+                job_id, args = stage.pending.popleft()
+                stage.running += 1
+
+            started = time.monotonic()
+            ok = True
+            try:
+                if self.context_factory:
+                    with self.context_factory():
+                        self._run_job(stage, job_id, args)
+                else:
+                    self._run_job(stage, job_id, args)
+
+                if job_id and not stage.detached:
+                    self.job_store.complete(job_id)
+            except Exception as e:
+                ok = False
+                logger.error(f"Job in stage {stage.name} failed: {e}")
+                if job_id:
+                    self._handle_failure(stage, job_id, args, e)
+                else:
+                    self._give_up(stage, args, e)
+            finally:
+                with stage.condition:
+                    stage.running -= 1
+                    stage.record(started, ok)
+                # 队列有空位了，让调度线程尽快领取下一批任务
+                self._dispatch_wakeup.set()
+
+    def _handle_failure(self, stage, job_id, args, error):
+        """Retry a failed job with exponential backoff, or give up."""
+        try:
+            attempts = self.job_store.attempts(job_id)
+            if attempts < self.max_attempts:
+                delay = self.retry_delay * (2 ** (attempts - 1))
+                logger.info(f"Retrying job {job_id} in {delay} seconds (attempt {attempts}/{self.max_attempts})")
+                self.job_store.retry(job_id, str(error), delay)
+                return
+            self.job_store.fail(job_id, str(error))
+        except Exception as e:
+            logger.error(f"Error recording failure of job {job_id}: {e}")
+        self._give_up(stage, args, error)
+
+    def _give_up(self, stage, args, error):
+        """Report a job that will not be tried again."""
+        if self.on_job_failed is None:
+            return
+        try:
+            if self.context_factory:
+                with self.context_factory():
+                    self.on_job_failed(stage.name, args, error)
+            else:
+                self.on_job_failed(stage.name, args, error)
+        except Exception as e:
+            logger.error(f"Error reporting failed job in stage {stage.name}: {e}")
@@ -222,25 +222,6 @@ document.addEventListener('DOMContentLoaded', function() {
     const completedTasksCount = document.getElementById('completedTasksCount');
     const totalTasksCount = document.getElementById('totalTasksCount');
 
-    // 创建单个任务
-    async function createTask(formData) {
-        try {
-            const response = await fetch('/api/tasks', {
-                method: 'POST',
-                body: formData
-            });
-
-            if (!response.ok) {
-                throw new Error('网络响应异常');
-            }
-
-            return await response.json();
-        } catch (error) {
-            console.error('Error:', error);
-            throw error;
-        }
-    }
-
     // 批量创建任务
     async function createBatchTasks(files, taskCount) {
         const totalTasks = files.length * taskCount;
@@ -267,76 +248,38 @@ document.addEventListener('DOMContentLoaded', function() {
         // 显示批处理模态框
         batchProcessingModal.show();
 
-        // 获取表单数据（除了图片外的所有字段）
-        const baseFormData = new FormData(videoForm);
-        baseFormData.delete('image'); // 删除原始的图片数组
-
-        // 存储所有其他字段的键值对
-        const formDataEntries = {};
-        for (let [key, value] of baseFormData.entries()) {
-            formDataEntries[key] = value;
-            console.log(`表单字段: ${key} = ${value}`);
-        }
-
-        // 生成批处理ID
-        const batchId = 'batch_' + Date.now();
-
-        // 对每个图片创建指定数量的任务
-        for (let i = 0; i < files.length; i++) {
-            const file = files[i];
-            console.log(`处理图片 ${i+1}/${files.length}: ${file.name}`);
-
-            for (let j = 0; j < taskCount; j++) {
-                try {
-                    // 创建新的FormData对象
-                    const taskFormData = new FormData();
-
-                    // 添加所有其他字段
-                    for (let key in formDataEntries) {
-                        taskFormData.append(key, formDataEntries[key]);
-                    }
-
-                    // 添加批处理信息
-                    taskFormData.append('batch_id', batchId);
-                    taskFormData.append('batch_size', totalTasks);
-                    taskFormData.append('batch_index', i * taskCount + j);
+        // 使用表单中的所有字段（包括多张图片），一次请求创建所有任务
+        const bulkFormData = new FormData(videoForm);
+        bulkFormData.set('task_count', taskCount);
 
-                    // 添加当前图片
-                    taskFormData.append('image', file); // 注意这里使用'image'而不是'images'，因为后端期望的是'image'
-                    console.log(`添加图片到任务 ${i+1}.${j+1}: ${file.name}`);
-
-                    // 如果有多个任务，为每个任务生成不同的随机种子
-                    if (taskCount > 1 && !taskFormData.get('seed')) {
-                        const randomSeed = Math.floor(Math.random() * 2147483647);
-                        taskFormData.set('seed', randomSeed);
-                        console.log(`为任务 ${i+1}.${j+1} 设置随机种子: ${randomSeed}`);
-                    }
-
-                    // 创建任务
-                    console.log(`提交任务 ${i+1}.${j+1}...`);
-                    const result = await createTask(taskFormData);
-                    console.log(`任务 ${i+1}.${j+1} 创建成功: ID=${result.task_id}`);
-                    successTasks++;
+        try {
+            console.log(`提交批量任务: ${files.length} 张图片, 每张 ${taskCount} 次`);
+            const response = await fetch('/api/tasks/bulk', {
+                method: 'POST',
+                body: bulkFormData
+            });
 
-                } catch (error) {
-                    console.error(`创建任务失败 (图片 ${i+1}, 尝试 ${j+1}):`, error);
-                }
+            const result = await response.json();
+            if (!response.ok) {
+                throw new Error(result.error || '网络响应异常');
+            }
 
-                // 更新进度
-                completedTasks++;
-                const progress = Math.round((completedTasks / totalTasks) * 100);
-                console.log(`进度: ${completedTasks}/${totalTasks} (${progress}%)`);
+            successTasks = result.task_ids.length;
+            console.log(`批量任务创建成功: ${successTasks} 个任务`);
+        } catch (error) {
+            console.error('批量创建任务失败:', error);
+        }
 
-                if (batchProgressBar) {
-                    batchProgressBar.style.width = `${progress}%`;
-                    batchProgressBar.textContent = `${progress}%`;
-                    batchProgressBar.setAttribute('aria-valuenow', progress);
-                }
+        // 更新进度
+        completedTasks = totalTasks;
+        if (batchProgressBar) {
+            batchProgressBar.style.width = '100%';
+            batchProgressBar.textContent = '100%';
+            batchProgressBar.setAttribute('aria-valuenow', 100);
+        }
 
-                if (completedTasksCount) {
-                    completedTasksCount.textContent = completedTasks;
-                }
-            }
+        if (completedTasksCount) {
+            completedTasksCount.textContent = completedTasks;
         }
 
         // 关闭批处理模态框
@@ -415,22 +358,21 @@ document.addEventListener('DOMContentLoaded', function() {
         const recentTasksContainer = document.getElementById('recentTasks');
 
         if (recentTasksContainer) {
-            fetch('/api/tasks')
+            // 只获取最新的5个任务及显示需要的字段
+            fetch('/api/tasks?limit=5&fields=id,status,created_at,image_path')
             .then(response => {
                 if (!response.ok) {
                     throw new Error('网络响应异常');
                 }
                 return response.json();
             })
-            .then(tasks => {
-                if (tasks.length === 0) {
+            .then(data => {
+                const recentTasks = data.tasks;
+                if (recentTasks.length === 0) {
                     recentTasksContainer.innerHTML = '<p class="text-center text-muted">暂无生成记录</p>';
                     return;
                 }
 
-                // 只显示最新的5个任务
-                const recentTasks = tasks.slice(0, 5);
-
                 let html = '<div class="list-group list-group-flush">';
 
                 recentTasks.forEach(task => {
@@ -87,7 +87,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 }
 
                 // 重新加载任务列表
-                refreshTasksWithVideoCheck();
+                refreshTasks();
 
                 // 清空选中的视频
                 selectedVideoTasks = [];
@@ -207,19 +207,95 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
-    // Set up auto-refresh
-    setInterval(() => refreshTasksWithVideoCheck(), 10000); // 每10秒刷新一次
+    // 任务状态变化由服务器通过事件流（/api/tasks/events）推送，见 connectTaskEvents
+    // 浏览器不支持 EventSource 时退回轮询：根据等待中任务的预计完成时间安排下一次刷新，快完成时刷新得更频繁，没有进行中的任务时放慢
+    const MIN_REFRESH_INTERVAL = 3000;
+    const DEFAULT_REFRESH_INTERVAL = 10000;
+    const IDLE_REFRESH_INTERVAL = 30000;
+
+    function getNextRefreshDelay(tasks) {
+        if (!tasks) {
+            return DEFAULT_REFRESH_INTERVAL;
+        }
+
+        const finishedStatuses = ['completed', 'completed_with_warning', 'failed'];
+        const activeTasks = tasks.filter(task => !finishedStatuses.includes(task.status));
+        if (activeTasks.length === 0) {
+            return IDLE_REFRESH_INTERVAL;
+        }
+
+        const etas = activeTasks
+            .filter(task => task.eta !== null && task.eta !== undefined)
+            .map(task => task.eta * 1000);
+        if (etas.length === 0) {
+            return DEFAULT_REFRESH_INTERVAL;
+        }
+
+        return Math.min(Math.max(Math.min(...etas), MIN_REFRESH_INTERVAL), IDLE_REFRESH_INTERVAL);
+    }
+
+    function scheduleNextRefresh(tasks) {
+        setTimeout(() => {
+            refreshTasks()
+                .then(scheduleNextRefresh)
+                .catch(() => scheduleNextRefresh(null));
+        }, getNextRefreshDelay(tasks));
+    }
+
+    // 订阅任务变更事件，首次加载任务列表之后调用，从加载时的同步游标开始接收变更
+    let taskEvents = null;
+
+    function connectTaskEvents() {
+        if (taskEvents) return;
+        if (!window.EventSource) {
+            scheduleNextRefresh(loadedTasks);
+            return;
+        }
+
+        const params = new URLSearchParams({ limit: TASK_PAGE_SIZE, fields: TASK_LIST_FIELDS });
+        if (syncCursor !== null) {
+            params.set('since', syncCursor);
+        }
+
+        // 断线后 EventSource 会自动重连，并通过 Last-Event-ID 从最后收到的变更继续
+        taskEvents = new EventSource(`/api/tasks/events?${params}`);
+        taskEvents.addEventListener('tasks', async event => {
+            try {
+                const changes = JSON.parse(event.data);
+                if (changes.reset) {
+                    console.log('任务变更过多，重新加载任务列表');
+                    loadedTasks = [];
+                    await fetchAllTasks();
+                } else if (!applyTaskChanges(changes)) {
+                    return;
+                }
+                updateEtas(loadedTasks);
+                updateTasksList(loadedTasks);
+            } catch (error) {
+                console.error('处理任务变更事件时出错:', error);
+            }
+        });
+        taskEvents.addEventListener('error', () => {
+            console.log('任务事件流已断开，正在重连...');
+        });
+    }
+
+    // 事件流只在任务变化时推送，预计剩余时间在本地倒计时
+    const ETA_TICK_INTERVAL = 5000;
+    setInterval(() => {
+        if (loadedTasks.some(task => task.eta_deadline)) {
+            updateEtas(loadedTasks);
+            updateTasksList(loadedTasks);
+        }
+    }, ETA_TICK_INTERVAL);
 
     // Task details modal
     const taskDetailsModal = new bootstrap.Modal(document.getElementById('taskDetailsModal'));
     const previewBtn = document.getElementById('previewBtn');
 
-    // 刷新任务并检查视频的函数
-    async function refreshTasksWithVideoCheck() {
+    // 刷新任务列表：只获取上次同步之后有变化的任务
+    async function refreshTasks() {
         try {
-            // 记录当前选中的视频列表，用于调试
-            console.log('刷新前选中的视频列表:', [...selectedVideoTasks]);
-
             // 显示状态消息
             const statusElement = document.getElementById('statusMessage');
             if (statusElement && !statusElement.textContent) {
@@ -227,188 +303,195 @@ document.addEventListener('DOMContentLoaded', function() {
                 statusElement.classList.remove('d-none');
             }
 
-            // 首先加载所有任务
-            const tasks = await fetchAllTasks();
+            const { tasks, changed } = await syncTasks();
 
-            // 调试信息：打印所有任务
-            console.log('所有任务:', tasks);
-
-            // 更新任务列表显示
-            updateTasksList(tasks);
+            // 任务有变化时才更新任务列表显示
+            if (changed) {
+                updateTasksList(tasks);
+            }
 
             // 隐藏状态消息
             if (statusElement && statusElement.textContent === '正在加载任务列表...') {
                 statusElement.classList.add('d-none');
             }
 
-            // 找出所有未完成但应该有视频的任务
-            const tasksToCheck = tasks.filter(task => {
-                // 检查所有有request_id但没有video_path的任务
-                // 包括pending, processing, generating_video, waiting_for_video状态
-                const shouldCheck = task.request_id &&
-                       !task.video_path &&
-                       task.status !== 'completed' &&
-                       task.status !== 'failed';
-
-                // 调试信息：打印每个任务的检查条件
-                console.log(`任务 ${task.id} 检查条件:`, {
-                    'request_id存在': !!task.request_id,
-                    'video_path不存在': !task.video_path,
-                    '状态不是completed': task.status !== 'completed',
-                    '状态不是failed': task.status !== 'failed',
-                    '父任务ID': task.parent_task_id || '无',
-                    '最终结果': shouldCheck
-                });
-
-                return shouldCheck;
-            });
+            return tasks;
+        } catch (error) {
+            console.error('刷新任务列表时出错:', error);
+            throw error;
+        }
+    }
 
-            // 打印需要检查的任务数量
-            console.log(`需要检查的任务数量: ${tasksToCheck.length}`);
-            if (tasksToCheck.length > 0) {
-                console.log('需要检查的任务:', tasksToCheck);
-            }
+    // 任务列表分页：自动刷新只重新获取第一页，更早的任务通过“加载更多”获取
+    const TASK_PAGE_SIZE = 50;
+    const TASK_LIST_FIELDS = 'id,status,message,created_at,image_path,video_path,parent_task_id,request_id,eta';
+    let loadedTasks = [];
+    let olderTasksCursor = null; // 已加载的最后一页之后的游标，没有更多任务时为null
+    let syncCursor = null; // 增量同步游标，只获取此后有变化的任务
 
-            // 如果有需要检查的任务
-            if (tasksToCheck.length > 0) {
-                console.log(`检查 ${tasksToCheck.length} 个任务的视频状态...`);
+    // 按列表顺序（创建时间、ID倒序）判断task是否在other之后
+    function isOlderTask(task, other) {
+        return task.created_at < other.created_at || (task.created_at === other.created_at && task.id < other.id);
+    }
 
-                // 显示检查进度
-                const statusElement = document.getElementById('statusMessage');
-                if (statusElement) {
-                    statusElement.textContent = `正在检查 ${tasksToCheck.length} 个任务的视频状态...`;
-                    statusElement.classList.remove('d-none');
-                }
+    // 按列表顺序排序
+    function compareTasks(a, b) {
+        if (isOlderTask(a, b)) return 1;
+        if (isOlderTask(b, a)) return -1;
+        return 0;
+    }
 
-                // 对每个任务进行检查
-                const checkPromises = tasksToCheck.map(async task => {
-                    try {
-                        console.log(`开始检查任务 ${task.id} 的视频状态...`);
+    // 记录预计完成的时刻，增量同步时未变化的任务也能显示正确的剩余时间
+    function stampEtaDeadlines(tasks) {
+        const now = Date.now();
+        tasks.forEach(task => {
+            task.eta_deadline = task.eta !== null && task.eta !== undefined ? now + task.eta * 1000 : null;
+        });
+    }
 
-                        // 直接使用直接检查视频状态的方法
-                        if (task.request_id) {
-                            console.log(`任务 ${task.id} 有request_id，直接检查视频状态`);
-                            return await directCheckVideoStatus(task.id, task.request_id);
-                        }
+    function updateEtas(tasks) {
+        const now = Date.now();
+        tasks.forEach(task => {
+            if (task.eta_deadline) {
+                task.eta = Math.max(0, Math.round((task.eta_deadline - now) / 1000));
+            }
+        });
+    }
 
-                        // 如果没有request_id，尝试使用原来的方法
-                        console.log(`任务 ${task.id} 没有request_id，使用原来的方法检查视频状态`);
-                        const response = await fetch(`/api/tasks/${task.id}/check_video`);
-                        if (!response.ok) {
-                            console.log(`任务 ${task.id} 检查失败，状态码: ${response.status}`);
-                            return false;
-                        }
+    // 获取任务列表：刷新第一页，保留已经加载的更早的任务
+    async function fetchAllTasks() {
+        const page = await fetchTaskPage(null);
+        stampEtaDeadlines(page.tasks);
+        syncCursor = page.sync_cursor;
 
-                        const result = await response.json();
-                        console.log(`任务 ${task.id} 视频状态检查结果:`, result);
-                        return result.updated;
-                    } catch (error) {
-                        console.error(`检查任务 ${task.id} 的视频状态时出错:`, error);
-                        return false;
-                    }
-                });
+        if (page.next_cursor === null) {
+            loadedTasks = page.tasks;
+            olderTasksCursor = null;
+        } else {
+            const oldest = page.tasks[page.tasks.length - 1];
+            const olderTasks = loadedTasks.filter(task => isOlderTask(task, oldest));
+            loadedTasks = page.tasks.concat(olderTasks);
+            if (olderTasks.length === 0) {
+                olderTasksCursor = page.next_cursor;
+            }
+        }
 
-                // 等待所有检查完成
-                const results = await Promise.all(checkPromises);
-                const updatedCount = results.filter(Boolean).length;
+        updateLoadMoreButton();
+        return loadedTasks;
+    }
 
-                // 更新状态消息
-                if (statusElement) {
-                    if (updatedCount > 0) {
-                        statusElement.textContent = `已更新 ${updatedCount} 个任务的视频状态`;
-                        setTimeout(() => {
-                            statusElement.classList.add('d-none');
-                        }, 3000);
-                    } else {
-                        statusElement.classList.add('d-none');
-                    }
-                }
+    // 加载下一页更早的任务
+    async function loadMoreTasks() {
+        if (!olderTasksCursor) return;
 
-                // 如果有任务更新了，重新加载任务列表
-                if (updatedCount > 0) {
-                    console.log(`有 ${updatedCount} 个任务的视频状态已更新，重新加载任务列表...`);
-                    const updatedTasks = await fetchAllTasks();
-                    updateTasksList(updatedTasks);
-                }
-            }
+        const page = await fetchTaskPage(olderTasksCursor);
+        stampEtaDeadlines(page.tasks);
+        const loadedIds = new Set(loadedTasks.map(task => task.id));
+        loadedTasks = loadedTasks.concat(page.tasks.filter(task => !loadedIds.has(task.id)));
+        olderTasksCursor = page.next_cursor;
 
-            return tasks;
-        } catch (error) {
-            console.error('刷新任务列表时出错:', error);
-            throw error;
-        }
+        updateLoadMoreButton();
+        updateTasksList(loadedTasks);
     }
 
-    // 直接检查视频状态的函数
-    async function directCheckVideoStatus(taskId, requestId) {
-        try {
-            console.log(`直接检查任务 ${taskId} 的视频状态，request_id: ${requestId}`);
-
-            // 获取保存的 API Key
-            const apiKey = localStorage.getItem('siliconflow_api_key') || '';
+    // 把一次增量变更（新建、更新或删除的任务）合并到已加载的任务中
+    // 变更来自增量同步请求或事件流，比当前同步游标旧的变更已经合并过，返回 false
+    function applyTaskChanges(changes) {
+        if (syncCursor !== null && Number(changes.sync_cursor) <= Number(syncCursor)) {
+            return false;
+        }
 
-            // 调用直接检查视频状态的API
-            const response = await fetch('/api/check_video_status', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({
-                    request_id: requestId,
-                    api_key: apiKey
-                })
+        stampEtaDeadlines(changes.tasks);
+        const deletedIds = new Set(changes.deleted);
+        const changedById = new Map(changes.tasks.map(task => [task.id, task]));
+        const oldest = loadedTasks[loadedTasks.length - 1];
+
+        loadedTasks = loadedTasks
+            .filter(task => !deletedIds.has(task.id))
+            .map(task => {
+                const changed = changedById.get(task.id);
+                changedById.delete(task.id);
+                return changed || task;
             });
-
-            if (!response.ok) {
-                const errorData = await response.json();
-                console.error(`直接检查视频状态失败:`, errorData);
-                return false;
+        // 未加载的任务只有在已加载的范围内时才插入，更早的任务留给“加载更多”
+        changedById.forEach(task => {
+            if (!olderTasksCursor || !oldest || !isOlderTask(task, oldest)) {
+                loadedTasks.push(task);
             }
+        });
+        loadedTasks.sort(compareTasks);
+        syncCursor = changes.sync_cursor;
 
-            const result = await response.json();
-            console.log(`直接检查视频状态结果:`, result);
+        console.log(`任务变更: ${changes.tasks.length} 个任务有变化，${changes.deleted.length} 个任务已删除`);
+        return true;
+    }
 
-            // 如果视频生成成功，更新任务状态
-            if (result.status === 'Succeed' && result.results && result.results.videos && result.results.videos.length > 0) {
-                const videoUrl = result.results.videos[0].url;
+    // 增量同步任务列表：只获取上次同步之后新建、更新或删除的任务
+    // 返回 { tasks, changed }，changed 为 false 时无需重新渲染
+    async function syncTasks() {
+        if (syncCursor === null) {
+            return { tasks: await fetchAllTasks(), changed: true };
+        }
 
-                if (videoUrl) {
-                    // 更新任务状态
-                    const updateResponse = await fetch(`/api/tasks/${taskId}/update_video`, {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/json'
-                        },
-                        body: JSON.stringify({
-                            video_url: videoUrl
-                        })
-                    });
+        const params = new URLSearchParams({ since: syncCursor, limit: TASK_PAGE_SIZE, fields: TASK_LIST_FIELDS });
+        const response = await fetch(`/api/tasks?${params}`, { cache: 'no-store' });
+        if (!response.ok) {
+            throw new Error(`同步任务列表失败 (${response.status})`);
+        }
 
-                    if (updateResponse.ok) {
-                        console.log(`任务 ${taskId} 的视频状态已更新`);
-                        return true;
-                    }
-                }
-            }
+        updateEtas(loadedTasks);
+        if (response.status === 204) {
+            return { tasks: loadedTasks, changed: false };
+        }
 
-            return false;
-        } catch (error) {
-            console.error(`直接检查视频状态时出错:`, error);
-            return false;
+        const changes = await response.json();
+        if (changes.reset) {
+            // 变化太多或游标已过期，重新加载第一页
+            console.log('增量同步游标已失效，重新加载任务列表');
+            loadedTasks = [];
+            return { tasks: await fetchAllTasks(), changed: true };
         }
+
+        const changed = applyTaskChanges(changes);
+        updateEtas(loadedTasks);
+        return { tasks: loadedTasks, changed };
     }
 
-    // 获取所有任务
-    async function fetchAllTasks() {
+    function updateLoadMoreButton() {
+        const loadMoreBtn = document.getElementById('loadMoreTasksBtn');
+        if (loadMoreBtn) {
+            loadMoreBtn.classList.toggle('d-none', !olderTasksCursor);
+        }
+    }
+
+    const loadMoreTasksBtn = document.getElementById('loadMoreTasksBtn');
+    if (loadMoreTasksBtn) {
+        loadMoreTasksBtn.addEventListener('click', function() {
+            loadMoreTasksBtn.disabled = true;
+            loadMoreTasks()
+                .catch(error => console.error('加载更多任务时出错:', error))
+                .finally(() => {
+                    loadMoreTasksBtn.disabled = false;
+                });
+        });
+    }
+
+    // 获取一页任务
+    async function fetchTaskPage(cursor) {
         try {
             console.log('开始获取任务列表...');
 
+            const params = new URLSearchParams({ limit: TASK_PAGE_SIZE, fields: TASK_LIST_FIELDS });
+            if (cursor) {
+                params.set('cursor', cursor);
+            }
+
             // 设置请求超时
             const controller = new AbortController();
             const timeoutId = setTimeout(() => controller.abort(), 10000); // 10秒超时
 
             try {
-                const response = await fetch('/api/tasks', {
+                const response = await fetch(`/api/tasks?${params}`, {
                     signal: controller.signal,
                     cache: 'no-store' // 禁用缓存，确保每次都获取最新数据
                 });
@@ -441,7 +524,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 }
 
                 const data = await response.json();
-                console.log(`成功获取任务列表，共 ${data.length} 条任务`);
+                console.log(`成功获取任务列表，本页 ${data.tasks.length} 条任务`);
                 return data;
             } catch (fetchError) {
                 // 清除超时定时器
@@ -477,12 +560,13 @@ document.addEventListener('DOMContentLoaded', function() {
         const rootTasks = [];
         const childTasks = {};
 
-        // 先分类任务
+        // 先分类任务；父任务还没有加载（在更早的页里）的任务作为根任务显示
+        const taskIds = new Set(tasks.map(task => task.id));
         tasks.forEach(task => {
             // 调试信息：打印每个任务的ID和父任务ID
             console.log(`任务ID: ${task.id}, 父任务ID: ${task.parent_task_id || '无'}, 状态: ${task.status}`);
 
-            if (!task.parent_task_id) {
+            if (!task.parent_task_id || !taskIds.has(task.parent_task_id)) {
                 rootTasks.push(task);
             } else {
                 if (!childTasks[task.parent_task_id]) {
@@ -526,6 +610,9 @@ document.addEventListener('DOMContentLoaded', function() {
                         ${isChild ? `<div style="margin-left: ${indentSize}px;">` : ''}
                         <span class="badge ${statusClass}">${statusText}</span>
                         <small class="d-block mt-1 text-muted text-truncate" style="max-width: 200px;">${task.message || ''}</small>
+                        ${task.eta !== null && task.eta !== undefined ?
+                            `<small class="d-block text-muted">预计剩余 ${formatEta(task.eta)}</small>` :
+                            ''}
                         ${isChild ? '</div>' : ''}
                     </td>
                     <td>${formatDate(task.created_at)}</td>
@@ -665,7 +752,7 @@ document.addEventListener('DOMContentLoaded', function() {
         const maxRetries = 3;
 
         function attemptLoad() {
-            refreshTasksWithVideoCheck().catch(error => {
+            refreshTasks().then(() => connectTaskEvents()).catch(error => {
                 console.error('Error loading tasks:', error);
                 retryCount++;
 
@@ -893,6 +980,14 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    // 格式化预计剩余时间
+    function formatEta(seconds) {
+        if (seconds < 60) {
+            return `${seconds} 秒`;
+        }
+        return `${Math.ceil(seconds / 60)} 分钟`;
+    }
+
     // 格式化日期的辅助函数
     function formatDate(dateString) {
         try {
@@ -1001,7 +1096,7 @@ document.addEventListener('DOMContentLoaded', function() {
             }
 
             // 刷新任务列表
-            refreshTasksWithVideoCheck();
+            refreshTasks();
 
         } catch (error) {
             console.error('删除任务时出错:', error);
@@ -1049,7 +1144,7 @@ document.addEventListener('DOMContentLoaded', function() {
             }
 
             // 刷新任务列表
-            refreshTasksWithVideoCheck();
+            refreshTasks();
 
         } catch (error) {
             console.error('再次生成任务时出错:', error);
@@ -1214,12 +1309,12 @@ document.addEventListener('DOMContentLoaded', function() {
 
                     // 立即刷新任务列表，以显示新创建的任务
                     console.log('刷新任务列表以显示新创建的任务...');
-                    await refreshTasksWithVideoCheck();
+                    await refreshTasks();
 
                     // 再次刷新任务列表，确保新任务显示
                     setTimeout(async () => {
                         console.log('再次刷新任务列表...');
-                        await refreshTasksWithVideoCheck();
+                        await refreshTasks();
                     }, 1000);
 
                 } catch (error) {
@@ -0,0 +1,42 @@
+"""
+In-process notification of task changes.
+
+The task rows themselves carry a revision number (see ``database.py``), so a
+listener only needs to learn *that* something changed; it then reads the
+changed rows with the same query as the delta sync of ``GET /api/tasks``.
+That keeps the notifier tiny and means a listener that misses a wake-up never
+misses a change.
+"""
+
+import threading
+
+
+class ChangeNotifier:
+    """Wake up every waiting listener whenever a change is committed."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._generation = 0
+
+    @property
+    def generation(self):
+        """Counter bumped by every ``notify``; pass it to ``wait``."""
+        with self._condition:
+            return self._generation
+
+    def notify(self):
+        """Signal that a change was committed."""
+        with self._condition:
+            self._generation += 1
+            self._condition.notify_all()
+
+    def wait(self, generation, timeout):
+        """
+        Block until ``notify`` is called after ``generation`` was read, or the timeout expires.
+
+        Returns:
+            int: The current generation; equal to ``generation`` on timeout
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._generation != generation, timeout)
+            return self._generation
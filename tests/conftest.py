@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+# 测试直接导入项目根目录下的模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import connect, create_schema
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Path of an empty application database with the full schema."""
+    path = str(tmp_path / 'test.sqlite')
+    db = connect(path)
+    create_schema(db)
+    db.close()
+    return path
+
+
+@pytest.fixture
+def db(db_path):
+    """Connection to the test database."""
+    conn = connect(db_path)
+    yield conn
+    conn.close()
+
+
+def insert_task(db, task_id, created_at, status='pending', image_path='a.jpg'):
+    """Insert a minimal task row and commit it."""
+    db.execute(
+        'INSERT INTO tasks (id, status, message, image_path, prompt, created_at, updated_at) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+        (task_id, status, '', image_path, 'prompt', created_at, created_at)
+    )
+    db.commit()
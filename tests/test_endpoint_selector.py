@@ -0,0 +1,119 @@
+import pytest
+import requests
+
+import video_generator
+from video_generator import EndpointSelector, EndpointUnsupportedError, PRIMARY_ENDPOINT, SUBMIT_ENDPOINTS
+
+KEY = ('https://api.example.com/v1', 'model')
+FALLBACK = next(name for name in SUBMIT_ENDPOINTS if name != PRIMARY_ENDPOINT)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(video_generator, 'time', fake)
+    return fake
+
+
+def http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.HTTPError(f'{status_code}', response=response)
+
+
+def test_unknown_key_probes_primary_first(clock):
+    selector = EndpointSelector()
+    assert selector.order(KEY) == ([PRIMARY_ENDPOINT, FALLBACK], True)
+
+
+def test_success_pins_the_endpoint(clock):
+    selector = EndpointSelector()
+    selector.success(KEY, PRIMARY_ENDPOINT)
+    assert selector.order(KEY) == ([PRIMARY_ENDPOINT, FALLBACK], False)
+
+
+def test_repeated_failures_switch_endpoint(clock):
+    selector = EndpointSelector(failure_threshold=3)
+    selector.success(KEY, PRIMARY_ENDPOINT)
+
+    selector.failure(KEY, PRIMARY_ENDPOINT, unsupported=False)
+    selector.failure(KEY, PRIMARY_ENDPOINT, unsupported=False)
+    assert selector.order(KEY)[0][0] == PRIMARY_ENDPOINT
+
+    selector.failure(KEY, PRIMARY_ENDPOINT, unsupported=False)
+    assert selector.order(KEY) == ([FALLBACK, PRIMARY_ENDPOINT], False)
+    assert selector.stats() == [{'base_url': KEY[0], 'model': KEY[1], 'endpoint': FALLBACK, 'failures': 0}]
+
+
+def test_success_resets_failure_count(clock):
+    selector = EndpointSelector(failure_threshold=2)
+    selector.success(KEY, PRIMARY_ENDPOINT)
+    selector.failure(KEY, PRIMARY_ENDPOINT, unsupported=False)
+    selector.success(KEY, PRIMARY_ENDPOINT)
+    selector.failure(KEY, PRIMARY_ENDPOINT, unsupported=False)
+    assert selector.order(KEY)[0][0] == PRIMARY_ENDPOINT
+
+
+def test_unsupported_endpoint_switches_at_once(clock):
+    selector = EndpointSelector(failure_threshold=3)
+    selector.failure(KEY, PRIMARY_ENDPOINT, unsupported=True)
+    assert selector.order(KEY)[0][0] == FALLBACK
+
+
+def test_fallback_reprobes_primary_once_per_interval(clock):
+    selector = EndpointSelector(reprobe_seconds=600)
+    selector.failure(KEY, PRIMARY_ENDPOINT, unsupported=True)
+
+    clock.now += 599
+    assert selector.order(KEY) == ([FALLBACK, PRIMARY_ENDPOINT], False)
+    clock.now += 1
+    assert selector.order(KEY) == ([PRIMARY_ENDPOINT, FALLBACK], True)
+    # 同一时间只有一个请求去探测
+    assert selector.order(KEY) == ([FALLBACK, PRIMARY_ENDPOINT], False)
+
+
+def test_failed_probe_keeps_fallback(clock):
+    selector = EndpointSelector(failure_threshold=1, reprobe_seconds=600)
+    selector.failure(KEY, PRIMARY_ENDPOINT, unsupported=True)
+    clock.now += 600
+    selector.order(KEY)
+
+    selector.failure(KEY, PRIMARY_ENDPOINT, unsupported=False)
+    assert selector.order(KEY)[0][0] == FALLBACK
+
+
+def test_successful_probe_switches_back(clock):
+    selector = EndpointSelector(reprobe_seconds=600)
+    selector.failure(KEY, PRIMARY_ENDPOINT, unsupported=True)
+    clock.now += 600
+    selector.order(KEY)
+
+    selector.success(KEY, PRIMARY_ENDPOINT)
+    assert selector.order(KEY) == ([PRIMARY_ENDPOINT, FALLBACK], False)
+
+
+@pytest.mark.parametrize('error, counts', [
+    (EndpointUnsupportedError('no request id'), True),
+    (http_error(500), True),
+    (http_error(503), True),
+    (requests.exceptions.ConnectionError('reset'), True),
+    (requests.exceptions.ReadTimeout('slow'), True),
+    (http_error(400), False),
+    (http_error(401), False),
+    (http_error(429), False),
+])
+def test_only_endpoint_failures_reach_the_breaker(monkeypatch, clock, error, counts):
+    selector = EndpointSelector(failure_threshold=1)
+    selector.success(KEY, PRIMARY_ENDPOINT)
+    monkeypatch.setattr(video_generator, 'endpoint_selector', selector)
+
+    video_generator._should_fall_back(KEY, PRIMARY_ENDPOINT, error, probing=True, has_next=True)
+    assert (selector.order(KEY)[0][0] == FALLBACK) == counts
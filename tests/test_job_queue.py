@@ -0,0 +1,158 @@
+import json
+import time
+
+import pytest
+
+from job_queue import JobStore, JOB_DONE, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, SECRETS_LOST_ERROR
+
+
+def job_row(store, job_id):
+    return store._connect().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+
+
+def test_claim_leases_due_jobs_once(db_path):
+    store = JobStore(db_path, owner='a')
+    job_id = store.enqueue('describe', (['t1'], 'a.jpg'))
+
+    assert store.claim(10) == [(job_id, 'describe', [['t1'], 'a.jpg'])]
+    row = job_row(store, job_id)
+    assert row['state'] == JOB_RUNNING
+    assert row['lease_owner'] == 'a'
+    assert row['attempts'] == 1
+
+    # 租约有效期内不会被再次领取
+    assert store.claim(10) == []
+    assert JobStore(db_path, owner='b').claim(10) == []
+
+
+def test_claim_respects_limit_stage_and_delay(db_path):
+    store = JobStore(db_path)
+    first = store.enqueue('describe', ('t1',))
+    store.enqueue('describe', ('t2',))
+    submit = store.enqueue('submit', ('t3',))
+    store.enqueue('submit', ('t4',), delay=60)
+
+    assert [job[0] for job in store.claim(1, stage='describe')] == [first]
+    assert [job[0] for job in store.claim(10, stage='submit')] == [submit]
+
+
+def test_expired_lease_is_claimed_by_another_owner(db_path):
+    crashed = JobStore(db_path, owner='crashed', lease_seconds=0.05)
+    job_id = crashed.enqueue('download', ('t1', 'http://x/v.mp4', {}))
+    crashed.claim(10)
+    time.sleep(0.1)
+
+    other = JobStore(db_path, owner='other')
+    assert [job[0] for job in other.claim(10)] == [job_id]
+    row = job_row(other, job_id)
+    assert row['lease_owner'] == 'other'
+    assert row['attempts'] == 2
+
+
+def test_renew_leases_keeps_jobs_leased(db_path):
+    store = JobStore(db_path, owner='a', lease_seconds=0.2)
+    store.enqueue('poll', ('req', 't1'))
+    store.claim(10)
+    time.sleep(0.1)
+    store.renew_leases()
+    time.sleep(0.15)
+    assert JobStore(db_path, owner='b').claim(10) == []
+
+
+def test_retry_requeues_after_delay(db_path):
+    store = JobStore(db_path)
+    job_id = store.enqueue('refine', ('t1',))
+    store.claim(10)
+
+    store.retry(job_id, 'timeout', 0.1)
+    row = job_row(store, job_id)
+    assert row['state'] == JOB_QUEUED
+    assert row['last_error'] == 'timeout'
+    assert row['lease_owner'] is None
+    assert store.claim(10) == []
+
+    time.sleep(0.15)
+    assert [job[0] for job in store.claim(10)] == [job_id]
+    assert store.attempts(job_id) == 2
+
+
+def test_complete_and_fail_finish_jobs(db_path):
+    store = JobStore(db_path)
+    done = store.enqueue('refine', ('t1',))
+    failed = store.enqueue('refine', ('t2',))
+    store.claim(10)
+
+    store.complete(done)
+    store.fail(failed, 'bad request')
+    assert job_row(store, done)['state'] == JOB_DONE
+    assert job_row(store, failed)['state'] == JOB_FAILED
+    assert job_row(store, failed)['last_error'] == 'bad request'
+    assert store.counts() == {}
+
+    store.purge(0)
+    assert job_row(store, done) is None
+
+
+def test_api_key_is_kept_out_of_payload(db_path):
+    store = JobStore(db_path)
+    params_list = [{'model': 'm', 'api_key': 'sk-1'}, {'model': 'm', 'api_key': 'sk-2'}]
+    job_id = store.enqueue('describe', (['t1', 't2'], 'a.jpg', params_list))
+
+    row = job_row(store, job_id)
+    assert 'sk-' not in row['payload']
+    assert json.loads(row['payload'])[2] == [{'model': 'm'}, {'model': 'm'}]
+    # 调用者的参数不会被修改
+    assert params_list[0]['api_key'] == 'sk-1'
+
+    [(_, _, args)] = store.claim(10)
+    assert args[2] == params_list
+
+
+def test_empty_api_key_is_not_a_secret(db_path):
+    store = JobStore(db_path)
+    job_id = store.enqueue('submit', ('t1', 'a.jpg', 'prompt', {'api_key': ''}))
+    assert job_row(store, job_id)['secrets'] is None
+    assert store.claim(10)[0][2][3] == {}
+
+
+def test_job_with_lost_api_key_fails(db_path):
+    store = JobStore(db_path)
+    job_id = store.enqueue('submit', ('t1', 'a.jpg', 'prompt', {'api_key': 'sk-1'}))
+
+    lost = []
+    restarted = JobStore(db_path, on_secrets_lost=lambda stage, args: lost.append((stage, args)))
+    assert restarted.claim(10) == []
+    assert job_row(restarted, job_id)['state'] == JOB_FAILED
+    assert job_row(restarted, job_id)['last_error'] == SECRETS_LOST_ERROR
+    assert lost == [('submit', ['t1', 'a.jpg', 'prompt', {}])]
+
+
+def test_encrypted_api_key_survives_restart(db_path):
+    fernet = pytest.importorskip('cryptography.fernet')
+    key = fernet.Fernet.generate_key().decode('ascii')
+
+    store = JobStore(db_path, secret_key=key)
+    job_id = store.enqueue('submit', ('t1', 'a.jpg', 'prompt', {'api_key': 'sk-1'}))
+    assert 'sk-1' not in job_row(store, job_id)['secrets']
+
+    restarted = JobStore(db_path, secret_key=key)
+    assert restarted.claim(10)[0][2][3] == {'api_key': 'sk-1'}
+    restarted.complete(job_id)
+    assert job_row(restarted, job_id)['secrets'] is None
+
+
+def test_scrub_secrets_moves_keys_out_of_old_payloads(db_path):
+    store = JobStore(db_path)
+    job_id = store.enqueue('submit', ('t1', 'a.jpg', 'prompt', {}))
+    store._connect().execute(
+        'UPDATE jobs SET payload = ? WHERE id = ?',
+        (json.dumps(['t1', 'a.jpg', 'prompt', {'api_key': 'sk-1'}]), job_id)
+    )
+
+    store.scrub_secrets()
+    row = job_row(store, job_id)
+    assert 'sk-1' not in row['payload']
+    # 没有配置密钥时无法保存，领取时任务会失败而不是使用默认的 API Key
+    assert row['secrets'] == ''
+    assert store.claim(10) == []
+    assert job_row(store, job_id)['state'] == JOB_FAILED
@@ -0,0 +1,131 @@
+import threading
+
+import pytest
+
+import rate_limiter
+from rate_limiter import RateLimiter, TokenBucket
+
+
+class FakeClock:
+    """Stands in for the ``time`` module of ``rate_limiter``; ``sleep`` advances the clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter, 'time', fake)
+    return fake
+
+
+def test_bucket_starts_full_and_refills_over_time(clock):
+    bucket = TokenBucket(60)
+    for _ in range(60):
+        assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == pytest.approx(1.0)
+
+    clock.now += 0.5
+    assert bucket.try_acquire() == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.try_acquire() == 0
+
+
+def test_bucket_never_exceeds_capacity(clock):
+    bucket = TokenBucket(10)
+    clock.now += 3600
+    assert bucket.try_acquire(10) == 0
+    assert bucket.try_acquire() > 0
+
+
+def test_request_larger_than_bucket_takes_the_whole_bucket(clock):
+    bucket = TokenBucket(100)
+    assert bucket.try_acquire(1000) == 0
+    assert bucket.tokens == 0
+
+
+def test_acquire_waits_for_tokens(clock):
+    bucket = TokenBucket(6)
+    bucket.try_acquire(6)
+    started = clock.now
+    bucket.acquire()
+    assert clock.now - started == pytest.approx(10.0)
+
+
+def test_pause_blocks_until_it_ends(clock):
+    bucket = TokenBucket(600)
+    bucket.pause(30)
+    assert bucket.try_acquire() == pytest.approx(30.0)
+    clock.now += 30
+    assert bucket.try_acquire() == 0
+
+
+def test_groups_are_separate_per_api_key_and_endpoint_class(clock):
+    limiter = RateLimiter({'chat': {'rpm': 1}, 'status': {'rpm': 1}})
+    with limiter.limit('chat', 'sk-1'):
+        pass
+
+    assert limiter._group('chat', 'sk-1').requests.try_acquire() > 0
+    assert limiter._group('chat', 'sk-2').requests.try_acquire() == 0
+    assert limiter._group('status', 'sk-1').requests.try_acquire() == 0
+    # API Key 不以明文保存
+    assert all('sk-1' not in key[1] for key in limiter._groups)
+
+
+def test_token_limit_counts_estimated_tokens(clock):
+    limiter = RateLimiter({'chat': {'tpm': 1000}})
+    with limiter.limit('chat', 'sk', tokens=800):
+        pass
+    assert limiter._group('chat', 'sk').tokens.try_acquire(800) == pytest.approx(36.0)
+
+
+def test_backoff_pauses_the_group(clock):
+    limiter = RateLimiter({'video_submit': {'rpm': 60}})
+    limiter.backoff('video_submit', 'sk', 5)
+    assert limiter._group('video_submit', 'sk').requests.try_acquire() == pytest.approx(5.0)
+    assert limiter._group('video_submit', 'other').requests.try_acquire() == 0
+
+
+def test_missing_limits_are_disabled(clock):
+    limiter = RateLimiter({})
+    for _ in range(1000):
+        with limiter.limit('chat', 'sk', tokens=10 ** 6):
+            pass
+
+
+def test_max_in_flight_caps_concurrent_requests():
+    limiter = RateLimiter({'video_submit': {'max_in_flight': 2}})
+    inside = threading.Semaphore(0)
+    leave = threading.Event()
+    peak = []
+    running = []
+    lock = threading.Lock()
+
+    def request():
+        with limiter.limit('video_submit', 'sk'):
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            inside.release()
+            leave.wait(5)
+            with lock:
+                running.pop()
+
+    threads = [threading.Thread(target=request) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    assert inside.acquire(timeout=5) and inside.acquire(timeout=5)
+    # 第三个请求要等前面的请求结束
+    assert not inside.acquire(timeout=0.2)
+
+    leave.set()
+    for thread in threads:
+        thread.join(5)
+    assert max(peak) == 2
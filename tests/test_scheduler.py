@@ -0,0 +1,123 @@
+import threading
+import time
+
+from job_queue import JobStore, JOB_DONE, JOB_FAILED
+from scheduler import TaskScheduler
+
+
+class RecordingStore:
+    """Just enough of ``JobStore`` for ``TaskScheduler._handle_failure``."""
+
+    def __init__(self, attempts):
+        self._attempts = attempts
+        self.retries = []
+        self.failures = []
+
+    def attempts(self, job_id):
+        return self._attempts
+
+    def retry(self, job_id, error, delay):
+        self.retries.append(delay)
+
+    def fail(self, job_id, error):
+        self.failures.append(error)
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_retry_delay_doubles_per_attempt():
+    delays = []
+    for attempts in (1, 2, 3):
+        store = RecordingStore(attempts)
+        scheduler = TaskScheduler(job_store=store, max_attempts=4, retry_delay=10)
+        scheduler.register_stage('refine', lambda: None)
+        scheduler._handle_failure(scheduler._stages['refine'], 'job', (), RuntimeError('timeout'))
+        delays += store.retries
+        assert store.failures == []
+    assert delays == [10, 20, 40]
+
+
+def test_last_attempt_fails_job_and_reports_it():
+    failed = []
+    store = RecordingStore(3)
+    scheduler = TaskScheduler(job_store=store, max_attempts=3, retry_delay=10,
+                              on_job_failed=lambda stage, args, error: failed.append((stage, args, str(error))))
+    scheduler.register_stage('refine', lambda *args: None)
+    scheduler._handle_failure(scheduler._stages['refine'], 'job', ('t1',), RuntimeError('timeout'))
+
+    assert store.retries == []
+    assert store.failures == ['timeout']
+    assert failed == [('refine', ('t1',), 'timeout')]
+
+
+def test_failing_job_is_retried_until_it_succeeds(db_path):
+    calls = []
+
+    def flaky(task_id):
+        calls.append(task_id)
+        if len(calls) < 3:
+            raise RuntimeError('temporarily unavailable')
+
+    failed = []
+    store = JobStore(db_path)
+    scheduler = TaskScheduler(job_store=store, max_attempts=3, retry_delay=0.05, dispatch_interval=0.02,
+                              on_job_failed=lambda *args: failed.append(args))
+    scheduler.register_stage('refine', flaky)
+    job_id = scheduler.submit('refine', 't1')
+
+    assert wait_until(lambda: store._connect().execute(
+        'SELECT state FROM jobs WHERE id = ?', (job_id,)).fetchone()['state'] == JOB_DONE)
+    assert calls == ['t1'] * 3
+    assert failed == []
+
+
+def test_job_gives_up_after_max_attempts(db_path):
+    failed = []
+    store = JobStore(db_path)
+    scheduler = TaskScheduler(job_store=store, max_attempts=2, retry_delay=0.05, dispatch_interval=0.02,
+                              on_job_failed=lambda stage, args, error: failed.append((stage, args)))
+
+    def broken(task_id):
+        raise RuntimeError('still down')
+
+    scheduler.register_stage('refine', broken)
+    job_id = scheduler.submit('refine', 't1')
+
+    assert wait_until(lambda: failed)
+    row = store._connect().execute('SELECT state, attempts, last_error FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    assert (row['state'], row['attempts'], row['last_error']) == (JOB_FAILED, 2, 'still down')
+    assert failed == [('refine', ['t1'])]
+
+
+def test_without_store_failures_are_reported_at_once():
+    failed = threading.Event()
+    scheduler = TaskScheduler(on_job_failed=lambda stage, args, error: failed.set())
+
+    def broken():
+        raise RuntimeError('boom')
+
+    scheduler.register_stage('merge', broken)
+    scheduler.submit('merge')
+    assert failed.wait(5)
+
+
+def test_detached_job_stays_leased_until_completed(db_path):
+    received = []
+    store = JobStore(db_path)
+    scheduler = TaskScheduler(job_store=store, dispatch_interval=0.02)
+    scheduler.register_stage('poll', lambda request_id, job_id=None: received.append(job_id), detached=True)
+    job_id = scheduler.submit('poll', 'req-1')
+
+    assert wait_until(lambda: received)
+    assert received == [job_id]
+    assert store.counts() == {'poll': {'running': 1}}
+
+    scheduler.complete_job(job_id)
+    assert store.counts() == {}
@@ -0,0 +1,144 @@
+import os
+import time
+
+import pytest
+
+from conftest import insert_task
+from database import prune_tombstones
+
+
+@pytest.fixture(scope='module')
+def app_module(tmp_path_factory):
+    """The application module, imported in a scratch directory (it creates its folders and database in the cwd)."""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('app'))
+    try:
+        import app
+    finally:
+        os.chdir(cwd)
+    return app
+
+
+@pytest.fixture
+def get_tasks(app_module, db_path):
+    """Call ``GET /api/tasks`` on a fresh database; returns ``(status code, JSON body)``."""
+    app_module.app.config['DATABASE'] = db_path
+
+    def get(query=''):
+        # 直接调用视图函数，不触发启动后台线程的 before_request
+        with app_module.app.test_request_context('/api/tasks' + query):
+            response = app_module.app.make_response(app_module.get_tasks())
+            return response.status_code, response.get_json(silent=True)
+
+    return get
+
+
+def ids(body):
+    return [task['id'] for task in body['tasks']]
+
+
+def test_pages_walk_all_tasks_newest_first(get_tasks, db):
+    # 两个任务创建时间相同，按ID区分先后
+    for task_id, created_at in [('a', '2026-01-01T00:00:00'), ('b', '2026-01-02T00:00:00'),
+                                ('c', '2026-01-02T00:00:00'), ('d', '2026-01-03T00:00:00'),
+                                ('e', '2026-01-04T00:00:00')]:
+        insert_task(db, task_id, created_at)
+
+    seen = []
+    query = '?limit=2&fields=id'
+    while True:
+        status, body = get_tasks(query)
+        assert status == 200
+        seen.append(ids(body))
+        if body['next_cursor'] is None:
+            break
+        query = f"?limit=2&fields=id&cursor={body['next_cursor']}"
+
+    assert seen == [['e', 'd'], ['c', 'b'], ['a']]
+
+
+def test_new_tasks_do_not_shift_later_pages(get_tasks, db):
+    for i in range(4):
+        insert_task(db, f't{i}', f'2026-01-0{i + 1}T00:00:00')
+
+    _, first = get_tasks('?limit=2&fields=id')
+    insert_task(db, 'new', '2026-02-01T00:00:00')
+    _, second = get_tasks(f"?limit=2&fields=id&cursor={first['next_cursor']}")
+    assert ids(first) + ids(second) == ['t3', 't2', 't1', 't0']
+
+
+def test_page_filters(get_tasks, db):
+    insert_task(db, 'a', '2026-01-01T00:00:00', status='completed')
+    insert_task(db, 'b', '2026-01-02T00:00:00', status='failed')
+    insert_task(db, 'c', '2026-01-03T00:00:00', status='completed')
+
+    assert ids(get_tasks('?fields=id&status=completed')[1]) == ['c', 'a']
+    assert ids(get_tasks('?fields=id&created_after=2026-01-01T12:00:00')[1]) == ['c', 'b']
+
+
+@pytest.mark.parametrize('query', ['?cursor=not-a-cursor', '?limit=0', '?fields=id,nope', '?since=abc'])
+def test_invalid_arguments_are_rejected(get_tasks, query):
+    assert get_tasks(query)[0] == 400
+
+
+def test_since_returns_changes_and_tombstones(get_tasks, db):
+    insert_task(db, 'kept', '2026-01-01T00:00:00')
+    insert_task(db, 'deleted', '2026-01-02T00:00:00')
+    _, page = get_tasks('?fields=id,status')
+    since = page['sync_cursor']
+    assert get_tasks(f'?since={since}') == (204, None)
+
+    db.execute("UPDATE tasks SET status = 'completed' WHERE id = 'kept'")
+    db.execute("DELETE FROM tasks WHERE id = 'deleted'")
+    insert_task(db, 'added', '2026-01-03T00:00:00')
+
+    status, changes = get_tasks(f'?since={since}&fields=id,status')
+    assert status == 200
+    assert changes['reset'] is False
+    assert changes['tasks'] == [{'id': 'kept', 'status': 'completed'}, {'id': 'added', 'status': 'pending'}]
+    assert changes['deleted'] == ['deleted']
+    assert int(changes['sync_cursor']) > int(since)
+    assert get_tasks(f"?since={changes['sync_cursor']}") == (204, None)
+
+
+def test_since_applies_filters(get_tasks, db):
+    insert_task(db, 'old', '2026-01-01T00:00:00')
+    insert_task(db, 'new', '2026-01-03T00:00:00')
+    since = get_tasks()[1]['sync_cursor']
+
+    db.execute("UPDATE tasks SET status = 'completed'")
+    db.commit()
+
+    # 状态不再匹配的任务离开了过滤后的列表
+    changes = get_tasks(f'?since={since}&fields=id&status=pending')[1]
+    assert changes['tasks'] == []
+    assert sorted(changes['deleted']) == ['new', 'old']
+
+    changes = get_tasks(f'?since={since}&fields=id&status=completed&created_after=2026-01-02')[1]
+    assert changes['tasks'] == [{'id': 'new'}]
+    assert changes['deleted'] == []
+
+
+def test_pruned_tombstones_force_a_reload(get_tasks, db):
+    insert_task(db, 'a', '2026-01-01T00:00:00')
+    since = get_tasks()[1]['sync_cursor']
+    db.execute("DELETE FROM tasks WHERE id = 'a'")
+    db.commit()
+
+    time.sleep(0.01)
+    prune_tombstones(db, 0)
+    changes = get_tasks(f'?since={since}')[1]
+    assert changes == {'tasks': [], 'deleted': [], 'sync_cursor': changes['sync_cursor'], 'reset': True}
+
+
+def test_too_many_changes_force_a_reload(get_tasks, db):
+    since = get_tasks()[1]['sync_cursor']
+    for i in range(3):
+        insert_task(db, f't{i}', f'2026-01-0{i + 1}T00:00:00')
+
+    assert get_tasks(f'?since={since}&limit=2')[1]['reset'] is True
+    assert len(get_tasks(f'?since={since}&limit=3')[1]['tasks']) == 3
+
+
+def test_cursor_from_the_future_forces_a_reload(get_tasks):
+    assert get_tasks('?since=999999')[1]['reset'] is True
@@ -0,0 +1,100 @@
+import io
+import os
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from conftest import insert_task
+from upload_store import UploadStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    folder = tmp_path / 'uploads'
+    folder.mkdir()
+    return UploadStore(str(folder))
+
+
+def upload(data, filename='photo.JPG'):
+    return FileStorage(stream=io.BytesIO(data), filename=filename)
+
+
+def refcount(db, filename):
+    row = db.execute('SELECT refcount FROM uploads WHERE filename = ?', (filename,)).fetchone()
+    return row['refcount'] if row else None
+
+
+def test_same_content_is_stored_once(store):
+    first = store.save(upload(b'image bytes'))
+    second = store.save(upload(b'image bytes', 'copy.jpg'))
+    other = store.save(upload(b'other bytes'))
+
+    assert first == second != other
+    assert first.endswith('.jpg')
+    assert sorted(os.listdir(store.folder)) == sorted([first, other])
+
+
+def test_task_triggers_count_references(store, db):
+    filename = store.save(upload(b'image bytes'))
+    insert_task(db, 't1', '2026-01-01T00:00:00', image_path=filename)
+    insert_task(db, 't2', '2026-01-01T00:00:01', image_path=filename)
+    store.release(filename, filename)
+    assert refcount(db, filename) == 2
+
+    db.execute("UPDATE tasks SET image_path = 'other.jpg' WHERE id = 't2'")
+    db.commit()
+    assert refcount(db, filename) == 1
+    assert refcount(db, 'other.jpg') == 1
+
+    db.execute("DELETE FROM tasks WHERE id = 't1'")
+    db.commit()
+    assert refcount(db, filename) == 0
+
+
+def test_file_is_kept_while_referenced(store, db):
+    filename = store.save(upload(b'image bytes'))
+    insert_task(db, 't1', '2026-01-01T00:00:00', image_path=filename)
+    insert_task(db, 't2', '2026-01-01T00:00:01', image_path=filename)
+    store.release(filename)
+
+    db.execute("DELETE FROM tasks WHERE id = 't1'")
+    db.commit()
+    assert store.remove_if_unused(db, filename) is False
+    assert os.path.exists(store.path(filename))
+
+    db.execute("DELETE FROM tasks WHERE id = 't2'")
+    db.commit()
+    assert store.remove_if_unused(db, filename) is True
+    assert not os.path.exists(store.path(filename))
+    assert refcount(db, filename) is None
+
+
+def test_pinned_file_is_not_removed(store, db):
+    # 另一个任务刚删除了同一张图片，而新任务还没有提交
+    filename = store.save(upload(b'image bytes'))
+    assert refcount(db, filename) is None
+    assert store.remove_if_unused(db, filename) is False
+    assert os.path.exists(store.path(filename))
+
+    store.release(filename)
+    assert store.remove_if_unused(db, filename) is True
+
+
+def test_pins_are_counted(store, db):
+    filename = store.save(upload(b'image bytes'))
+    store.save(upload(b'image bytes'))
+
+    store.release(filename)
+    assert store.remove_if_unused(db, filename) is False
+    store.release(filename)
+    assert store.remove_if_unused(db, filename) is True
+
+
+def test_failed_save_leaves_no_temporary_file(store):
+    class BrokenStream(io.BytesIO):
+        def read(self, size=-1):
+            raise OSError('connection reset')
+
+    with pytest.raises(OSError):
+        store.save(FileStorage(stream=BrokenStream(), filename='a.jpg'))
+    assert os.listdir(store.folder) == []
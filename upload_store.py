@@ -0,0 +1,129 @@
+"""
+Content-addressed storage of uploaded images.
+
+Uploads are saved as ``<sha256><ext>``, so the same bytes uploaded again map
+to the file that is already on disk and cost no extra space. The ``uploads``
+table counts how many tasks reference each file; triggers on the ``tasks``
+table keep it up to date, so deciding whether a file can be removed is a
+single primary key lookup.
+
+``save`` pins the file until the caller has committed the task that
+references it and calls ``release``; a pinned file is never removed, even if
+its refcount is still 0 because another task using the same image was just
+deleted.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 1024 * 1024
+
+# 删除文件前查询引用计数（benchmark_db.py 也测量这条语句）
+REFCOUNT_SQL = 'SELECT refcount FROM uploads WHERE filename = ?'
+
+
+class UploadStore:
+    """Save uploads by content hash and remove them when no task references them."""
+
+    def __init__(self, folder):
+        """
+        Args:
+            folder (str): Directory the uploads are stored in
+        """
+        self.folder = folder
+        # 保存和删除同一个文件不能交错进行
+        self._lock = threading.Lock()
+        # 已保存但引用它的任务还没有提交的文件 -> 次数
+        self._pinned = Counter()
+
+    def path(self, filename):
+        """Return the path of a stored upload."""
+        return os.path.join(self.folder, filename)
+
+    def save(self, file):
+        """
+        Save an uploaded file unless the same content is already stored.
+
+        The file stays pinned until ``release`` is called; call it once the task
+        that references the file is committed, or the task was not created.
+
+        Args:
+            file (werkzeug.datastructures.FileStorage): The uploaded file
+
+        Returns:
+            str: The stored filename
+        """
+        ext = os.path.splitext(file.filename)[1].lower()
+        temp_path = self.path(f".upload-{uuid.uuid4().hex}{ext}")
+
+        # 边写临时文件边计算哈希，只读取一遍上传内容
+        sha256 = hashlib.sha256()
+        try:
+            with open(temp_path, 'wb') as f:
+                while True:
+                    chunk = file.stream.read(_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    sha256.update(chunk)
+                    f.write(chunk)
+
+            filename = sha256.hexdigest() + ext
+            with self._lock:
+                if os.path.exists(self.path(filename)):
+                    os.remove(temp_path)
+                    logger.info(f"上传的图片已存在，复用: {filename}")
+                else:
+                    os.replace(temp_path, self.path(filename))
+                self._pinned[filename] += 1
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        return filename
+
+    def release(self, *filenames):
+        """Unpin files returned by ``save``."""
+        with self._lock:
+            for filename in filenames:
+                self._pinned[filename] -= 1
+                if self._pinned[filename] <= 0:
+                    del self._pinned[filename]
+
+    def remove_if_unused(self, db, filename):
+        """
+        Delete a stored upload if no task references it any more.
+
+        Call this after the change that dropped the last reference was committed.
+
+        Returns:
+            bool: True if the file was deleted
+        """
+        with self._lock:
+            if self._pinned[filename] > 0:
+                logger.info(f"图片 {filename} 正在被新任务使用，不删除")
+                return False
+
+            row = db.execute(REFCOUNT_SQL, (filename,)).fetchone()
+            if row is not None and row['refcount'] > 0:
+                logger.info(f"图片 {filename} 被其他 {row['refcount']} 个任务使用，不删除")
+                return False
+
+            db.execute('DELETE FROM uploads WHERE filename = ? AND refcount <= 0', (filename,))
+            db.commit()
+
+            file_path = self.path(filename)
+            try:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                    logger.info(f"已删除图片文件: {file_path}")
+                    return True
+            except OSError as e:
+                logger.error(f"删除图片文件时出错: {str(e)}")
+            return False
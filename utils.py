@@ -3,13 +3,20 @@ Utility functions for the SiliconFlow I2V application.
 """
 
 import os
+import asyncio
 import base64
+import hashlib
+import threading
 import requests
 import time
-from PIL import Image
+import mimetypes
+from PIL import Image, ImageOps
 import io
 import logging
-from config import OUTPUT_DIR
+from collections import OrderedDict
+import http_client
+from config import OUTPUT_DIR, HTTP_CONNECT_TIMEOUT, HTTP_MAX_RETRIES, HTTP_RETRY_BACKOFF, ENCODED_IMAGE_CACHE_MB
+from config import IMAGE_PREPROCESS_ENABLED, IMAGE_UPLOAD_MAX_KB, IMAGE_JPEG_QUALITY, IMAGE_MIN_JPEG_QUALITY, IMAGE_CROP_TO_VIDEO
 
 # Set up logging
 logging.basicConfig(
@@ -29,27 +36,310 @@ def encode_image_to_base64(image_path):
     with open(image_path, "rb") as image_file:
         return base64.b64encode(image_file.read()).decode('utf-8')
 
-def download_file(url, output_path):
-    """Download a file from a URL to the specified path."""
+class EncodedImage:
+    """
+    A prepared image that is sent to the API as a base64 data URI.
+
+    Only the (preprocessed) bytes are kept. The data URI is produced chunk by
+    chunk while the request body is streamed (see ``http_client.StreamingJsonBody``),
+    so the base64 text never exists as one large string.
+    """
+
+    # 3的倍数，保证分块的base64编码可以直接拼接
+    CHUNK_SIZE = 48 * 1024
+
+    def __init__(self, data, mime):
+        self.data = data
+        self.mime = mime
+        self._prefix = f"data:{mime};base64,".encode('ascii')
+
+    def __len__(self):
+        return len(self.data)
+
+    def stream_length(self):
+        """Length in bytes of the data URI."""
+        return len(self._prefix) + (len(self.data) + 2) // 3 * 4
+
+    def stream_chunks(self):
+        """Yield the data URI as ASCII bytes, encoding the image in chunks."""
+        yield self._prefix
+        view = memoryview(self.data)
+        for start in range(0, len(view), self.CHUNK_SIZE):
+            yield base64.b64encode(view[start:start + self.CHUNK_SIZE])
+
+    def data_uri(self):
+        """Return the whole data URI as a string."""
+        return b''.join(self.stream_chunks()).decode('ascii')
+
+class EncodedImageCache:
+    """
+    Size-bounded LRU cache of prepared images keyed by file content hash and settings.
+
+    A batch of N videos from one image then prepares the image once instead of
+    N + 1 times (VLM plus every submission). Files are recognised by path, size
+    and modification time first, so unchanged files are not even re-hashed.
+    """
+
+    def __init__(self, max_bytes):
+        """
+        Args:
+            max_bytes (int): Total size of the cached images before the least
+                recently used ones are evicted
+        """
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # {(digest, settings): EncodedImage}
+        self._digests = OrderedDict()  # {(path, size, mtime_ns): digest}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _digest(self, image_path):
+        """Return the SHA-256 of the file content, using the stat signature when possible."""
+        stat = os.stat(image_path)
+        signature = (os.path.abspath(image_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._digests.get(signature)
+            if digest is not None:
+                self._digests.move_to_end(signature)
+                return digest, None
+
+        with open(image_path, "rb") as image_file:
+            data = image_file.read()
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            self._digests[signature] = digest
+            while len(self._digests) > 10000:
+                self._digests.popitem(last=False)
+        return digest, data
+
+    def digest(self, image_path):
+        """Return the SHA-256 of the file content."""
+        return self._digest(image_path)[0]
+
+    def get(self, image_path, settings=(), encode=None):
+        """
+        Return the prepared image, preparing it on a cache miss.
+
+        Args:
+            image_path (str): Path to the image file
+            settings (tuple): Everything besides the file content that affects the result
+            encode (callable, optional): ``encode(data) -> (bytes, mime)`` that
+                transforms the raw file content; by default the file is used as
+                is with the MIME type guessed from its name
+
+        Returns:
+            EncodedImage: The prepared image
+        """
+        digest, data = self._digest(image_path)
+        key = (digest, settings)
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return image
+            self.misses += 1
+
+        if data is None:
+            with open(image_path, "rb") as image_file:
+                data = image_file.read()
+        if encode is not None:
+            data, mime = encode(data)
+        else:
+            mime = mimetypes.guess_type(image_path)[0] or 'image/jpeg'
+        image = EncodedImage(data, mime)
+
+        with self._lock:
+            if key not in self._entries and len(image) <= self.max_bytes:
+                self._entries[key] = image
+                self._bytes += len(image)
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= len(evicted)
+        return image
+
+    def stats(self):
+        """Return the number of entries, their size and the hit/miss counters."""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+# 进程内共享的图片编码缓存
+encoded_image_cache = EncodedImageCache(ENCODED_IMAGE_CACHE_MB * 1024 * 1024)
+
+def _fit_to_size(image, width, height, crop=False):
+    """
+    Shrink an image to fit within ``width`` x ``height``, keeping its aspect ratio.
+
+    With ``crop`` the image is first center-cropped to the aspect ratio of the
+    video, which can cut off the subject of photos with a different shape.
+    """
+    if not crop:
+        # 只缩小不放大，保留完整画面
+        if image.width > width or image.height > height:
+            image = image.copy()
+            image.thumbnail((width, height), Image.LANCZOS)
+        return image
+
+    src_width, src_height = image.size
+    target_ratio = width / height
+    src_ratio = src_width / src_height
+
+    # 裁剪到目标宽高比（居中），视频最终也会以该比例渲染
+    if abs(src_ratio - target_ratio) > 0.01:
+        if src_ratio > target_ratio:
+            new_width = round(src_height * target_ratio)
+            left = (src_width - new_width) // 2
+            image = image.crop((left, 0, left + new_width, src_height))
+        else:
+            new_height = round(src_width / target_ratio)
+            top = (src_height - new_height) // 2
+            image = image.crop((0, top, src_width, top + new_height))
+
+    # 只缩小不放大
+    if image.width > width or image.height > height:
+        image = image.resize((width, height), Image.LANCZOS)
+    return image
+
+# 无法解析的图片按文件头判断类型
+_IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+
+def _sniff_image_mime(data):
+    """Return the MIME type of image bytes from their signature, or None."""
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    for signature, mime in _IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return mime
+    return None
+
+def preprocess_image(data, image_size=None, max_side=None, max_bytes=None, quality=None, min_quality=None, crop=None):
+    """
+    Prepare image bytes for upload to the API.
+
+    Fixes the EXIF orientation, shrinks the image to fit within ``image_size``
+    (or limits its longest side to ``max_side``) and re-encodes it as JPEG
+    within ``max_bytes``. Images that need none of this are passed through
+    unchanged.
+
+    Args:
+        data (bytes): Raw image file content
+        image_size (str, optional): Target video size such as ``1280x720``
+        max_side (int, optional): Longest side allowed when there is no ``image_size``
+        max_bytes (int, optional): Size budget of the encoded image
+        quality (int, optional): First JPEG quality tried
+        min_quality (int, optional): Lowest JPEG quality before the image is shrunk further
+        crop (bool, optional): Center-crop to the aspect ratio of ``image_size``
+            (default ``IMAGE_CROP_TO_VIDEO``)
+
+    Returns:
+        tuple: ``(bytes, mime)``
+    """
+    max_bytes = max_bytes or IMAGE_UPLOAD_MAX_KB * 1024
+    crop = IMAGE_CROP_TO_VIDEO if crop is None else crop
+    quality = quality or IMAGE_JPEG_QUALITY
+    min_quality = min_quality or IMAGE_MIN_JPEG_QUALITY
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        source_format = image.format
+        original_size = image.size
+
+        # EXIF方向标记（0x0112）不为1时需要旋转
+        orientation = image.getexif().get(0x0112, 1)
+        image = ImageOps.exif_transpose(image)
+        if image_size:
+            width, height = (int(value) for value in image_size.split('x'))
+            image = _fit_to_size(image, width, height, crop=crop)
+        elif max_side and max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+        changed = orientation != 1 or image.size != original_size
+        mime = Image.MIME.get(source_format)
+        if not changed and mime in ('image/jpeg', 'image/png', 'image/webp') and len(data) <= max_bytes:
+            return data, mime
+
+        # 透明背景合成到白色上，统一转成JPEG
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        while True:
+            for q in range(quality, min_quality - 1, -10):
+                buffer = io.BytesIO()
+                image.save(buffer, format='JPEG', quality=q, optimize=True)
+                if buffer.tell() <= max_bytes:
+                    return buffer.getvalue(), 'image/jpeg'
+            # 最低质量仍然超出预算时继续缩小尺寸
+            if min(image.size) <= 256:
+                return buffer.getvalue(), 'image/jpeg'
+            image = image.resize((int(image.width * 0.75), int(image.height * 0.75)), Image.LANCZOS)
+
+    except Exception as e:
+        logger.warning(f"Could not preprocess image, uploading it unchanged: {e}")
+        return data, _sniff_image_mime(data) or 'image/jpeg'
+
+def file_sha256(path):
+    """Return the SHA-256 of a file's content (memoized by path, size and mtime)."""
+    return encoded_image_cache.digest(path)
+
+def prepare_image(image_path, image_size=None, max_side=None):
+    """
+    Return the preprocessed image for upload, from the shared cache when possible.
+
+    Args:
+        image_path (str): Path to the image file
+        image_size (str, optional): Target video size, see ``preprocess_image``
+        max_side (int, optional): Longest side allowed when there is no ``image_size``
+
+    Returns:
+        EncodedImage: The prepared image; put it in a request payload sent with
+            ``http_client.StreamingJsonBody`` to stream it as a data URI
+    """
+    if not IMAGE_PREPROCESS_ENABLED:
+        return encoded_image_cache.get(image_path)
+
+    settings = ('preprocess', image_size, max_side, IMAGE_UPLOAD_MAX_KB, IMAGE_JPEG_QUALITY, IMAGE_MIN_JPEG_QUALITY,
+                IMAGE_CROP_TO_VIDEO)
+    return encoded_image_cache.get(
+        image_path,
+        settings=settings,
+        encode=lambda data: preprocess_image(data, image_size=image_size, max_side=max_side)
+    )
+
+def encode_image_to_data_uri(image_path, image_size=None, max_side=None):
+    """Return the preprocessed image as a base64 data URI string."""
+    return prepare_image(image_path, image_size=image_size, max_side=max_side).data_uri()
+
+def download_file(url, output_path, raise_transient=False):
+    """
+    Download a file from a URL to the specified path.
+
+    Returns None on failure; with ``raise_transient`` transient errors
+    (timeouts, dropped connections, 429, 5xx) are raised instead.
+    """
     try:
         # 检查URL是否有效
         if not url or not url.startswith('http'):
             logger.error(f"Invalid URL: {url}")
             return None
 
-        # 设置请求超时时间和重试机制
-        session = requests.Session()
-        retry = requests.packages.urllib3.util.retry.Retry(
-            total=5,
-            backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504]
-        )
-        adapter = requests.adapters.HTTPAdapter(max_retries=retry)
-        session.mount('http://', adapter)
-        session.mount('https://', adapter)
-
-        # 使用session进行请求
-        response = session.get(url, stream=True, timeout=60)
+        # 使用共享的连接池会话下载，重试策略由http_client统一配置
+        response = http_client.get(url, stream=True, timeout=(HTTP_CONNECT_TIMEOUT, 60))
         response.raise_for_status()
 
         # 检查响应内容类型
@@ -63,7 +353,8 @@ def download_file(url, output_path):
             os.makedirs(output_dir)
 
         # 下载文件
-        with open(output_path, 'wb') as file:
+        # 用with关闭响应，连接会归还到连接池
+        with response, open(output_path, 'wb') as file:
             for chunk in response.iter_content(chunk_size=8192):
                 if chunk:  # 过滤掉keep-alive新块
                     file.write(chunk)
@@ -79,17 +370,68 @@ def download_file(url, output_path):
         return output_path
     except requests.exceptions.Timeout:
         logger.error(f"Timeout downloading file from: {url}")
+        if raise_transient:
+            raise
         return None
     except requests.exceptions.HTTPError as e:
         logger.error(f"HTTP error downloading file: {e}")
+        if raise_transient and http_client.is_transient_error(e):
+            raise
         return None
     except requests.exceptions.ConnectionError as e:
         logger.error(f"Connection error downloading file: {e}")
+        if raise_transient:
+            raise
         return None
     except Exception as e:
         logger.error(f"Error downloading file: {e}")
         return None
 
+async def download_file_async(url, output_path):
+    """Async version of ``download_file``."""
+    try:
+        # 检查URL是否有效
+        if not url or not url.startswith('http'):
+            logger.error(f"Invalid URL: {url}")
+            return None
+
+        # 确保输出目录存在
+        output_dir = os.path.dirname(output_path)
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+
+        # 与同步会话相同的重试策略：GET请求遇到429和5xx时退避重试
+        for attempt in range(HTTP_MAX_RETRIES + 1):
+            async with http_client.stream_async('GET', url, timeout=(HTTP_CONNECT_TIMEOUT, 60)) as response:
+                if response.status_code in (429, 500, 502, 503, 504) and attempt < HTTP_MAX_RETRIES:
+                    logger.warning(f"HTTP {response.status_code} downloading file, retrying: {url}")
+                    await asyncio.sleep(HTTP_RETRY_BACKOFF * (2 ** attempt))
+                    continue
+                response.raise_for_status()
+
+                # 检查响应内容类型
+                content_type = response.headers.get('Content-Type', '')
+                if not content_type.startswith('video/') and not content_type.startswith('application/octet-stream'):
+                    logger.warning(f"Unexpected content type: {content_type} for URL: {url}")
+
+                with open(output_path, 'wb') as file:
+                    async for chunk in response.aiter_bytes(chunk_size=65536):
+                        file.write(chunk)
+                break
+
+        # 检查文件大小
+        file_size = os.path.getsize(output_path)
+        if file_size == 0:
+            logger.error(f"Downloaded file is empty: {output_path}")
+            os.remove(output_path)  # 删除空文件
+            return None
+
+        logger.info(f"Successfully downloaded file ({file_size} bytes) to: {output_path}")
+        return output_path
+    except Exception as e:
+        logger.error(f"Error downloading file: {e}")
+        return None
+
 def extract_last_frame(video_path, output_path):
     """Extract the last frame from a video file."""
     try:
@@ -2,20 +2,232 @@
 Functions for video generation and retrieval.
 """
 
-import requests
+import asyncio
 import json
 import logging
 import os
-import base64
+import threading
+import time
+import uuid
+
+import requests
+
+import http_client
 from config import API_BASE_URL, I2V_MODEL, DEFAULT_VIDEO_SIZE, DEFAULT_NEGATIVE_PROMPT, OUTPUT_DIR
-from utils import download_file, generate_timestamp
+from config import VIDEO_POLL_INTERVAL, VIDEO_POLL_TIMEOUT, VIDEO_ENDPOINT_FAILURE_THRESHOLD, VIDEO_ENDPOINT_REPROBE_SECONDS
+from utils import download_file, download_file_async, generate_timestamp, prepare_image
+from http_client import StreamingJsonBody
+from rate_limiter import throttled_post, throttled_post_async
 
 logger = logging.getLogger(__name__)
 
-def generate_video(image_path, prompt, model=I2V_MODEL, negative_prompt=DEFAULT_NEGATIVE_PROMPT, image_size=DEFAULT_VIDEO_SIZE, seed=None, api_key=None):
+def _auth_headers(api_key=None):
+    """Return the API key to use and the request headers."""
+    if not api_key:
+        from config import API_KEY
+        api_key = API_KEY
+
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    return api_key, headers
+
+def _encode_reference_image(image_path, image_size=None):
+    """
+    Return the preprocessed reference image, or pass a URL through.
+
+    The image is base64-encoded into the request body while it is sent.
+    """
+    if image_path.startswith(('http://', 'https://')):
+        return image_path
+    return prepare_image(image_path, image_size=image_size)
+
+def _video_payload(legacy, model, prompt, negative_prompt, image_size, seed, image):
+    """
+    Build the submission payload for the new (``/videos``) or the old (``/video/submit``) API.
+    """
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "negative_prompt": negative_prompt
+    }
+    if legacy:
+        # 旧版API使用image_size而不是分开的width和height
+        payload["image_size"] = image_size
+    else:
+        # 根据SiliconFlow文档准备请求载荷
+        # 参考: https://docs.siliconflow.cn/cn/api-reference/videos/post_videos
+        width, height = image_size.split('x')
+        payload["width"] = int(width)
+        payload["height"] = int(height)
+    payload["image"] = image
+
+    # Add seed if provided
+    if seed is not None:
+        payload["seed"] = int(seed)
+
+    return payload
+
+class EndpointUnsupportedError(Exception):
+    """Raised when a submit endpoint does not exist or does not understand the request."""
+
+# 两种视频提交接口：(路径, 返回的请求ID字段, 是否使用旧版载荷)
+SUBMIT_ENDPOINTS = {
+    'videos': ('/videos', 'request_id', False),
+    'video_submit': ('/video/submit', 'requestId', True)
+}
+PRIMARY_ENDPOINT = 'videos'
+
+class EndpointSelector:
+    """
+    Remember which submit endpoint works per (base URL, model).
+
+    Each submission goes to the remembered endpoint only. Submissions fall back
+    to the other endpoint in the same call only when the endpoint reports that
+    it is unsupported (404/405/410/501 or no request ID), or while probing and
+    the endpoint failed with a 5xx or connection error. Repeated failures open
+    the circuit and switch endpoints; other 4xx errors are not endpoint failures. While the
+    fallback endpoint is in use, the preferred one is re-probed once every
+    ``reprobe_seconds``.
+    """
+
+    def __init__(self, failure_threshold=3, reprobe_seconds=600):
+        self.failure_threshold = failure_threshold
+        self.reprobe_seconds = reprobe_seconds
+        # {(base_url, model): {'endpoint': ..., 'failures': ..., 'switched_at': ...}}
+        self._state = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _other(endpoint):
+        return next(name for name in SUBMIT_ENDPOINTS if name != endpoint)
+
+    def order(self, key):
+        """
+        Return ``(endpoints, probing)``: the endpoints to try in order, and whether
+        the call may fall back to the second one on any endpoint failure.
+        """
+        now = time.time()
+        with self._lock:
+            state = self._state.get(key)
+            if state is None:
+                # 还不知道哪个接口可用：按原来的方式先新后旧
+                return [PRIMARY_ENDPOINT, self._other(PRIMARY_ENDPOINT)], True
+
+            endpoint = state['endpoint']
+            if endpoint != PRIMARY_ENDPOINT and now - state['switched_at'] >= self.reprobe_seconds:
+                # 定期重新探测首选接口，同一时间只有一个请求去探测
+                state['switched_at'] = now
+                return [PRIMARY_ENDPOINT, endpoint], True
+
+            return [endpoint, self._other(endpoint)], False
+
+    def success(self, key, endpoint):
+        with self._lock:
+            state = self._state.get(key)
+            if state is None or state['endpoint'] != endpoint:
+                if state is not None:
+                    logger.info(f"Video submit endpoint for {key[1]} switched to {endpoint}")
+                self._state[key] = {'endpoint': endpoint, 'failures': 0, 'switched_at': time.time()}
+            else:
+                state['failures'] = 0
+
+    def failure(self, key, endpoint, unsupported):
+        with self._lock:
+            state = self._state.setdefault(key, {'endpoint': endpoint, 'failures': 0, 'switched_at': time.time()})
+            if state['endpoint'] != endpoint:
+                # 探测失败，继续使用当前接口
+                return
+
+            state['failures'] += 1
+            if unsupported or state['failures'] >= self.failure_threshold:
+                other = self._other(endpoint)
+                logger.warning(f"Video submit endpoint {endpoint} failing for {key[1]}, switching to {other}")
+                self._state[key] = {'endpoint': other, 'failures': 0, 'switched_at': time.time()}
+
+    def stats(self):
+        """Return the endpoint in use and its consecutive failures per (base URL, model)."""
+        with self._lock:
+            return [
+                {'base_url': key[0], 'model': key[1], 'endpoint': state['endpoint'], 'failures': state['failures']}
+                for key, state in self._state.items()
+            ]
+
+# 进程内共享的接口选择器
+endpoint_selector = EndpointSelector(
+    failure_threshold=VIDEO_ENDPOINT_FAILURE_THRESHOLD,
+    reprobe_seconds=VIDEO_ENDPOINT_REPROBE_SECONDS
+)
+
+def _prepare_submission(endpoint, model, prompt, negative_prompt, image_size, seed, image):
+    """Return the URL and payload for submitting to ``endpoint``."""
+    path, _, legacy = SUBMIT_ENDPOINTS[endpoint]
+    payload = _video_payload(legacy, model, prompt, negative_prompt, image_size, seed, image)
+
+    # 记录请求载荷以便调试
+    logger.info(f"{endpoint} API request payload: {json.dumps({k: v for k, v in payload.items() if k != 'image'}, ensure_ascii=False)}")
+    return f"{API_BASE_URL}{path}", payload
+
+def _read_request_id(endpoint, response):
+    """Return the request ID of a submit response or raise if the submission failed."""
+    path, id_field, _ = SUBMIT_ENDPOINTS[endpoint]
+    if response.status_code in (404, 405, 410, 501):
+        raise EndpointUnsupportedError(f"{path} returned HTTP {response.status_code}")
+
+    # Check if the request was successful
+    response.raise_for_status()
+
+    # Parse the response
+    result = response.json()
+
+    # 记录完整的响应以便调试
+    logger.info(f"{endpoint} API response: {json.dumps(result, ensure_ascii=False)}")
+
+    # 新版API使用request_id，旧版API使用requestId
+    request_id = result.get(id_field)
+    if not request_id:
+        raise EndpointUnsupportedError(f"No {id_field} in response of {path}")
+    return request_id
+
+def _is_endpoint_failure(error):
+    """
+    Return whether a failed submission says something about the endpoint.
+
+    Only an unsupported endpoint, a 5xx response or a connection error or
+    timeout counts. Other 4xx responses (bad API key, rejected prompt, rate
+    limit) would fail on either endpoint, so they neither count toward the
+    circuit breaker nor make the submission fall back and be sent twice.
+    """
+    if isinstance(error, EndpointUnsupportedError):
+        return True
+    response = getattr(error, 'response', None)
+    if response is not None:
+        return response.status_code >= 500
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    return http_client.httpx is not None and isinstance(error, http_client.httpx.TransportError)
+
+def _should_fall_back(key, endpoint, error, probing, has_next):
+    """Record a failed submission and decide whether to try the next endpoint."""
+    if not _is_endpoint_failure(error):
+        return False
+    unsupported = isinstance(error, EndpointUnsupportedError)
+    endpoint_selector.failure(key, endpoint, unsupported)
+    if has_next and (unsupported or probing):
+        logger.warning(f"Video submit endpoint {endpoint} failed: {error}, trying the other endpoint...")
+        return True
+    return False
+
+def generate_video(image_path, prompt, model=I2V_MODEL, negative_prompt=DEFAULT_NEGATIVE_PROMPT, image_size=DEFAULT_VIDEO_SIZE, seed=None, api_key=None,
+                   raise_transient=False):
     """
     Generate a video using the I2V model.
 
+    The submission goes to the endpoint that is known to work for the current
+    base URL and model (see ``EndpointSelector``), so usually only one request
+    is sent.
+
     Args:
         image_path (str): Path to the reference image
         prompt (str): Text prompt for video generation
@@ -23,150 +235,145 @@ def generate_video(image_path, prompt, model=I2V_MODEL, negative_prompt=DEFAULT_
         negative_prompt (str, optional): Negative prompt
         image_size (str, optional): Size of the video
         seed (int, optional): Random seed for generation
+        raise_transient (bool, optional): Raise transient errors instead of
+            returning None, so the caller can submit again later. Only errors
+            where the submission cannot have been accepted count, so a retry
+            never pays for the same video twice.
 
     Returns:
         str: Request ID for the video generation task
     """
     try:
         # Prepare the API request
-        if not api_key:
-            from config import API_KEY
-            api_key = API_KEY
-
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
+        api_key, headers = _auth_headers(api_key)
 
         # Encode the image to base64 or use URL
-        if image_path.startswith(('http://', 'https://')):
-            image = image_path
-        else:
-            with open(image_path, "rb") as image_file:
-                image_data = base64.b64encode(image_file.read()).decode('utf-8')
-                image = f"data:image/jpeg;base64,{image_data}"
-
-        # 解析图像尺寸
-        width, height = image_size.split('x')
-
-        # 尝试新版API
-        try:
-            # 根据SiliconFlow文档准备请求载荷
-            # 参考: https://docs.siliconflow.cn/cn/api-reference/videos/post_videos
-            payload = {
-                "model": model,
-                "prompt": prompt,
-                "negative_prompt": negative_prompt,
-                "width": int(width),
-                "height": int(height),
-                "image": image
-            }
-
-            # Add seed if provided
-            if seed is not None:
-                payload["seed"] = int(seed)
-
-            # 记录请求载荷以便调试
-            logger.info(f"New API request payload: {json.dumps({k: v for k, v in payload.items() if k != 'image'}, ensure_ascii=False)}")
+        image = _encode_reference_image(image_path, image_size)
+
+        key = (API_BASE_URL, model)
+        endpoints, probing = endpoint_selector.order(key)
+        for i, endpoint in enumerate(endpoints):
+            api_url, payload = _prepare_submission(endpoint, model, prompt, negative_prompt, image_size, seed, image)
+            logger.info(f"Submitting video generation to: {api_url}")
+            try:
+                body = StreamingJsonBody(payload)
+                response = throttled_post(
+                    'video_submit',
+                    api_key,
+                    api_url,
+                    headers=body.headers(headers),
+                    data=body
+                )
+                request_id = _read_request_id(endpoint, response)
+            except Exception as e:
+                if _should_fall_back(key, endpoint, e, probing, i + 1 < len(endpoints)):
+                    continue
+                raise
+
+            endpoint_selector.success(key, endpoint)
+            logger.info(f"Successfully submitted video generation task with request ID: {request_id}")
+            return request_id
 
-            # Make the API request
-            api_url = f"{API_BASE_URL}/videos"
-            logger.info(f"Trying new API URL: {api_url}")
-
-            response = requests.post(
-                api_url,
-                headers=headers,
-                json=payload
-            )
-
-            # Check if the request was successful
-            response.raise_for_status()
-
-            # Parse the response
-            result = response.json()
-
-            # 记录完整的响应以便调试
-            logger.info(f"New API response: {json.dumps(result, ensure_ascii=False)}")
-
-            # 根据文档提取请求ID
-            request_id = result.get("request_id")
-
-        except Exception as e:
-            logger.warning(f"New API failed: {e}, trying old API...")
-
-            # 尝试旧版API
-            # 准备请求载荷
-            payload = {
-                "model": model,
-                "prompt": prompt,
-                "negative_prompt": negative_prompt,
-                "image_size": image_size,  # 旧版API使用image_size而不是分开的width和height
-                "image": image
-            }
-
-            # Add seed if provided
-            if seed is not None:
-                payload["seed"] = int(seed)
-
-            # 记录请求载荷以便调试
-            logger.info(f"Old API request payload: {json.dumps({k: v for k, v in payload.items() if k != 'image'}, ensure_ascii=False)}")
-
-            # Make the API request
-            api_url = f"{API_BASE_URL}/video/submit"
-            logger.info(f"Trying old API URL: {api_url}")
-
-            response = requests.post(
-                api_url,
-                headers=headers,
-                json=payload
-            )
-
-            # Check if the request was successful
-            response.raise_for_status()
-
-            # Parse the response
-            result = response.json()
-
-            # 记录完整的响应以便调试
-            logger.info(f"Old API response: {json.dumps(result, ensure_ascii=False)}")
-
-            # 旧版API使用requestId而不是request_id
-            request_id = result.get("requestId")
+    except Exception as e:
+        logger.error(f"Error generating video: {e}")
+        if raise_transient and http_client.is_transient_error(e, idempotent=False):
+            raise
+        return None
 
-        if not request_id:
-            logger.error("No request ID returned from API")
-            return None
+async def generate_video_async(image_path, prompt, model=I2V_MODEL, negative_prompt=DEFAULT_NEGATIVE_PROMPT, image_size=DEFAULT_VIDEO_SIZE, seed=None, api_key=None):
+    """
+    Async version of ``generate_video``.
 
-        logger.info(f"Successfully submitted video generation task with request ID: {request_id}")
-        return request_id
+    Returns:
+        str: Request ID for the video generation task
+    """
+    try:
+        api_key, headers = _auth_headers(api_key)
+        # 读取和编码图片放到线程中，避免阻塞事件循环
+        image = await asyncio.to_thread(_encode_reference_image, image_path, image_size)
+
+        key = (API_BASE_URL, model)
+        endpoints, probing = endpoint_selector.order(key)
+        for i, endpoint in enumerate(endpoints):
+            api_url, payload = _prepare_submission(endpoint, model, prompt, negative_prompt, image_size, seed, image)
+            try:
+                body = StreamingJsonBody(payload)
+                response = await throttled_post_async('video_submit', api_key, api_url, headers=body.headers(headers), content=body)
+                request_id = _read_request_id(endpoint, response)
+            except Exception as e:
+                if _should_fall_back(key, endpoint, e, probing, i + 1 < len(endpoints)):
+                    continue
+                raise
+
+            endpoint_selector.success(key, endpoint)
+            logger.info(f"Successfully submitted video generation task with request ID: {request_id}")
+            return request_id
 
     except Exception as e:
         logger.error(f"Error generating video: {e}")
         return None
 
-def get_video_status(request_id, api_key=None):
+def _parse_video_status(request_id, result):
+    """Turn a status API response into the state dict of ``query_video_status``."""
+    # 记录完整的响应内容（仅在调试级别）
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"API response: {json.dumps(result, ensure_ascii=False)}")
+
+    # 检查状态
+    status = result.get("status")
+
+    # 根据状态处理结果
+    if status == "Succeed":
+        # 视频生成成功，获取URL
+        if "results" in result and result["results"] and "videos" in result["results"]:
+            videos = result["results"]["videos"]
+            if videos and len(videos) > 0 and "url" in videos[0]:
+                video_url = videos[0]["url"]
+                seed = result["results"].get("seed")
+                logger.info(f"Video generation completed successfully for request_id: {request_id}")
+                return {
+                    "status": "succeeded",
+                    "url": video_url,
+                    "seed": seed
+                }
+
+        logger.error(f"Status is Succeed but no video URL found for request_id: {request_id}")
+        return {"status": "failed", "reason": "No video URL in response"}
+
+    elif status in ["Failed", "failed"]:
+        # 视频生成失败
+        reason = result.get("reason", "Unknown reason")
+        logger.error(f"Video generation failed for request_id: {request_id}, reason: {reason}")
+        return {"status": "failed", "reason": reason}
+
+    elif status in ["InQueue", "InProgress"]:
+        # 视频仍在生成中
+        logger.info(f"Video generation in progress for request_id: {request_id}, status: {status}")
+        return {"status": "pending"}
+
+    else:
+        # 未知状态
+        logger.warning(f"Unknown status for request_id: {request_id}, status: {status}")
+        return {"status": "pending"}
+
+def query_video_status(request_id, api_key=None):
     """
-    Check the status of a video generation task and retrieve the video URL when ready.
+    Query the raw state of a video generation task.
 
     Args:
         request_id (str): Request ID for the video generation task
 
     Returns:
-        dict: Video information including URL, or None if not ready or failed
+        dict: ``{"status": "succeeded" | "failed" | "pending", ...}`` with ``url`` and
+            ``seed`` on success or ``reason`` on failure, or None if the status
+            could not be retrieved
     """
     try:
         # 根据SiliconFlow文档，使用POST请求获取视频状态
         # 参考: https://docs.siliconflow.cn/cn/api-reference/videos/get_videos_status
 
         # 准备API请求
-        if not api_key:
-            from config import API_KEY
-            api_key = API_KEY
-
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
+        api_key, headers = _auth_headers(api_key)
 
         # 准备请求载荷
         payload = {
@@ -177,7 +384,9 @@ def get_video_status(request_id, api_key=None):
         api_url = f"{API_BASE_URL}/video/status"
         logger.info(f"Checking video status for request_id: {request_id}")
 
-        response = requests.post(
+        response = throttled_post(
+            'status',
+            api_key,
             api_url,
             headers=headers,
             json=payload
@@ -187,72 +396,163 @@ def get_video_status(request_id, api_key=None):
         response.raise_for_status()
 
         # 解析响应
-        result = response.json()
-
-        # 记录完整的响应内容（仅在调试级别）
-        if logger.isEnabledFor(logging.DEBUG):
-            logger.debug(f"API response: {json.dumps(result, ensure_ascii=False)}")
-
-        # 检查状态
-        status = result.get("status")
-
-        # 根据状态处理结果
-        if status == "Succeed":
-            # 视频生成成功，获取URL
-            if "results" in result and result["results"] and "videos" in result["results"]:
-                videos = result["results"]["videos"]
-                if videos and len(videos) > 0 and "url" in videos[0]:
-                    video_url = videos[0]["url"]
-                    seed = result["results"].get("seed")
-                    logger.info(f"Video generation completed successfully for request_id: {request_id}")
-                    return {
-                        "url": video_url,
-                        "seed": seed
-                    }
-
-            logger.error(f"Status is Succeed but no video URL found for request_id: {request_id}")
-            return None
+        return _parse_video_status(request_id, response.json())
 
-        elif status in ["Failed", "failed"]:
-            # 视频生成失败
-            reason = result.get("reason", "Unknown reason")
-            logger.error(f"Video generation failed for request_id: {request_id}, reason: {reason}")
-            return None
+    except Exception as e:
+        logger.error(f"Error checking video status for request_id: {request_id}, error: {e}")
+        return None
 
-        elif status in ["InQueue", "InProgress"]:
-            # 视频仍在生成中
-            logger.info(f"Video generation in progress for request_id: {request_id}, status: {status}")
-            return None
+async def query_video_status_async(request_id, api_key=None):
+    """
+    Async version of ``query_video_status``.
 
-        else:
-            # 未知状态
-            logger.warning(f"Unknown status for request_id: {request_id}, status: {status}")
-            return None
+    Returns:
+        dict: The state dict described in ``query_video_status``, or None on error
+    """
+    try:
+        api_key, headers = _auth_headers(api_key)
+        logger.info(f"Checking video status for request_id: {request_id}")
+
+        response = await throttled_post_async(
+            'status',
+            api_key,
+            f"{API_BASE_URL}/video/status",
+            headers=headers,
+            json={"requestId": request_id}
+        )
+        response.raise_for_status()
+
+        return _parse_video_status(request_id, response.json())
 
     except Exception as e:
         logger.error(f"Error checking video status for request_id: {request_id}, error: {e}")
         return None
 
-def download_video(video_url, output_dir=OUTPUT_DIR):
+def get_video_status(request_id, api_key=None):
+    """
+    Check the status of a video generation task and retrieve the video URL when ready.
+
+    Args:
+        request_id (str): Request ID for the video generation task
+
+    Returns:
+        dict: Video information including URL, or None if not ready or failed
+    """
+    state = query_video_status(request_id, api_key=api_key)
+    if state and state["status"] == "succeeded":
+        return {
+            "url": state["url"],
+            "seed": state["seed"]
+        }
+    return None
+
+async def get_video_status_async(request_id, api_key=None):
+    """
+    Async version of ``get_video_status``.
+
+    Returns:
+        dict: Video information including URL, or None if not ready or failed
+    """
+    state = await query_video_status_async(request_id, api_key=api_key)
+    if state and state["status"] == "succeeded":
+        return {
+            "url": state["url"],
+            "seed": state["seed"]
+        }
+    return None
+
+async def wait_for_video_async(request_id, api_key=None, interval=VIDEO_POLL_INTERVAL, timeout=VIDEO_POLL_TIMEOUT):
+    """
+    Poll a video generation task until it finishes.
+
+    Args:
+        request_id (str): Request ID for the video generation task
+        interval (float, optional): Seconds between two status checks
+        timeout (float, optional): Seconds after which the task is given up
+
+    Returns:
+        dict: Video information including URL, or None if it failed or timed out
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        state = await query_video_status_async(request_id, api_key=api_key)
+        if state and state["status"] == "succeeded":
+            return {
+                "url": state["url"],
+                "seed": state["seed"]
+            }
+        if state and state["status"] == "failed":
+            return None
+        if loop.time() + interval > deadline:
+            logger.error(f"Timed out waiting for video of request_id: {request_id}")
+            return None
+        await asyncio.sleep(interval)
+
+def _video_paths(output_dir):
+    """
+    Return a unique output path for a downloaded video and the temporary path to download it to.
+
+    Several downloads can finish within the same second, so the timestamp
+    alone is not unique.
+    """
+    name = f"video_{generate_timestamp()}_{uuid.uuid4().hex[:12]}"
+    return os.path.join(output_dir, f"{name}.mp4"), os.path.join(output_dir, f".download-{name}.mp4")
+
+def _finish_download(temp_path, output_path):
+    """Move a completed download into place; return its final path, or None if it failed."""
+    if not temp_path:
+        return None
+    os.replace(temp_path, output_path)
+    return output_path
+
+def _discard_download(temp_path):
+    """Remove a partial download."""
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+def download_video(video_url, output_dir=OUTPUT_DIR, raise_transient=False):
     """
     Download a video from the given URL.
 
+    The video is written to a temporary file and moved into place once it is
+    complete, so a failed download never leaves a partial video behind.
+
     Args:
         video_url (str): URL of the video
         output_dir (str, optional): Directory to save the video
+        raise_transient (bool, optional): Raise transient errors (timeouts,
+            dropped connections, 429, 5xx) instead of returning None
 
     Returns:
         str: Path to the downloaded video
     """
+    output_path, temp_path = _video_paths(output_dir)
     try:
-        # Generate a filename with timestamp
-        timestamp = generate_timestamp()
-        filename = f"video_{timestamp}.mp4"
-        output_path = os.path.join(output_dir, filename)
+        return _finish_download(download_file(video_url, temp_path, raise_transient=raise_transient), output_path)
+
+    except Exception as e:
+        logger.error(f"Error downloading video: {e}")
+        if raise_transient and http_client.is_transient_error(e):
+            raise
+        return None
+    finally:
+        _discard_download(temp_path)
+
+
+async def download_video_async(video_url, output_dir=OUTPUT_DIR):
+    """
+    Async version of ``download_video``.
 
-        # Download the video
-        return download_file(video_url, output_path)
+    Returns:
+        str: Path to the downloaded video
+    """
+    output_path, temp_path = _video_paths(output_dir)
+    try:
+        return _finish_download(await download_file_async(video_url, temp_path), output_path)
 
     except Exception as e:
         logger.error(f"Error downloading video: {e}")
         return None
+    finally:
+        _discard_download(temp_path)
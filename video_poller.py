@@ -0,0 +1,289 @@
+"""
+Shared status poller for in-flight SiliconFlow video generations.
+
+Instead of every task sleeping in its own polling loop, one poller thread owns
+the set of outstanding request IDs, checks them on a shared schedule and hands
+finished generations to the registered callbacks.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class CompletionTimeEstimator:
+    """
+    Learn how long generations take per (model, image_size) from past tasks.
+
+    The recent completion times of every profile are kept, and their 10th, 50th
+    and 90th percentiles drive both the polling schedule and the ETA shown to
+    users. Profiles with too little history fall back to all profiles combined,
+    and to a fixed interval when there is no history at all.
+    """
+
+    def __init__(self, min_interval=3, max_interval=60, fallback_interval=10, min_samples=5, window=200):
+        """
+        Args:
+            min_interval (float): Poll interval around the expected completion time
+            max_interval (float): Longest gap between two polls of the same request
+            fallback_interval (float): Fixed poll interval used without history
+            min_samples (int): Samples needed before a profile's history is trusted
+            window (int): Number of recent samples kept per profile
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.fallback_interval = fallback_interval
+        self.min_samples = min_samples
+        self.window = window
+
+        self._samples = {}
+        self._all = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, profile, seconds):
+        """Add the completion time of a finished generation."""
+        if seconds is None or seconds <= 0:
+            return
+        with self._lock:
+            self._samples.setdefault(profile, deque(maxlen=self.window)).append(seconds)
+            self._all.append(seconds)
+
+    def percentiles(self, profile):
+        """Return ``(p10, p50, p90)`` in seconds, or None without enough history."""
+        with self._lock:
+            samples = self._samples.get(profile)
+            if not samples or len(samples) < self.min_samples:
+                samples = self._all
+            if len(samples) < self.min_samples:
+                return None
+            ordered = sorted(samples)
+
+        def pick(q):
+            return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+        return pick(0.1), pick(0.5), pick(0.9)
+
+    def next_delay(self, profile, elapsed):
+        """Seconds to wait before polling a request that has been running ``elapsed`` seconds."""
+        bounds = self.percentiles(profile)
+        if bounds is None:
+            return self.fallback_interval
+
+        p10, _, p90 = bounds
+        if elapsed < p10:
+            # 早期稀疏轮询：直接等到最早可能完成的时间点
+            delay = p10 - elapsed
+        elif elapsed <= p90:
+            # 预计完成的时间段内密集轮询
+            delay = self.min_interval
+        else:
+            # 超过大多数历史任务的完成时间后逐渐放慢
+            delay = (elapsed - p90) / 4
+        return min(self.max_interval, max(self.min_interval, delay))
+
+    def eta(self, profile, elapsed):
+        """Estimated seconds until completion, or None without history."""
+        bounds = self.percentiles(profile)
+        if bounds is None:
+            return None
+
+        _, p50, p90 = bounds
+        if elapsed < p50:
+            return p50 - elapsed
+        if elapsed < p90:
+            return p90 - elapsed
+        return self.min_interval
+
+
+class VideoStatusPoller:
+    """
+    Poll all outstanding video generation requests from a single thread.
+
+    The HTTP status calls of one sweep are spread over a small fixed-size pool,
+    so the number of threads stays the same whether 1 or 1000 videos are waiting.
+    """
+
+    def __init__(self, status_func, on_complete, on_failed, estimator=None, timeout=600,
+                 max_concurrency=4, context_factory=None):
+        """
+        Args:
+            status_func (callable): ``status_func(request_id, api_key=...)`` returning
+                the state dict of ``video_generator.query_video_status``
+            on_complete (callable): ``on_complete(request_id, tasks, state)`` called when
+                the video is ready; ``tasks`` maps task IDs to ``{'params': ..., 'job_id': ...}``
+                and ``state['elapsed']`` is the time since submission
+            on_failed (callable): ``on_failed(request_id, tasks, reason)`` called when the
+                generation failed or timed out
+            estimator (CompletionTimeEstimator, optional): Decides when each request
+                is polled next and learns from completed requests
+            timeout (float): Seconds after which a request is given up
+            max_concurrency (int): Maximum number of status calls in flight
+            context_factory (callable, optional): Returns a context manager the
+                callbacks run inside (e.g. ``app.app_context``)
+        """
+        self.status_func = status_func
+        self.on_complete = on_complete
+        self.on_failed = on_failed
+        self.estimator = estimator or CompletionTimeEstimator()
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.context_factory = context_factory
+
+        # {request_id: {'tasks': {task_id: {'params': ..., 'job_id': ...}}, 'api_key': ...,
+        #               'profile': (model, image_size), 'submitted_at': ..., 'next_poll_at': ...}}
+        self._requests = {}
+        self._status_calls = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the polling thread. Calling it more than once is harmless."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="video-status-poller")
+            self._thread.daemon = True
+            self._thread.start()
+
+        logger.info("Video status poller started")
+
+    def watch(self, request_id, task_id, params=None, submitted_at=None, job_id=None):
+        """
+        Start tracking a request ID on behalf of a task.
+
+        Args:
+            request_id (str): Request ID returned by the video submission
+            task_id (str): Task waiting for the video
+            params (dict, optional): Task parameters; ``api_key`` is used for polling and
+                ``model`` / ``image_size`` select the completion time history
+            submitted_at (float, optional): Epoch time the request was submitted,
+                so a resumed request keeps its original timeout
+            job_id (str, optional): Scheduler job that tracks this wait
+        """
+        params = params or {}
+        now = time.time()
+
+        with self._lock:
+            entry = self._requests.get(request_id)
+            if entry is None:
+                profile = (params.get('model'), params.get('image_size'))
+                submitted_at = submitted_at or now
+                entry = {
+                    'tasks': {},
+                    'api_key': params.get('api_key'),
+                    'profile': profile,
+                    'submitted_at': submitted_at,
+                    'next_poll_at': now + self.estimator.next_delay(profile, now - submitted_at)
+                }
+                self._requests[request_id] = entry
+            entry['tasks'][task_id] = {'params': params, 'job_id': job_id}
+
+        self.start()
+        self._wakeup.set()
+
+    def unwatch(self, request_id):
+        """Stop tracking a request ID."""
+        with self._lock:
+            self._requests.pop(request_id, None)
+
+    def stats(self):
+        """Return the number of outstanding requests, waiting tasks and status calls made."""
+        with self._lock:
+            return {
+                'requests': len(self._requests),
+                'tasks': sum(len(entry['tasks']) for entry in self._requests.values()),
+                'status_calls': self._status_calls
+            }
+
+    def _run(self):
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="video-status") as pool:
+            while True:
+                try:
+                    self._sweep(pool)
+                except Exception as e:
+                    logger.error(f"Video status poller sweep failed: {e}")
+
+                self._wakeup.wait(self._seconds_until_next_poll())
+                self._wakeup.clear()
+
+    def _seconds_until_next_poll(self):
+        with self._lock:
+            if not self._requests:
+                return None
+            next_poll_at = min(entry['next_poll_at'] for entry in self._requests.values())
+        return max(0.0, next_poll_at - time.time())
+
+    def _sweep(self, pool):
+        """Poll every request that is due and dispatch the results."""
+        now = time.time()
+        with self._lock:
+            due = [
+                (request_id, entry['api_key'])
+                for request_id, entry in self._requests.items()
+                if entry['next_poll_at'] <= now
+            ]
+            for request_id, _ in due:
+                entry = self._requests[request_id]
+                entry['next_poll_at'] = now + self.estimator.next_delay(entry['profile'], now - entry['submitted_at'])
+            self._status_calls += len(due)
+
+        if not due:
+            return
+
+        logger.info(f"Polling {len(due)} of {len(self._requests)} outstanding video requests")
+        futures = {
+            request_id: pool.submit(self.status_func, request_id, api_key=api_key)
+            for request_id, api_key in due
+        }
+
+        for request_id, future in futures.items():
+            try:
+                state = future.result()
+            except Exception as e:
+                logger.error(f"Error polling request_id {request_id}: {e}")
+                state = None
+            self._dispatch(request_id, state)
+
+    def _dispatch(self, request_id, state):
+        with self._lock:
+            entry = self._requests.get(request_id)
+            if entry is None:
+                return
+
+            elapsed = time.time() - entry['submitted_at']
+            if state and state['status'] == 'succeeded':
+                outcome = 'succeeded'
+            elif state and state['status'] == 'failed':
+                outcome = 'failed'
+            elif elapsed > self.timeout:
+                outcome = 'timeout'
+            else:
+                return
+
+            del self._requests[request_id]
+
+        if outcome == 'succeeded':
+            self.estimator.record(entry['profile'], elapsed)
+            state = dict(state, elapsed=elapsed)
+
+        try:
+            if self.context_factory:
+                with self.context_factory():
+                    self._notify(request_id, entry, state, outcome)
+            else:
+                self._notify(request_id, entry, state, outcome)
+        except Exception as e:
+            logger.error(f"Error dispatching result for request_id {request_id}: {e}")
+
+    def _notify(self, request_id, entry, state, outcome):
+        if outcome == 'succeeded':
+            self.on_complete(request_id, entry['tasks'], state)
+        elif outcome == 'failed':
+            self.on_failed(request_id, entry['tasks'], state.get('reason'))
+        else:
+            self.on_failed(request_id, entry['tasks'], None)